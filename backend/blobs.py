@@ -0,0 +1,100 @@
+# backend/blobs.py
+"""Content-addressed, compressed context text.
+
+Each distinct context is stored once in ``context_blobs``, keyed by the
+SHA-1 of its text, and ``contexts`` rows refer to it by that hash. Blobs
+are compressed with zstd, using the newest trained dictionary when there
+is one, or with zlib. The codec is stored with each blob, so older blobs
+stay readable after a new dictionary is trained. Decoded text is cached
+by hash, so a blob is decompressed once however many rows share it.
+"""
+import hashlib
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from backend.cache import TTLCache, register
+from config import CONTEXT_CACHE_ENTRIES, CONTEXT_CODEC, CONTEXT_ZLIB_LEVEL, CONTEXT_ZSTD_LEVEL
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# blobs never change, so entries only leave by LRU eviction
+_text_cache = register(TTLCache("context_text", maxsize=CONTEXT_CACHE_ENTRIES, ttl=float("inf")))
+
+_dicts: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+_dicts_loaded = False
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+# -------------------- dictionaries --------------------
+def set_dictionaries(rows: Iterable[Tuple[int, bytes]]):
+    """Install the trained dictionaries (id, raw bytes) read from context_dicts."""
+    global _dicts_loaded
+    if zstandard is not None:
+        for dict_id, data in rows:
+            _dicts.setdefault(dict_id, zstandard.ZstdCompressionDict(bytes(data)))
+    _dicts_loaded = True
+
+def dictionaries_loaded() -> bool:
+    return _dicts_loaded
+
+def needs_dictionary(codec: Optional[str]) -> bool:
+    # a blob written with a dictionary this process has not loaded yet
+    return bool(codec) and codec.startswith("zstd:") and int(codec[5:]) not in _dicts
+
+def train_dictionary(samples: List[str], size: int) -> bytes:
+    if zstandard is None:
+        raise RuntimeError("training a context dictionary needs the zstandard package")
+    return zstandard.train_dictionary(size, [s.encode("utf-8") for s in samples]).as_bytes()
+
+# -------------------- codecs --------------------
+def current_codec() -> str:
+    if CONTEXT_CODEC == "zstd" and zstandard is not None:
+        return f"zstd:{max(_dicts)}" if _dicts else "zstd"
+    return "zlib"
+
+def compress(text: str) -> Tuple[str, int, bytes]:
+    """(codec, raw size, data) for ``text`` with the current codec."""
+    raw = text.encode("utf-8")
+    codec = current_codec()
+    if codec == "zlib":
+        return codec, len(raw), zlib.compress(raw, CONTEXT_ZLIB_LEVEL)
+    dict_data = _dicts[int(codec[5:])] if ":" in codec else None
+    return codec, len(raw), zstandard.ZstdCompressor(level=CONTEXT_ZSTD_LEVEL, dict_data=dict_data).compress(raw)
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    if zstandard is None:
+        raise RuntimeError(f"context blob codec {codec!r} needs the zstandard package")
+    dict_data = _dicts[int(codec[5:])] if ":" in codec else None
+    return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data).decode("utf-8")
+
+def text(blob_hash: str, codec: str, data: bytes) -> str:
+    """Decoded text of a blob; decompressed on first use only."""
+    value = _text_cache.get(blob_hash, None)
+    if value is None:
+        value = decompress(codec, bytes(data))
+        _text_cache.set(blob_hash, value)
+    return value
+
+# -------------------- read paths --------------------
+# The storage backends select ctx.blob_hash, b.codec and b.data next to
+# ctx.context_lines; rows written before blobs existed keep their text inline.
+
+def missing_dictionaries(rows: Iterable[Any]) -> bool:
+    return any(needs_dictionary(row["codec"]) for row in rows)
+
+def with_text(rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Rows as dicts with context_lines filled from their blob."""
+    out = []
+    for row in rows:
+        row = dict(row)
+        blob_hash, codec, data = row.pop("blob_hash"), row.pop("codec"), row.pop("data")
+        if data is not None:
+            row["context_lines"] = text(blob_hash, codec, data)
+        out.append(row)
+    return out
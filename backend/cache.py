@@ -0,0 +1,113 @@
+# backend/cache.py
+import functools
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from config import READ_CACHE_MAXSIZE, READ_CACHE_TTL
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after ``ttl`` seconds.
+
+    Values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, name: str, maxsize: int = READ_CACHE_MAXSIZE, ttl: float = READ_CACHE_TTL):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0  # bumped on invalidation; guards in-flight fills
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = _MISSING) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        if generation is not None and generation != self.generation:
+            return  # invalidated while the value was being computed
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable = _MISSING):
+        if key is _MISSING:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+        self.generation += 1
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+# -------------------- registry --------------------
+_caches: Dict[str, TTLCache] = {}
+_tags: Dict[str, List[TTLCache]] = {}
+
+def register(cache: TTLCache, tags: Iterable[str] = ()) -> TTLCache:
+    _caches[cache.name] = cache
+    for tag in tags:
+        _tags.setdefault(tag, []).append(cache)
+    return cache
+
+def invalidate(*tags: str):
+    """Drop every cache that depends on any of ``tags`` (e.g. "commands")."""
+    for tag in tags:
+        for cache in _tags.get(tag, []):
+            cache.invalidate()
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+def cached(name: str, tags: Iterable[str] = (), maxsize: int = READ_CACHE_MAXSIZE, ttl: float = READ_CACHE_TTL):
+    """Cache an async function's result keyed by its arguments."""
+    cache = register(TTLCache(name, maxsize, ttl), tags)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            value = cache.get(key)
+            if value is not _MISSING:
+                return value
+            generation = cache.generation
+            value = await fn(*args, **kwargs)
+            cache.set(key, value, generation)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
@@ -1,338 +1,359 @@
 # backend/db.py
-import mysql.connector
-from config import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME
+# MySQL storage (aiomysql). The queries live in backend/sql_storage.py; this
+# module adds the driver, the DDL and its migrations, and MySQL's dialect.
+import functools
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from backend.hashing import hash_password  # local helper if needed
+from typing import List, Dict, Any, Tuple
+
+import aiomysql
+from config import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME
+from config import DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_PING_INTERVAL
+from config import CLASSIFICATIONS_PARTITIONS, LEASE_RECLAIM_BATCH
+from backend.pool import ConnectionPool
+from backend.migrate import Migration
+from backend.sql_storage import ASSIGNED_COUNTS, COMMANDS_TOTAL, DATASET_VERSION, SQLStorage, hash_plain_passwords
 
-def get_connection():
-    return mysql.connector.connect(
+async def _connect():
+    return await aiomysql.connect(
         host=DB_HOST,
         user=DB_USER,
         password=DB_PASSWORD,
-        database=DB_NAME,
+        db=DB_NAME,
         autocommit=False
     )
 
-def safe_dict_row(row, cursor):
-    # convert tuple row + column names -> dict
-    if row is None:
-        return None
-    if isinstance(row, dict):
-        return row
-    cols = [d[0] for d in cursor.description]
-    return {cols[i]: row[i] for i in range(len(cols))}
-
-# -------------------- AUTH --------------------
-def create_user(name: str, email: str, plain_password: str, role: str = "validator") -> bool:
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        hashed = hash_password(plain_password)
-        cursor.execute(
-            "INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, %s)",
-            (name, email, hashed, role)
-        )
-        conn.commit()
-
-        cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
-        row = cursor.fetchone()
-        if not row:
-            return False
-        user_id = row[0]
-
-        # Create per-user tables for validators
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS dynamic_cmds_user_{user_id} (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                command_id INT,
-                command_text TEXT,
-                processed_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS static_cmds_user_{user_id} (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                command_id INT,
-                command_text TEXT,
-                processed_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        conn.commit()
-        return True
-    except mysql.connector.Error as e:
-        conn.rollback()
-        print("create_user error:", e)
-        return False
-    finally:
-        cursor.close()
-        conn.close()
-
-def authenticate_user(email: str, plain_password: str) -> Optional[Dict[str, Any]]:
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            "SELECT * FROM users WHERE email=%s AND password=%s",
-            (hash_password(plain_password),)
-            if False else (email, hash_password(plain_password))
+@functools.lru_cache(maxsize=512)
+def _format(sql: str) -> str:
+    # qmark -> aiomysql's pyformat; literal % must be doubled once args are given
+    return sql.replace("%", "%%").replace("?", "%s")
+
+class _QmarkCursor:
+    """An aiomysql cursor that takes the ``?`` placeholders the shared queries use."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    async def execute(self, sql: str, args=None):
+        if args is None:
+            return await self._cursor.execute(sql)
+        return await self._cursor.execute(_format(sql), args)
+
+    async def executemany(self, sql: str, args):
+        return await self._cursor.executemany(_format(sql), args)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+# -------------------- SCHEMA --------------------
+USERS_DDL = """
+    CREATE TABLE IF NOT EXISTS users (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        password VARCHAR(255) NOT NULL,
+        role VARCHAR(32) NOT NULL DEFAULT 'validator',
+        last_seen DATETIME(6) NULL,
+        last_processed_cmd_id INT NOT NULL DEFAULT 0,
+        UNIQUE KEY uq_users_email (email),
+        KEY idx_users_role_seen (role, last_seen)
+    ) ENGINE=InnoDB
+"""
+
+# One shared table for every validator's labels (replaces the old
+# dynamic_cmds_user_N / static_cmds_user_N pairs). The primary key clusters
+# rows by user and command so history reads are index range scans; the
+# secondary keys serve the type/date filters and per-action stats counts.
+CLASSIFICATIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS classifications (
+        id BIGINT NOT NULL AUTO_INCREMENT,
+        user_id INT NOT NULL,
+        command_id INT NOT NULL,
+        action ENUM('Dynamic', 'Static') NOT NULL,
+        command_text TEXT,
+        processed_time TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+        PRIMARY KEY (user_id, command_id, processed_time, action),
+        KEY idx_classifications_id (id),
+        KEY idx_classifications_user_action_time (user_id, action, processed_time),
+        KEY idx_classifications_user_time (user_id, processed_time),
+        KEY idx_classifications_user_id (user_id, id)
+    ) ENGINE=InnoDB
+"""
+
+# Running totals kept in step with classifications (same transaction as
+# each insert) so stats reads are primary-key lookups, not COUNT(*) scans.
+# reconcile_counters() rebuilds both tables (and commands.assigned) from the source rows.
+VALIDATOR_COUNTERS_DDL = """
+    CREATE TABLE IF NOT EXISTS validator_counters (
+        user_id INT NOT NULL PRIMARY KEY,
+        dynamic_count INT NOT NULL DEFAULT 0,
+        static_count INT NOT NULL DEFAULT 0,
+        processed_count INT NOT NULL DEFAULT 0,
+        last_command_id INT NULL,
+        updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+    ) ENGINE=InnoDB
+"""
+
+GLOBAL_COUNTERS_DDL = """
+    CREATE TABLE IF NOT EXISTS global_counters (
+        name VARCHAR(64) NOT NULL PRIMARY KEY,
+        value BIGINT NOT NULL DEFAULT 0
+    ) ENGINE=InnoDB
+"""
+
+# Corpus tables loaded by backend/ingest.py. context_lines is stored
+# decoded (real newlines); arguments are deduplicated by content_hash.
+COMMANDS_DDL = """
+    CREATE TABLE IF NOT EXISTS commands (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        assigned INT NOT NULL DEFAULT 0,
+        UNIQUE KEY uq_commands_name (name),
+        KEY idx_commands_assigned (assigned, id)
+    ) ENGINE=InnoDB
+"""
+
+# Leases keyed by (user_id, command_id) since migration 7: a validator
+# holds the command shown plus the ones leased ahead (see next_command).
+# commands.assigned counts the validators who labelled or hold each command.
+COMMAND_LEASES_DDL = """
+    CREATE TABLE IF NOT EXISTS command_leases (
+        user_id INT NOT NULL PRIMARY KEY,
+        command_id INT NOT NULL,
+        leased_at DATETIME(6) NOT NULL,
+        expires_at DATETIME(6) NOT NULL,
+        KEY idx_command_leases_expires (expires_at)
+    ) ENGINE=InnoDB
+"""
+
+ARGUMENTS_DDL = """
+    CREATE TABLE IF NOT EXISTS arguments (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        command_id INT NOT NULL,
+        full_command_line TEXT,
+        content_hash CHAR(40) NULL,
+        UNIQUE KEY uq_arguments_content_hash (content_hash),
+        KEY idx_arguments_command (command_id, id)
+    ) ENGINE=InnoDB
+"""
+
+CONTEXTS_DDL = """
+    CREATE TABLE IF NOT EXISTS contexts (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        argument_id INT NOT NULL,
+        context_lines MEDIUMTEXT,
+        KEY idx_contexts_argument (argument_id)
+    ) ENGINE=InnoDB
+"""
+
+# Each distinct context text is stored once, compressed (backend/blobs.py);
+# contexts.blob_hash points at it and context_lines is left NULL.
+CONTEXT_BLOBS_DDL = """
+    CREATE TABLE IF NOT EXISTS context_blobs (
+        hash CHAR(40) NOT NULL PRIMARY KEY,
+        codec VARCHAR(16) NOT NULL,
+        raw_size INT NOT NULL,
+        data MEDIUMBLOB NOT NULL
+    ) ENGINE=InnoDB
+"""
+
+CONTEXT_DICTS_DDL = """
+    CREATE TABLE IF NOT EXISTS context_dicts (
+        id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        data MEDIUMBLOB NOT NULL,
+        created_at DATETIME(6) NOT NULL
+    ) ENGINE=InnoDB
+"""
+
+async def _ensure_column(cursor, table: str, column: str, definition: str):
+    # tables created by hand before ingest.py existed may lack new columns
+    await cursor.execute("""
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = ? AND COLUMN_NAME = ?
+    """, (table, column))
+    if not await cursor.fetchone():
+        await cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+async def _ensure_index(cursor, table: str, index: str, definition: str):
+    await cursor.execute("""
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = ? AND INDEX_NAME = ?
+    """, (table, index))
+    if not await cursor.fetchone():
+        await cursor.execute(f"ALTER TABLE {table} ADD {definition}")
+
+async def _drop_index(cursor, table: str, index: str):
+    await cursor.execute("""
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = ? AND INDEX_NAME = ?
+    """, (table, index))
+    if await cursor.fetchone():
+        await cursor.execute(f"ALTER TABLE {table} DROP INDEX {index}")
+
+# -------------------- MIGRATIONS --------------------
+# Applied in order by init_schema() through backend.migrate; never edit a
+# released step, append a new version instead.
+
+async def _m001_baseline(cursor, partitions: int = CLASSIFICATIONS_PARTITIONS):
+    # The schema as init_schema() built it before versioning; on databases
+    # that predate a column or key, the _ensure_* calls add it.
+    ddl = CLASSIFICATIONS_DDL
+    if partitions and partitions > 1:
+        # every unique key contains user_id, so KEY partitioning is allowed
+        ddl += f" PARTITION BY KEY (user_id) PARTITIONS {int(partitions)}"
+    await cursor.execute(USERS_DDL)
+    await cursor.execute(ddl)
+    await cursor.execute(VALIDATOR_COUNTERS_DDL)
+    await cursor.execute(GLOBAL_COUNTERS_DDL)
+    await cursor.execute(COMMANDS_DDL)
+    await cursor.execute(ARGUMENTS_DDL)
+    await cursor.execute(CONTEXTS_DDL)
+    await cursor.execute(COMMAND_LEASES_DDL)
+    await _ensure_index(cursor, "classifications", "idx_classifications_user_id",
+                        "KEY idx_classifications_user_id (user_id, id)")
+    await _ensure_column(cursor, "commands", "name", "VARCHAR(255) NULL")
+    await _ensure_index(cursor, "commands", "uq_commands_name", "UNIQUE KEY uq_commands_name (name)")
+    await _ensure_column(cursor, "commands", "assigned", "INT NOT NULL DEFAULT 0")
+    await _ensure_index(cursor, "commands", "idx_commands_assigned", "KEY idx_commands_assigned (assigned, id)")
+    await _ensure_column(cursor, "arguments", "content_hash", "CHAR(40) NULL")
+    await _ensure_index(cursor, "arguments", "uq_arguments_content_hash",
+                        "UNIQUE KEY uq_arguments_content_hash (content_hash)")
+
+async def _m002_required_indexes(cursor):
+    # Hand-made tables (CREATE TABLE IF NOT EXISTS keeps them as they are)
+    # may lack the keys the hot queries rely on.
+    await _ensure_index(cursor, "users", "uq_users_email", "UNIQUE KEY uq_users_email (email)")
+    await _ensure_index(cursor, "users", "idx_users_role_seen", "KEY idx_users_role_seen (role, last_seen)")
+    await _drop_index(cursor, "users", "idx_users_role")  # a prefix of idx_users_role_seen
+    await _ensure_index(cursor, "arguments", "idx_arguments_command", "KEY idx_arguments_command (command_id, id)")
+    await _ensure_index(cursor, "contexts", "idx_contexts_argument", "KEY idx_contexts_argument (argument_id)")
+
+async def _m003_context_blobs(cursor):
+    await cursor.execute(CONTEXT_BLOBS_DDL)
+    await cursor.execute(CONTEXT_DICTS_DDL)
+    await _ensure_column(cursor, "contexts", "blob_hash", "CHAR(40) NULL")
+
+async def _m004_commands_total(cursor):
+    # seeded here rather than on first read, which needed a connection of its own
+    await cursor.execute(
+        "INSERT IGNORE INTO global_counters (name, value) SELECT ?, COUNT(*) FROM commands", (COMMANDS_TOTAL,)
+    )
+
+async def _m005_decode_contexts(cursor):
+    # Rows loaded by the first ingest script hold literal "\\n" sequences
+    # that the read paths used to unescape per request. Decoded contexts
+    # span several lines, so rows that already hold a real newline are left
+    # alone; one transaction with the version record, so never applied twice.
+    await cursor.execute(
+        "UPDATE contexts SET context_lines = REPLACE(REPLACE(context_lines, ?, ?), ?, ?)"
+        " WHERE LOCATE(?, context_lines) > 0 AND LOCATE(?, context_lines) = 0",
+        ("\\n", "\n", "\\\\", "\\", "\\n", "\n")
+    )
+    if cursor.rowcount > 0:
+        await cursor.execute(
+            "INSERT INTO global_counters (name, value) VALUES (?, 1) ON DUPLICATE KEY UPDATE value = value + 1",
+            (DATASET_VERSION,)
         )
-        # Note: preserve original semantics: email+hashed password match
-        cursor.execute(
-            "SELECT * FROM users WHERE email=%s AND password=%s",
-            (email, hash_password(plain_password))
+
+async def _m006_drop_short_history_indexes(cursor):
+    # SQLite replaces two history indexes here; InnoDB's already end in the
+    # primary key. Kept so versions match.
+    pass
+
+async def _m007_leases_per_command(cursor):
+    # a validator holds several leases (the command shown and the ones
+    # leased ahead), so the key becomes (user_id, command_id)
+    await cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'command_leases' AND CONSTRAINT_NAME = 'PRIMARY'
+    """)
+    if (await cursor.fetchone())[0] == 1:
+        await cursor.execute("ALTER TABLE command_leases DROP PRIMARY KEY, ADD PRIMARY KEY (user_id, command_id)")
+
+async def _recount_assigned(cursor):
+    await cursor.execute(f"""
+        UPDATE commands c
+        LEFT JOIN ({ASSIGNED_COUNTS}) a ON a.command_id = c.id
+        SET c.assigned = COALESCE(a.n, 0)
+    """)
+
+async def _m008_recount_assigned(cursor):
+    # assigned came in with DEFAULT 0, so commands labelled before leases
+    # existed (or copied in by migrate_classifications) looked unassigned
+    await _recount_assigned(cursor)
+
+MIGRATIONS: List[Migration] = [
+    (1, "baseline", _m001_baseline),
+    (2, "required_indexes", _m002_required_indexes),
+    (3, "context_blobs", _m003_context_blobs),
+    (4, "commands_total", _m004_commands_total),
+    (5, "decode_contexts", _m005_decode_contexts),
+    (6, "drop_short_history_indexes", _m006_drop_short_history_indexes),
+    (7, "leases_per_command", _m007_leases_per_command),
+    (8, "recount_assigned", _m008_recount_assigned),
+    (9, "hash_plain_passwords", hash_plain_passwords),
+]
+
+# -------------------- STORAGE --------------------
+class MySQLStorage(SQLStorage):
+    MIGRATIONS = MIGRATIONS
+    Error = aiomysql.Error
+    IntegrityError = aiomysql.IntegrityError
+    INSERT_IGNORE = "INSERT IGNORE"
+    FOR_UPDATE = " FOR UPDATE"
+    SKIP_LOCKED = " FOR UPDATE SKIP LOCKED"
+
+    def __init__(self, partitions: int = CLASSIFICATIONS_PARTITIONS):
+        self.partitions = partitions
+
+    def upsert(self, key: str) -> str:
+        return "ON DUPLICATE KEY UPDATE"
+
+    def excluded(self, column: str) -> str:
+        return f"VALUES({column})"
+
+    def _new_pool(self) -> ConnectionPool:
+        return ConnectionPool(
+            _connect,
+            size=DB_POOL_SIZE,
+            timeout=DB_POOL_TIMEOUT,
+            ping_interval=DB_POOL_PING_INTERVAL,
         )
-        row = cursor.fetchone()
-        return row
-    finally:
-        cursor.close()
-        conn.close()
-
-# -------------------- COMMANDS & CONTEXTS --------------------
-def get_commands_with_contexts() -> List[Dict[str, Any]]:
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        query = """
-            SELECT 
-                a.id AS argument_id,
-                c.id AS command_id,
-                a.full_command_line,
-                ctx.context_lines
-            FROM commands c
-            JOIN arguments a ON c.id = a.command_id
-            LEFT JOIN contexts ctx ON ctx.argument_id = a.id
-            ORDER BY c.id;
-        """
-        cursor.execute(query)
-        results = cursor.fetchall()
-        for row in results:
-            if row.get("context_lines"):
-                row["context_lines"] = row["context_lines"].replace("\\n", "\n").replace("\\\\", "\\")
-        return results
-    finally:
-        cursor.close()
-        conn.close()
-
-def insert_dynamic_command(user_id: int, cmd_id: int, command_text: str):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(f"""
-            INSERT INTO dynamic_cmds_user_{user_id} (command_id, command_text)
-            VALUES (%s, %s)
-        """, (cmd_id, command_text))
-        update_last_seen(user_id)
-        conn.commit()
-    finally:
-        cursor.close()
-        conn.close()
-
-def insert_static_command(user_id: int, cmd_id: int, command_text: str):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(f"""
-            INSERT INTO static_cmds_user_{user_id} (command_id, command_text)
-            VALUES (%s, %s)
-        """, (cmd_id, command_text))
-        update_last_seen(user_id)
-        conn.commit()
-    finally:
-        cursor.close()
-        conn.close()
-
-# -------------------- HISTORY / CONTEXTS --------------------
-def fetch_user_history(
-    user_id: int,
-    start_dt: Optional[datetime],
-    end_dt: Optional[datetime],
-    cmd_id: Optional[int],
-    action_type: str = "All"
-) -> List[Dict[str, Any]]:
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        dyn_table = f"dynamic_cmds_user_{user_id}"
-        sta_table = f"static_cmds_user_{user_id}"
-
-        selects = []
-        params_all: List[Any] = []
-
-        if action_type in ("All", "Dynamic"):
-            q = f"SELECT id AS command_id, command_text, 'Dynamic' AS action, processed_time FROM {dyn_table}"
-            where = []
-            if start_dt:
-                where.append("processed_time >= %s"); params_all.append(start_dt)
-            if end_dt:
-                where.append("processed_time <= %s"); params_all.append(end_dt)
-            if cmd_id is not None:
-                where.append("command_id = %s"); params_all.append(cmd_id)
-            if where:
-                q += " WHERE " + " AND ".join(where)
-            selects.append(q)
-
-        if action_type in ("All", "Static"):
-            q = f"SELECT id AS command_id, command_text, 'Static' AS action, processed_time FROM {sta_table}"
-            where = []
-            if start_dt:
-                where.append("processed_time >= %s"); params_all.append(start_dt)
-            if end_dt:
-                where.append("processed_time <= %s"); params_all.append(end_dt)
-            if cmd_id is not None:
-                where.append("command_id = %s"); params_all.append(cmd_id)
-            if where:
-                q += " WHERE " + " AND ".join(where)
-            selects.append(q)
-
-        if not selects:
-            return []
-
-        final_query = " UNION ALL ".join(selects) + " ORDER BY command_id ASC, processed_time ASC LIMIT 2000"
-        cursor.execute(final_query, tuple(params_all))
-        rows = cursor.fetchall()
-        return rows
-    except Exception as e:
-        print("fetch_user_history error:", e)
-        return []
-    finally:
-        cursor.close()
-        conn.close()
-
-def fetch_contexts_for_command(command_id: int) -> List[Dict[str, Any]]:
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        query = """
-            SELECT 
-                a.id AS argument_id,
-                c.id AS command_id,
-                a.full_command_line,
-                ctx.context_lines
-            FROM commands c
-            JOIN arguments a ON c.id = a.command_id
-            LEFT JOIN contexts ctx ON ctx.argument_id = a.id
-            WHERE c.id = %s
-            ORDER BY a.id;
-        """
-        cursor.execute(query, (command_id,))
-        results = cursor.fetchall()
-        for row in results:
-            if row.get("context_lines"):
-                row["context_lines"] = row["context_lines"].replace("\\n", "\n").replace("\\\\", "\\")
-        return results
-    finally:
-        cursor.close()
-        conn.close()
-
-# -------------------- LAST PROCESSED & METRICS --------------------
-def get_last_processed_cmd_id(user_id: int) -> int:
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT last_processed_cmd_id FROM users WHERE id = %s", (user_id,))
-        result = cursor.fetchone()
-        return result[0] if result and result[0] else 0
-    finally:
-        cursor.close()
-        conn.close()
-
-def update_last_processed_cmd(user_id: int, cmd_id: int):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("UPDATE users SET last_processed_cmd_id = %s WHERE id = %s", (cmd_id, user_id))
-        conn.commit()
-    finally:
-        cursor.close()
-        conn.close()
-
-def update_last_seen(user_id: int):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("UPDATE users SET last_seen = %s WHERE id = %s", (datetime.now(), user_id))
-        conn.commit()
-    finally:
-        cursor.close()
-        conn.close()
-
-# -------------------- ADMIN / STATS --------------------
-def get_all_validators() -> List[Dict[str, Any]]:
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT id, name FROM users WHERE role = 'validator'")
-        return cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
-
-def get_user_counts_by_role():
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT COUNT(*) FROM users WHERE role='validator'")
-        validator_count = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM users WHERE role='viewer'")
-        viewer_count = cursor.fetchone()[0]
-
-        cursor.execute("SELECT name FROM users WHERE role='validator'")
-        validator_names = [row[0] for row in cursor.fetchall()]
-
-        cursor.execute("SELECT name FROM users WHERE role='viewer'")
-        viewer_names = [row[0] for row in cursor.fetchall()]
-
-        return validator_count, viewer_count, validator_names, viewer_names
-    finally:
-        cursor.close()
-        conn.close()
-
-def get_recently_active_validators():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("""
-            SELECT name, last_seen FROM users
-            WHERE role = 'validator'
-            ORDER BY last_seen DESC
-            LIMIT 10
-        """)
-        return cursor.fetchall()
-    finally:
-        cursor.close()
-        conn.close()
-
-def get_validator_stats(user_id: int):
-    conn = get_connection()
-    cursor = conn.cursor()
-    try:
-        try:
-            cursor.execute(f"SELECT COUNT(*) FROM dynamic_cmds_user_{user_id}")
-            dynamic_count = cursor.fetchone()[0]
-        except:
-            dynamic_count = 0
-
-        try:
-            cursor.execute(f"SELECT COUNT(*) FROM static_cmds_user_{user_id}")
-            static_count = cursor.fetchone()[0]
-        except:
-            static_count = 0
-
-        processed = (dynamic_count or 0) + (static_count or 0)
-
-        cursor.execute("SELECT COUNT(DISTINCT id) FROM commands")
-        total_commands = cursor.fetchone()[0] or 0
-        remaining = max(0, total_commands - processed)
-
-        return {
-            "dynamic": dynamic_count,
-            "static": static_count,
-            "processed": processed,
-            "remaining": remaining,
-            "total": total_commands
-        }
-    finally:
-        cursor.close()
-        conn.close()
+
+    async def _cursor(self, conn, dicts: bool = False, stream: bool = False):
+        # streaming reads use an unbuffered (server-side) cursor
+        kind = aiomysql.SSDictCursor if stream else aiomysql.DictCursor if dicts else aiomysql.Cursor
+        return _QmarkCursor(await conn.cursor(kind))
+
+    def _dicts(self, rows) -> List[Dict[str, Any]]:
+        return list(rows)
+
+    def _migration_steps(self):
+        return [(v, n, functools.partial(step, partitions=self.partitions) if step is _m001_baseline else step)
+                for v, n, step in self.MIGRATIONS]
+
+    async def _release_expired(self, cursor, now: datetime) -> int:
+        # SKIP LOCKED: concurrent callers each release a different batch
+        await cursor.execute("""
+            SELECT user_id, command_id FROM command_leases
+            WHERE expires_at <= ?
+            ORDER BY expires_at
+            LIMIT ?
+            FOR UPDATE SKIP LOCKED
+        """, (now, LEASE_RECLAIM_BATCH))
+        expired = await cursor.fetchall()
+        if expired:
+            await cursor.executemany("UPDATE commands SET assigned = assigned - 1 WHERE id = ?", [(c,) for _, c in expired])
+            await cursor.executemany("DELETE FROM command_leases WHERE user_id = ? AND command_id = ?", expired)
+        return len(expired)
+
+    async def _recount_assigned(self, cursor):
+        await _recount_assigned(cursor)
+
+    async def _explain(self, cursor, sql: str, params: Tuple[Any, ...]) -> Tuple[List[str], List[str]]:
+        # type=ALL is a full table read
+        await cursor.execute("EXPLAIN " + sql, params)
+        rows = await cursor.fetchall()
+        plan = [f"{r['table']}: type={r['type']} key={r['key']} rows={r['rows']} {r['Extra'] or ''}".rstrip() for r in rows]
+        return plan, [r["table"] for r in rows if r["type"] == "ALL"]
+
+storage = MySQLStorage()
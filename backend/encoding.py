@@ -0,0 +1,153 @@
+# backend/encoding.py
+"""Response encoding: fast JSON, optional msgpack, gzip/zstd compression.
+
+orjson, msgpack and zstandard are optional. Without them JSON goes
+through the stdlib encoder, msgpack requests get JSON, and only gzip is
+offered. Either way datetimes go out as ISO 8601 strings.
+"""
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+from starlette.responses import Response
+
+from config import COMPRESS_MIN_BYTES, GZIP_LEVEL, ZSTD_LEVEL
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):  # MySQL SUM() results
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", "replace")
+    return str(value)
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(value: Any) -> bytes:
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTS)
+else:
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    return msgpack is not None and accept is not None and MSGPACK in accept
+
+def packb(value: Any) -> bytes:
+    return msgpack.packb(value, default=_default, use_bin_type=True, datetime=False)
+
+class FastJSONResponse(Response):
+    media_type = JSON
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def respond(content: Any, accept: Optional[str] = None, **kwargs) -> Response:
+    """JSON, or msgpack when the client's Accept header asks for it.
+
+    Returning a Response also skips FastAPI's jsonable_encoder pass.
+    """
+    if wants_msgpack(accept):
+        return Response(packb(content), media_type=MSGPACK, **kwargs)
+    return Response(dumps(content), media_type=JSON, **kwargs)
+
+# -------------------- compression --------------------
+def _choose(accept_encoding: str) -> Optional[str]:
+    offered = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if zstandard is not None and "zstd" in offered:
+        return "zstd"
+    if "gzip" in offered:
+        return "gzip"
+    return None
+
+def _compressor(coding: str):
+    if coding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing bodies of at least ``min_bytes``.
+
+    The body is held back only until the threshold is reached, so streamed
+    responses stay streamed. Event streams and responses that already
+    carry a Content-Encoding pass through untouched.
+    """
+
+    def __init__(self, app, min_bytes: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.min_bytes = min_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = b""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value
+        coding = _choose(accept.decode("latin-1"))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        held = []
+        held_bytes = 0
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, held_bytes, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                if b"content-encoding" in headers or headers.get(b"content-type", b"").startswith(b"text/event-stream"):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if compressor is None:
+                held.append(body)
+                held_bytes += len(body)
+                if held_bytes < self.min_bytes:
+                    if not more:  # finished below the threshold: send as is
+                        await send(start)
+                        await send({"type": "http.response.body", "body": b"".join(held)})
+                    return
+                compressor = _compressor(coding)
+                headers = [(k, v) for k, v in start.get("headers", []) if k.lower() != b"content-length"]
+                headers += [(b"content-encoding", coding.encode()), (b"vary", b"Accept-Encoding")]
+                await send({**start, "headers": headers})
+                body = b"".join(held)
+            out = compressor.compress(body)
+            if not more:
+                out += compressor.flush()
+            if out or not more:
+                await send({"type": "http.response.body", "body": out, "more_body": more})
+
+        await self.app(scope, receive, send_wrapper)
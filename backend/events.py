@@ -0,0 +1,87 @@
+# backend/events.py
+"""In-process event bus feeding the live admin views (GET /events).
+
+The storage insert paths publish small events after they commit (heartbeats
+via backend/heartbeats.py):
+
+    classification  {"user_id", "dynamic", "static", "last_command_id", "at"}
+    heartbeat       {"user_id", "last_seen"}
+
+Each subscriber has a bounded queue. One that falls more than
+EVENTS_QUEUE_SIZE events behind is sent a single "resync" event instead
+of the backlog, and should reload its state. Everything runs on the event
+loop thread. Events reach only the subscribers of the process that
+published them: with several workers, run one for /events or accept a
+per-worker view.
+"""
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+from backend.metrics import Counter
+from config import EVENTS_QUEUE_SIZE, EVENTS_REPLAY
+
+Event = Tuple[int, str, Dict[str, Any]]  # (id, type, data)
+
+EVENTS_PUBLISHED = Counter("events_published_total", "Live events published.", ("type",))
+EVENTS_RESYNCS = Counter("events_resyncs_total", "Subscribers that fell behind and were told to resync.")
+
+# ids start from the boot time so a client resuming across a restart resyncs
+_ids = itertools.count(int(time.time() * 1000))
+_recent: Deque[Event] = deque(maxlen=EVENTS_REPLAY)
+_subscribers: Set["Subscription"] = set()
+
+
+class Subscription:
+    def __init__(self):
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        self.behind = False
+
+    def offer(self, event: Event):
+        if self.behind:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.behind = True
+            EVENTS_RESYNCS.inc()
+
+    async def get(self) -> Event:
+        if self.behind:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.behind = False
+            return (_last_id(), "resync", {})
+        return await self.queue.get()
+
+    def close(self):
+        _subscribers.discard(self)
+
+
+def _last_id() -> int:
+    return _recent[-1][0] if _recent else 0
+
+def publish(kind: str, data: Dict[str, Any]):
+    event = (next(_ids), kind, data)
+    _recent.append(event)
+    EVENTS_PUBLISHED.inc(kind)
+    for sub in _subscribers:
+        sub.offer(event)
+
+def subscribe(last_event_id: Optional[int] = None) -> Subscription:
+    """New subscription; with ``last_event_id`` it first replays what was missed."""
+    sub = Subscription()
+    if last_event_id is not None and last_event_id != _last_id():
+        if not _recent or last_event_id > _last_id() or _recent[0][0] > last_event_id + 1:
+            sub.behind = True  # the gap is not in the replay buffer (or another process's id)
+        else:
+            for event in _recent:
+                if event[0] > last_event_id:
+                    sub.offer(event)
+    _subscribers.add(sub)
+    return sub
+
+def subscriber_count() -> int:
+    return len(_subscribers)
@@ -1,8 +1,97 @@
 # backend/hashing.py
+import asyncio
+import base64
 import hashlib
+import hmac
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+from config import HASH_SCRYPT_N, HASH_SCRYPT_R, HASH_SCRYPT_P, HASH_WORKERS, HASH_MAX_PENDING
+
+# Stored format: scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>
+_PREFIX = "scrypt"
+_SALT_BYTES = 16
+_KEY_BYTES = 32
+_LEGACY_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=2 * 128 * n * r + 1024 * 1024, dklen=_KEY_BYTES
+    )
+
+def hash_password(password: str, n: int = HASH_SCRYPT_N, r: int = HASH_SCRYPT_R, p: int = HASH_SCRYPT_P) -> str:
+    salt = os.urandom(_SALT_BYTES)
+    return f"{_PREFIX}${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}"
 
 def verify_password(plain: str, hashed: str) -> bool:
-    return hash_password(plain) == hashed
+    if not hashed:
+        return False
+    if hashed.startswith(_PREFIX + "$"):
+        try:
+            _, n, r, p, salt, digest = hashed.split("$")
+            expected = _unb64(digest)
+            actual = _scrypt(plain, _unb64(salt), int(n), int(r), int(p))
+        except ValueError:
+            return False
+        return hmac.compare_digest(actual, expected)
+    # legacy rows: unsalted SHA-256 (backend/db.py). Plain-text rows from
+    # users.db are hashed by a migration and never compared as sent.
+    if _LEGACY_SHA256.fullmatch(hashed):
+        return hmac.compare_digest(hashlib.sha256(plain.encode()).hexdigest().encode(), hashed.encode())
+    return False
+
+def is_plain_text(stored: str) -> bool:
+    # neither scrypt nor a legacy SHA-256 digest: a users.db plain-text password
+    return bool(stored) and not stored.startswith(_PREFIX + "$") and not _LEGACY_SHA256.fullmatch(stored)
+
+def needs_rehash(hashed: str) -> bool:
+    # legacy formats, or scrypt with parameters other than the current ones
+    if not hashed or not hashed.startswith(_PREFIX + "$"):
+        return True
+    return hashed.split("$")[1:4] != [str(HASH_SCRYPT_N), str(HASH_SCRYPT_R), str(HASH_SCRYPT_P)]
+
+# -------------------- off-loop execution --------------------
+# scrypt is deliberately slow and memory-hard; running it on the event loop
+# would stall every other request, so it goes to a small process pool. The
+# semaphore bounds how much hashing work can be queued at once.
+_executor: Optional[ProcessPoolExecutor] = None
+_pending: Optional[asyncio.Semaphore] = None
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+    return _executor
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _pending
+    if _pending is None:
+        _pending = asyncio.Semaphore(HASH_MAX_PENDING)
+    return _pending
+
+async def _run(fn, *args):
+    async with _get_semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), fn, *args)
+
+async def hash_password_async(password: str) -> str:
+    return await _run(hash_password, password)
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    return await _run(verify_password, plain, hashed)
+
+def shutdown():
+    global _executor, _pending
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    _pending = None
@@ -0,0 +1,85 @@
+# backend/heartbeats.py
+"""Coalesced users.last_seen updates.
+
+Every label used to commit an UPDATE of the labeller's users row. Now
+``beat()`` only records the time in memory (and publishes the heartbeat
+event). The storage backend writes the newest time per user in one bulk
+UPDATE every LAST_SEEN_FLUSH_INTERVAL seconds and again when its pool is
+closed. Readers of last_seen go through ``latest()`` so unflushed beats
+are not lost to them. Runs on the event loop thread.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+from backend import events
+from config import LAST_SEEN_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+_pending: Dict[int, datetime] = {}
+_inflight: Dict[int, datetime] = {}  # taken by a flush whose write has not committed yet
+_task: Optional[asyncio.Task] = None
+
+def beat(user_id: int):
+    now = datetime.now()
+    _pending[user_id] = now
+    events.publish("heartbeat", {"user_id": user_id, "last_seen": now})
+
+def pending() -> Dict[int, datetime]:
+    return {**_inflight, **_pending}
+
+def latest(user_id: int, stored: Optional[datetime]) -> Optional[datetime]:
+    """``stored`` last_seen, or the unflushed beat if that is newer."""
+    seen = _pending.get(user_id) or _inflight.get(user_id)
+    if seen is None or (stored is not None and stored >= seen):
+        return stored
+    return seen
+
+async def flush(write: Callable[[Dict[int, datetime]], Awaitable[None]]) -> int:
+    # Beats that arrive while ``write`` runs wait for the next flush. The
+    # batch stays readable through latest() until the write commits, and a
+    # failed write puts it back unless a newer beat replaced it.
+    if not _pending:
+        return 0
+    batch = dict(_pending)
+    _pending.clear()
+    _inflight.update(batch)
+    try:
+        await write(batch)
+    except BaseException:
+        for user_id, seen in batch.items():
+            if _pending.get(user_id, seen) <= seen:
+                _pending[user_id] = seen
+        raise
+    finally:
+        for user_id, seen in batch.items():
+            if _inflight.get(user_id) == seen:
+                del _inflight[user_id]
+    return len(batch)
+
+async def _flush_loop(flush_fn: Callable[[], Awaitable[int]], interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_fn()
+        except Exception as e:
+            logger.error("last_seen flush failed (%d users pending): %s", len(_pending), e)
+
+def start(flush_fn: Callable[[], Awaitable[int]], interval: float = LAST_SEEN_FLUSH_INTERVAL):
+    """Run the storage backend's ``flush_heartbeats`` every ``interval`` seconds."""
+    global _task
+    if _task is None:
+        _task = asyncio.get_running_loop().create_task(_flush_loop(flush_fn, interval))
+
+async def stop():
+    # the final flush is close_pool()'s job, so scripts get it too
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
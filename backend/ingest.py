@@ -0,0 +1,218 @@
+# backend/ingest.py
+"""Bulk-load Creo trail files into commands / arguments / contexts.
+
+    python -m backend.ingest trail.txt [more.txt ...] \\
+        [--chunk-size 1000] [--context-before 5] [--context-after 5] \\
+        [--checkpoint .ingest_checkpoint.json] [--notify-url http://127.0.0.1:8000 --token <admin access token>]
+
+    python -m backend.ingest --compact --train-dictionary --report
+
+Every ``~`` line of a trail is one argument of the command named by its
+first back-quoted token (``~ Command `ProCmdModelOpen` `` -> ProCmdModelOpen);
+the surrounding lines are stored as its context, already decoded. Files are
+read line by line and written one chunk per transaction with ``executemany``.
+Arguments are deduplicated by a SHA-1 of (command, line, context), so
+re-running a file is idempotent; the checkpoint just lets a restarted run
+skip chunks that were already committed. Writes go to the backend named by
+STORAGE_BACKEND in config.py. Rows that older versions stored escaped
+(literal ``\\n``) are decoded by schema migration 5.
+
+Each load bumps the dataset version; a running API sees the new version on
+its next /commands request and drops its cached command reads then.
+``--notify-url`` makes that immediate instead.
+
+Context text is stored once per distinct text, compressed (backend/blobs.py).
+``--compact`` moves contexts written before that into blobs;
+``--train-dictionary`` trains a zstd dictionary on the stored contexts and
+re-encodes every blob with it; ``--report`` prints the bytes saved.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from backend import blobs
+from backend.storage import get_storage
+from config import CONTEXT_DICT_SIZE
+
+store = get_storage()
+
+_COMMAND_NAME = re.compile(r"`([^`]+)`")
+
+Record = Tuple[str, str, str]  # (command name, full command line, context lines)
+
+# -------------------- parsing --------------------
+def _command_name(line: str) -> Optional[str]:
+    if not line.startswith("~"):
+        return None
+    m = _COMMAND_NAME.search(line)
+    if m:
+        return m.group(1)
+    parts = line[1:].split()
+    return parts[0] if parts else None
+
+def iter_trail_records(path: str, before: int = 5, after: int = 5) -> Iterator[Record]:
+    """Yield one record per ``~`` line, holding at most before+after+1 lines."""
+    window: deque = deque(maxlen=before + after + 1)
+    pending: deque = deque()  # line numbers of ~ lines still waiting for trailing context
+    seen = 0
+
+    def emit(pos: int) -> Record:
+        lines = list(window)
+        offset = seen - len(lines)          # absolute line number of lines[0]
+        i = pos - offset
+        line = lines[i]
+        context = "\n".join(lines[max(0, i - before): i + after + 1])
+        return _command_name(line), line.strip(), context
+
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for raw in f:
+            window.append(raw.rstrip("\r\n"))
+            seen += 1
+            if _command_name(window[-1]):
+                pending.append(seen - 1)
+            while pending and pending[0] + after < seen:
+                yield emit(pending.popleft())
+        while pending:
+            yield emit(pending.popleft())
+
+def content_hash(record: Record) -> str:
+    return hashlib.sha1("\0".join(record).encode("utf-8")).hexdigest()
+
+# -------------------- loading --------------------
+async def load_chunk(records: List[Record], known_commands: Dict[str, int]) -> Tuple[int, int]:
+    """Insert one chunk in a single transaction. Returns (new commands, new arguments)."""
+    by_hash = {}
+    for rec in records:
+        by_hash.setdefault(content_hash(rec), rec)
+    return await store.insert_arguments(by_hash, known_commands)
+
+# -------------------- checkpoint --------------------
+def _load_checkpoint(path: Optional[str]) -> Dict[str, Dict[str, int]]:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def _save_checkpoint(path: Optional[str], state: Dict[str, Dict[str, int]]):
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def _file_key(path: str) -> str:
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}:{st.st_size}:{int(st.st_mtime)}"
+
+async def ingest_file(path: str, args, state, known_commands) -> Tuple[int, int]:
+    key = _file_key(path)
+    done = state.get(key, {}).get("records", 0)
+    total_commands = total_arguments = 0
+    chunk: List[Record] = []
+    n = 0
+
+    async def flush():
+        nonlocal total_commands, total_arguments, chunk
+        created, inserted = await load_chunk(chunk, known_commands)
+        total_commands += created
+        total_arguments += inserted
+        state[key] = {"records": n}
+        _save_checkpoint(args.checkpoint, state)
+        chunk = []
+
+    for rec in iter_trail_records(path, args.context_before, args.context_after):
+        n += 1
+        if n <= done:
+            continue
+        chunk.append(rec)
+        if len(chunk) >= args.chunk_size:
+            await flush()
+    if chunk:
+        await flush()
+    return total_commands, total_arguments
+
+# -------------------- context blobs --------------------
+async def train_context_dictionary(samples: int = 2000, size: int = CONTEXT_DICT_SIZE) -> Optional[int]:
+    """Train and store a dictionary from stored contexts; returns its id."""
+    texts = await store.sample_context_texts(samples)
+    if not texts:
+        return None
+    dict_id = await store.save_context_dictionary(blobs.train_dictionary(texts, size))
+    await store.load_context_dictionaries()
+    return dict_id
+
+def _percent(part: int, whole: int) -> str:
+    return f"{part / whole:.1%}" if whole else "n/a"
+
+def format_report(r: Dict[str, int]) -> List[str]:
+    plain = r["referenced_bytes"] + r["inline_bytes"]  # every row holding its own copy
+    unique = r["unique_bytes"] + r["inline_bytes"]
+    stored = r["stored_bytes"] + r["inline_bytes"]
+    return [
+        f"context rows     {r['context_rows']:>12}  ({r['inline_rows']} still inline)",
+        f"distinct texts   {r['blobs']:>12}  ({r['dictionaries']} dictionaries, codec {blobs.current_codec()})",
+        f"plain text       {plain:>12} B",
+        f"deduplicated     {unique:>12} B  {_percent(unique, plain)} of plain",
+        f"stored           {stored:>12} B  {_percent(stored, plain)} of plain",
+        f"saved            {plain - stored:>12} B",
+    ]
+
+def _notify(url: Optional[str], token: Optional[str]):
+    # ask a running API process to drop its cached command pages (admin only)
+    if not url:
+        return
+    import urllib.request
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    req = urllib.request.Request(f"{url}/admin/cache/invalidate?tag=commands", method="POST", headers=headers)
+    try:
+        urllib.request.urlopen(req, timeout=5).close()
+    except OSError as e:
+        print("cache invalidate failed:", e)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--context-before", type=int, default=5)
+    parser.add_argument("--context-after", type=int, default=5)
+    parser.add_argument("--checkpoint", default=".ingest_checkpoint.json")
+    parser.add_argument("--notify-url", help="API base URL whose read cache should be invalidated")
+    parser.add_argument("--token", default=os.environ.get("API_TOKEN"), help="admin access token for --notify-url")
+    parser.add_argument("--compact", action="store_true", help="move inline context_lines into context blobs")
+    parser.add_argument("--train-dictionary", action="store_true",
+                        help="train a zstd dictionary on stored contexts and re-encode the blobs with it")
+    parser.add_argument("--report", action="store_true", help="print context storage sizes")
+    args = parser.parse_args()
+
+    await store.init_schema()
+    await store.load_context_dictionaries()
+    if args.compact:
+        print(f"Moved {await store.compact_contexts()} context rows into blobs.")
+
+    state = _load_checkpoint(args.checkpoint)
+    known_commands: Dict[str, int] = {}
+    for path in args.files:
+        commands, arguments = await ingest_file(path, args, state, known_commands)
+        print(f"{path}: {arguments} new arguments, {commands} new commands")
+
+    if args.train_dictionary:
+        dict_id = await train_context_dictionary()
+        if dict_id is None:
+            print("No stored contexts to train a dictionary on.")
+        else:
+            print(f"Trained dictionary {dict_id}; re-encoded {await store.recompress_context_blobs()} blobs.")
+    if args.report:
+        print("\n".join(format_report(await store.context_storage_report())))
+
+    if args.files:
+        _notify(args.notify_url, args.token)
+    await store.close_pool()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,27 +1,31 @@
-from fastapi import FastAPI, Depends, HTTPException
-from pydantic import BaseModel
-from sqlalchemy import Column, Integer, String, create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base, Session
-
-# ------------------ Database Setup ------------------
-DATABASE_URL = "sqlite:///./users.db"  # You can replace with MySQL/Postgres later
+import asyncio
+import base64
+import csv
+import hmac
+import io
+import json
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
-Base = declarative_base()
+from fastapi import FastAPI, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
 
-# ------------------ Models ------------------
-class User(Base):
-    __tablename__ = "users"
+from backend.cache import cache_stats, invalidate
+from backend.encoding import CompressionMiddleware, FastJSONResponse, dumps, respond, wants_msgpack
+from backend import events, hashing, heartbeats, metrics
+from backend.models import MarkBatchModel, MarkCommandModel, NextCommandModel, RefreshTokenModel, ReleaseCommandModel, UpdateLastCmdModel
+from backend.storage import HISTORY_SORTS, get_storage
+from backend.tokens import TokenError, issue_access_token, issue_download_token, issue_refresh_token, revoke, verify_token
+from config import ACCESS_TOKEN_TTL, DOWNLOAD_TOKEN_TTL, EVENTS_KEEPALIVE, LOG_LEVEL, METRICS_TOKEN
 
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False)
-    email = Column(String, unique=True, index=True, nullable=False)
-    password = Column(String, nullable=False)
-    role = Column(String, default="user")
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# ------------------ Storage ------------------
+# MySQL or a local SQLite file, chosen by STORAGE_BACKEND in config.py
+db = get_storage()
 
 # ------------------ Pydantic Schemas ------------------
 class UserSignup(BaseModel):
@@ -35,54 +39,455 @@ class UserLogin(BaseModel):
     password: str
 
 # ------------------ FastAPI App ------------------
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db.init_schema()
+    await db.load_context_dictionaries()
+    heartbeats.start(db.flush_heartbeats)
+    yield
+    await heartbeats.stop()
+    hashing.shutdown()
+    await db.close_pool()  # writes the last buffered heartbeats
 
-# Dependency for DB
-def get_db():
-    db = SessionLocal()
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)  # outermost: timings include compression
+
+def _storage_metrics():
+    stats = db.get_pool_stats()
+    yield from metrics.gauge(
+        "db_pool_connections", "Pooled storage connections by state.",
+        {(("state", k),): stats[k] for k in ("open", "in_use", "idle", "waiting")},
+    )
+    yield from metrics.gauge("db_pool_size", "Configured pool size.", {(): stats["size"]})
+    yield from metrics.gauge(
+        "db_pool_events_total", "Connections created / discarded and checkout timeouts.",
+        {(("event", k),): stats[k] for k in ("created", "discarded", "timeouts")}, kind="counter",
+    )
+    caches = cache_stats()
+    for field in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        yield from metrics.gauge(
+            f"read_cache_{field}_total", f"Read cache {field} per cached function.",
+            {(("cache", name),): s[field] for name, s in caches.items()}, kind="counter",
+        )
+    yield from metrics.gauge("events_subscribers", "Open /events streams.", {(): events.subscriber_count()})
+    yield from metrics.gauge("last_seen_pending", "Users with a heartbeat not yet written.", {(): len(heartbeats.pending())})
+    yield from metrics.gauge("read_cache_entries", "Entries held per cached function.",
+                             {(("cache", name),): s["size"] for name, s in caches.items()})
+
+metrics.register_collector(_storage_metrics)
+
+# ------------------ Auth ------------------
+# Requests carry a signed access token (backend/tokens.py); checking it is
+# pure CPU, so no route looks the caller up in a database.
+async def current_user(authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
     try:
-        yield db
-    finally:
-        db.close()
+        return verify_token(token.strip())
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+async def download_user(
+    token: Optional[str] = None,
+    authorization: Optional[str] = Header(None)
+) -> Dict[str, Any]:
+    # export links opened by the browser carry a download token in ?token=
+    if token is None:
+        return await current_user(authorization)
+    try:
+        return verify_token(token, "download")
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+def require_role(*roles: str):
+    async def dependency(claims: Dict[str, Any] = Depends(current_user)) -> Dict[str, Any]:
+        if claims["role"] not in roles:
+            raise HTTPException(status_code=403, detail="Insufficient role")
+        return claims
+    return dependency
+
+require_admin = require_role("admin")
+
+def _check_self(claims: Dict[str, Any], user_id: int):
+    # validators may only read/write their own rows; admins may act for anyone
+    if claims["sub"] != user_id and claims["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Not allowed for this user")
+
+def _token_pair(user_id: int, role: str) -> Dict[str, Any]:
+    return {
+        "access_token": issue_access_token(user_id, role),
+        "refresh_token": issue_refresh_token(user_id, role),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL,
+    }
 
 # ------------------ Routes ------------------
 
 @app.post("/signup")
-def signup(user: UserSignup, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
+async def signup(user: UserSignup):
+    new_user = await db.create_user(user.name, user.email, user.password, user.role)
+    if new_user is None:
         raise HTTPException(status_code=400, detail="Email already registered")
+    return new_user
 
-    new_user = User(
-        name=user.name,
-        email=user.email,
-        password=user.password,  # ⚠️ plain text for now (use hashing in production)
-        role=user.role
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+@app.post("/login")
+async def login(user: UserLogin):
+    # authenticate_user also upgrades legacy / outdated password hashes
+    db_user = await db.authenticate_user(user.email, user.password)
+    if not db_user:
+        raise HTTPException(status_code=400, detail="Invalid credentials")
 
     return {
-        "id": new_user.id,
-        "name": new_user.name,
-        "email": new_user.email,
-        "role": new_user.role
+        "id": db_user["id"],
+        "name": db_user["name"],
+        "email": db_user["email"],
+        "role": db_user["role"],
+        **_token_pair(db_user["id"], db_user["role"]),
     }
 
-@app.post("/login")
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or db_user.password != user.password:
-        raise HTTPException(status_code=400, detail="Invalid credentials")
+@app.post("/token/refresh")
+async def token_refresh(body: RefreshTokenModel):
+    # The only per-session user lookup: once per access-token lifetime, so
+    # deleted users and role changes take effect within ACCESS_TOKEN_TTL.
+    try:
+        claims = verify_token(body.refresh_token, "refresh")
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    db_user = await db.get_user(claims["sub"])
+    if db_user is None:
+        raise HTTPException(status_code=401, detail="Unknown user")
+    revoke(claims)  # refresh tokens are single-use
+    return _token_pair(db_user["id"], db_user["role"])
+
+@app.post("/logout")
+async def logout(body: RefreshTokenModel, authorization: Optional[str] = Header(None)):
+    # works with an already-expired access token; whatever is still valid is revoked
+    access = (authorization or "").partition(" ")[2].strip()
+    for token, typ in ((body.refresh_token, "refresh"), (access, "access")):
+        try:
+            revoke(verify_token(token, typ))
+        except TokenError:
+            pass
+    return {"ok": True}
+
+# ------------------ Commands ------------------
+async def _stream_json_array(rows):
+    yield b"["
+    first = True
+    async for row in rows:
+        yield (b"" if first else b",") + dumps(row)
+        first = False
+    yield b"]"
+
+COMMAND_FIELDS = ("argument_id", "full_command_line", "context_lines")
+
+async def _grouped_commands(rows):
+    # Rows arrive ordered by command_id, so each command is complete when
+    # the id changes. Arguments become arrays in COMMAND_FIELDS order.
+    cmd_id, args = None, []
+    async for row in rows:
+        if row["command_id"] != cmd_id:
+            if cmd_id is not None:
+                yield {"id": cmd_id, "args": args}
+            cmd_id, args = row["command_id"], []
+        args.append([row[f] for f in COMMAND_FIELDS])
+    if cmd_id is not None:
+        yield {"id": cmd_id, "args": args}
+
+async def _stream_grouped(rows, version: int):
+    # "index" (command_id -> position in "commands") closes the object
+    yield dumps({"version": version, "fields": COMMAND_FIELDS})[:-1] + b',"commands":['
+    index: Dict[int, int] = {}
+    async for command in _grouped_commands(rows):
+        yield (b"," if index else b"") + dumps(command)
+        index[command["id"]] = len(index)
+    yield b'],"index":' + dumps(index) + b"}"
+
+async def _grouped_page(rows, version: int) -> Dict[str, Any]:
+    commands = [command async for command in _grouped_commands(rows)]
+    index = {command["id"]: i for i, command in enumerate(commands)}
+    return {"version": version, "fields": COMMAND_FIELDS, "commands": commands, "index": index}
+
+@app.get("/commands")
+async def commands(
+    after_command_id: int = 0,
+    before_command_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    grouped: bool = False,
+    accept: Optional[str] = Header(None),
+    _: Dict[str, Any] = Depends(current_user)
+):
+    # One keyset page of commands (with all their arguments/contexts),
+    # streamed row by row. Paging state travels in headers so the body can
+    # start before the last row is read. ``grouped`` nests the arguments
+    # under their command (see _grouped_commands) and stamps the page with
+    # the dataset version, which changes whenever commands are loaded; it is
+    # read first so a load by another process drops stale cached pages.
+    version = await db.get_dataset_version()
+    ids = await db.get_command_page_ids(after_command_id, limit, before_command_id)
+    if not ids:
+        empty = {"version": version, "fields": COMMAND_FIELDS, "commands": [], "index": {}} if grouped else []
+        return respond(empty, accept)
+
+    headers = {
+        "X-First-Command-Id": str(ids[0]),
+        "X-Last-Command-Id": str(ids[-1]),
+        "X-Command-Count": str(len(ids)),
+    }
+    if len(ids) == limit:
+        key = "X-Prev-Before-Command-Id" if before_command_id is not None else "X-Next-After-Command-Id"
+        headers[key] = str(ids[0] if before_command_id is not None else ids[-1])
+    rows = db.iter_commands_with_contexts(ids[0], ids[-1])
+    if wants_msgpack(accept):
+        # msgpack goes out as one packed page rather than a stream
+        page = await _grouped_page(rows, version) if grouped else [row async for row in rows]
+        return respond(page, accept, headers=headers)
+    body = _stream_grouped(rows, version) if grouped else _stream_json_array(rows)
+    return StreamingResponse(body, media_type="application/json", headers=headers)
+
+@app.get("/commands/position/{index}")
+async def command_position(index: int, _: Dict[str, Any] = Depends(current_user)):
+    return {"index": index, "command_id": await db.get_command_id_at(index)}
 
+@app.get("/contexts/{command_id}")
+async def contexts(command_id: int, accept: Optional[str] = Header(None), _: Dict[str, Any] = Depends(current_user)):
+    return respond(await db.fetch_contexts_for_command(command_id), accept)
+
+# ------------------ Classifications ------------------
+@app.post("/mark_dynamic")
+async def mark_dynamic(mark: MarkCommandModel, claims: Dict[str, Any] = Depends(current_user)):
+    _check_self(claims, mark.user_id)
+    if not await db.insert_dynamic_command(mark.user_id, mark.command_id, mark.command_text):
+        raise HTTPException(status_code=404, detail="Unknown command")
+    return {"ok": True}
+
+@app.post("/mark_static")
+async def mark_static(mark: MarkCommandModel, claims: Dict[str, Any] = Depends(current_user)):
+    _check_self(claims, mark.user_id)
+    if not await db.insert_static_command(mark.user_id, mark.command_id, mark.command_text):
+        raise HTTPException(status_code=404, detail="Unknown command")
+    return {"ok": True}
+
+MARK_BATCH_MAX = 1000
+
+@app.post("/mark_batch")
+async def mark_batch(batch: MarkBatchModel, claims: Dict[str, Any] = Depends(current_user)):
+    _check_self(claims, batch.user_id)
+    if len(batch.items) > MARK_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {MARK_BATCH_MAX} items per batch")
+    items = [item.model_dump() for item in batch.items]
+    return await db.insert_classifications(batch.user_id, items, batch.last_cmd_id)
+
+@app.get("/last_cmd/{user_id}")
+async def last_cmd(user_id: int, claims: Dict[str, Any] = Depends(current_user)):
+    _check_self(claims, user_id)
+    return {"last_cmd_id": await db.get_last_processed_cmd_id(user_id)}
+
+@app.post("/update_last_cmd")
+async def update_last_cmd(update: UpdateLastCmdModel, claims: Dict[str, Any] = Depends(current_user)):
+    _check_self(claims, update.user_id)
+    await db.update_last_processed_cmd(update.user_id, update.last_cmd_id)
+    return {"ok": True}
+
+@app.post("/next_command")
+async def next_command(body: NextCommandModel, claims: Dict[str, Any] = Depends(require_role("validator"))):
+    # Save the label for the leased command (which completes the lease),
+    # then lease the next one. Leases the client holds come back unless
+    # listed in skip, so a client can lease one ahead.
+    result = None
+    if body.label is not None:
+        label = dict(body.label.model_dump(), leased=True)
+        result = await db.insert_classifications(claims["sub"], [label], body.label.command_id)
+    lease = await db.next_command(claims["sub"], skip=body.skip)
+    if lease is None:
+        return {"command_id": None, "expires_at": None, "arguments": [], "label": result}
     return {
-        "id": db_user.id,
-        "name": db_user.name,
-        "email": db_user.email,
-        "role": db_user.role
+        "command_id": lease["command_id"],
+        "expires_at": lease["expires_at"],
+        "arguments": await db.fetch_contexts_for_command(lease["command_id"]),
+        "label": result,
     }
 
+@app.post("/release_command")
+async def release_command(body: Optional[ReleaseCommandModel] = None, claims: Dict[str, Any] = Depends(require_role("validator"))):
+    command_id = body.command_id if body is not None else None
+    return {"command_ids": await db.release_command(claims["sub"], command_id)}
+
+HISTORY_PAGE_MAX = 1000
+
+def _encode_cursor(sort: str, row: Dict[str, Any]) -> str:
+    columns, _ = HISTORY_SORTS[sort]
+    key = [row[c].isoformat() if isinstance(row[c], datetime) else row[c] for c in columns]
+    raw = json.dumps({"s": sort, "k": key}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(sort: str, cursor: str) -> Tuple[Any, ...]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data["s"] != sort:
+            raise ValueError("cursor belongs to another sort")
+        key = dict(zip(HISTORY_SORTS[sort][0], data["k"]))
+        key["processed_time"] = datetime.fromisoformat(key["processed_time"])
+        return tuple(key[c] for c in HISTORY_SORTS[sort][0])
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+@app.get("/history/{user_id}")
+async def history(
+    user_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cmd_id: Optional[int] = None,
+    action_type: str = Query("All", alias="type"),
+    sort: str = Query("command", pattern="^(command|time)$"),
+    page_size: int = Query(200, ge=1, le=HISTORY_PAGE_MAX),
+    cursor: Optional[str] = None,
+    since: Optional[int] = Query(None, ge=0),
+    accept: Optional[str] = Header(None),
+    claims: Dict[str, Any] = Depends(current_user)
+):
+    # One keyset page; pass next_cursor back (same filters and sort) for
+    # the next one. It is null on the last page.
+    #
+    # With ``since`` (a watermark from an earlier response) only rows added
+    # after it come back, oldest first, and sort/cursor are ignored. Ask
+    # again with the new watermark while a full page comes back. Ids follow
+    # insert order, not commit order, so clients start a little below the
+    # watermark they hold and drop the ids they already have.
+    _check_self(claims, user_id)
+    if since is not None:
+        rows = await db.fetch_user_history(user_id, start, end, cmd_id, action_type, "id", page_size, (since,))
+        return respond({"rows": rows, "next_cursor": None, "watermark": rows[-1]["id"] if rows else since}, accept)
+    # taken first, so rows added while the page is read are in the next delta
+    watermark = await db.get_history_watermark(user_id) if cursor is None else None
+    after = _decode_cursor(sort, cursor) if cursor else None
+    rows = await db.fetch_user_history(user_id, start, end, cmd_id, action_type, sort, page_size + 1, after)
+    next_cursor = _encode_cursor(sort, rows[page_size - 1]) if len(rows) > page_size else None
+    return respond({"rows": rows[:page_size], "next_cursor": next_cursor, "watermark": watermark}, accept)
+
+EXPORT_BATCH_ROWS = 500  # rows serialized per chunk written to the socket
+
+async def _ndjson_chunks(rows):
+    batch = []
+    async for row in rows:
+        batch.append(dumps(row))
+        if len(batch) >= EXPORT_BATCH_ROWS:
+            yield b"\n".join(batch) + b"\n"
+            batch = []
+    if batch:
+        yield b"\n".join(batch) + b"\n"
+
+_EXPORT_FIELDS = ["command_id", "command_text", "action", "processed_time"]
+
+async def _csv_chunks(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(_EXPORT_FIELDS)
+    n = 0
+    async for row in rows:
+        writer.writerow([row[f] for f in _EXPORT_FIELDS])
+        n += 1
+        if n % EXPORT_BATCH_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+@app.get("/history/{user_id}/export_token")
+async def history_export_token(user_id: int, claims: Dict[str, Any] = Depends(current_user)):
+    _check_self(claims, user_id)
+    return {"token": issue_download_token(claims["sub"], claims["role"]), "expires_in": DOWNLOAD_TOKEN_TTL}
+
+@app.get("/history/{user_id}/export")
+async def history_export(
+    user_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cmd_id: Optional[int] = None,
+    action_type: str = Query("All", alias="type"),
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    claims: Dict[str, Any] = Depends(download_user)
+):
+    # Full history (not paged), streamed from an unbuffered cursor
+    _check_self(claims, user_id)
+    rows = db.iter_user_history(user_id, start, end, cmd_id, action_type)
+    if fmt == "csv":
+        body, media_type = _csv_chunks(rows), "text/csv"
+    else:
+        body, media_type = _ndjson_chunks(rows), "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="history_{user_id}.{fmt}"'}
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+# ------------------ Admin ------------------
+@app.get("/validators", dependencies=[Depends(require_admin)])
+async def validators():
+    return await db.get_all_validators()
+
+@app.get("/validator_stats/{user_id}")
+async def validator_stats(user_id: int, claims: Dict[str, Any] = Depends(current_user)):
+    _check_self(claims, user_id)
+    return await db.get_validator_stats(user_id)
+
+@app.get("/user_counts", dependencies=[Depends(require_admin)])
+async def user_counts():
+    validator_count, viewer_count, validator_names, viewer_names = await db.get_user_counts_by_role()
+    return {
+        "validator_count": validator_count,
+        "viewer_count": viewer_count,
+        "validator_names": validator_names,
+        "viewer_names": viewer_names,
+    }
+
+@app.get("/recent_active", dependencies=[Depends(require_admin)])
+async def recent_active():
+    return await db.get_recently_active_validators()
+
+@app.get("/admin/overview", dependencies=[Depends(require_admin)])
+async def admin_overview():
+    return await db.get_admin_overview()
+
+@app.get("/admin/cache_stats", dependencies=[Depends(require_admin)])
+async def admin_cache_stats():
+    return cache_stats()
+
+@app.post("/admin/cache/invalidate", dependencies=[Depends(require_admin)])
+async def admin_cache_invalidate(tag: str):
+    # lets out-of-process writers (e.g. backend.ingest) drop stale reads
+    invalidate(tag)
+    return {"invalidated": tag}
+
+async def _sse(sub: events.Subscription):
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event_id, kind, data = await asyncio.wait_for(sub.get(), EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"  # lets proxies and the client notice dead streams
+                continue
+            yield f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
+    finally:
+        sub.close()
+
+@app.get("/events", dependencies=[Depends(require_admin)])
+async def event_stream(last_event_id: Optional[str] = Header(None)):
+    # Server-sent events from backend/events.py: "classification",
+    # "heartbeat", and "resync" when the client must reload /admin/overview.
+    # A reconnect sending Last-Event-ID gets the events it missed.
+    resume = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(_sse(events.subscribe(resume)), media_type="text/event-stream", headers=headers)
+
+# ------------------ Metrics ------------------
+@app.get("/metrics")
+async def metrics_endpoint(authorization: Optional[str] = Header(None)):
+    # Prometheus text format; scrapers can't log in, so an optional static token
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
-def root():
+async def root():
     return {"message": "Backend is running!"}
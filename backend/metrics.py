@@ -0,0 +1,199 @@
+# backend/metrics.py
+"""Prometheus-format metrics: HTTP latency per route, storage timings.
+
+Kept dependency-free and cheap enough to leave on: an observation is a
+dict lookup, a bisect over fixed buckets and two additions. Everything
+runs on the event loop thread, so no locks are taken.
+"""
+import bisect
+import functools
+import inspect
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import DB_SLOW_QUERY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        _registry.append(self)
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        _registry.append(self)
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        bounds = self.buckets + (float("inf"),)
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                le = 'le="%s"' % _num(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {total!r}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+_registry: List[Any] = []
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start to the last response byte.",
+    ("method", "route", "status"),
+)
+DB_CALL = Histogram(
+    "db_call_duration_seconds",
+    "Time spent in each storage function (connection wait and queries; read-cache hits excluded).",
+    ("function",),
+)
+DB_ROWS = Histogram("db_rows_returned", "Rows returned by each storage function.", ("function",), ROW_BUCKETS)
+DB_ERRORS = Counter("db_errors_total", "Storage functions that raised.", ("function",))
+DB_ACQUIRE = Histogram(
+    "db_connection_acquire_seconds",
+    "Wait for a pooled connection, including opening a new one.",
+)
+
+def register_collector(fn: Callable[[], Iterable[str]]):
+    """Add a callback that yields exposition lines at scrape time (gauges etc.)."""
+    _collectors.append(fn)
+
+def gauge(name: str, help: str, values: Dict[Tuple[Tuple[str, str], ...], float], kind: str = "gauge") -> Iterable[str]:
+    # values: ((label, value), ...) -> number
+    yield f"# HELP {name} {help}"
+    yield f"# TYPE {name} {kind}"
+    for labels, value in values.items():
+        yield f"{name}{_labels([k for k, _ in labels], [v for _, v in labels])} {_num(value)}"
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+# -------------------- storage timing --------------------
+def _row_count(result) -> Optional[int]:
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return 1
+    if result is None:
+        return 0
+    return None
+
+def _record(name: str, started: float, rows: Optional[int]):
+    elapsed = time.perf_counter() - started
+    DB_CALL.observe(elapsed, name)
+    if rows is not None:
+        DB_ROWS.observe(rows, name)
+    if elapsed >= DB_SLOW_QUERY_SECONDS:
+        logger.warning("slow storage call %s: %.3fs", name, elapsed)
+
+def timed(fn):
+    """Record duration, rows and errors of a storage function (async or async generator)."""
+    name = fn.__name__
+
+    if inspect.isasyncgenfunction(fn):
+        @functools.wraps(fn)
+        async def gen_wrapper(*args, **kwargs):
+            started, rows = time.perf_counter(), 0
+            try:
+                async for row in fn(*args, **kwargs):
+                    rows += 1
+                    yield row
+            except Exception:
+                DB_ERRORS.inc(name)
+                raise
+            finally:
+                _record(name, started, rows)
+        return gen_wrapper
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception:
+            DB_ERRORS.inc(name)
+            _record(name, started, None)
+            raise
+        _record(name, started, _row_count(result))
+        return result
+    return wrapper
+
+# -------------------- HTTP middleware --------------------
+class MetricsMiddleware:
+    """Pure ASGI middleware (streams untouched) timing every HTTP request.
+
+    Routes are labelled by their template ("/history/{user_id}") so label
+    cardinality stays bounded; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "<unmatched>"
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], path, status)
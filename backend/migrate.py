@@ -0,0 +1,97 @@
+# backend/migrate.py
+"""Versioned schema migrations, and an EXPLAIN check of the hot queries.
+
+    python -m backend.migrate             # apply pending migrations
+    python -m backend.migrate --status    # list applied and pending versions
+    python -m backend.migrate --explain   # exit 1 if a hot query scans a whole table
+
+Each storage backend lists its migrations in ``MIGRATIONS`` as
+(version, name, step), where ``step(cursor)`` is an async function, and
+its init_schema() hands them to run_migrations(). Versions are applied in
+order and recorded in ``schema_migrations``; MySQL commits DDL as it goes,
+so every step is written to be safe to re-run after an interruption.
+
+``--explain`` runs EXPLAIN on the backend's hot queries (``_hot_queries()``
+in backend/sql_storage.py) and flags full table reads. Plans depend on
+table statistics, so run it against a database with realistic data
+(e.g. one filled by benchmarks/gen_corpus.py).
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+from backend.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+Migration = Tuple[int, str, Callable[[Any], Awaitable[None]]]
+
+MIGRATIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT NOT NULL PRIMARY KEY,
+        name VARCHAR(128) NOT NULL,
+        applied_at TIMESTAMP NOT NULL
+    )
+"""
+
+async def applied_versions(cursor) -> Dict[int, str]:
+    await cursor.execute(MIGRATIONS_DDL)
+    await cursor.execute("SELECT version, name FROM schema_migrations ORDER BY version")
+    return {row[0]: row[1] for row in await cursor.fetchall()}
+
+async def run_migrations(conn, cursor, migrations: Sequence[Migration], placeholder: str = "%s") -> List[int]:
+    """Apply the migrations not yet recorded; returns the versions applied."""
+    done = await applied_versions(cursor)
+    await conn.commit()
+    applied = []
+    for version, name, step in sorted(migrations, key=lambda m: m[0]):
+        if version in done:
+            continue
+        logger.info("applying schema migration %d (%s)", version, name)
+        await step(cursor)
+        await cursor.execute(
+            f"INSERT INTO schema_migrations (version, name, applied_at) VALUES ({placeholder}, {placeholder}, {placeholder})",
+            (version, name, datetime.now())
+        )
+        await conn.commit()
+        applied.append(version)
+    return applied
+
+def _print_plans(results: List[Dict[str, Any]]) -> bool:
+    ok = True
+    for r in results:
+        flag = "FULL SCAN of " + ", ".join(r["full_scans"]) if r["full_scans"] else "ok"
+        ok = ok and not r["full_scans"]
+        print(f"{r['name']:32} {flag}")
+        for line in r["plan"]:
+            print(f"    {line}")
+    return ok
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--status", action="store_true", help="list migrations without applying any")
+    parser.add_argument("--explain", action="store_true", help="check the hot queries' plans for full table scans")
+    args = parser.parse_args()
+
+    store = get_storage()
+    ok = True
+    try:
+        if args.status:
+            done = await store.migration_status()
+            for version, name, _ in store.MIGRATIONS:
+                print(f"{version:4d} {name:32} {'applied' if version in done else 'pending'}")
+            return
+        applied = await store.init_schema()
+        print(f"Applied migrations: {', '.join(map(str, applied))}." if applied else "Schema is up to date.")
+        if args.explain:
+            ok = _print_plans(await store.explain_hot_queries())
+    finally:
+        await store.close_pool()
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+# backend/migrate_classifications.py
+"""One-shot copy of the legacy per-user tables into ``classifications``.
+
+    python -m backend.migrate_classifications [--batch-size 5000] [--drop]
+
+Each ``dynamic_cmds_user_N`` / ``static_cmds_user_N`` table is read in
+primary-key order, one batch per transaction, and written with
+``INSERT IGNORE`` so re-running after an interruption is safe. Rows whose
+(user, command, time, action) is already stored are skipped and reported.
+The legacy tables are only dropped with ``--drop`` once every batch has
+been copied; validator_counters is rebuilt at the end.
+"""
+import argparse
+import asyncio
+import logging
+import re
+from typing import Tuple
+
+from backend.db import storage
+
+logger = logging.getLogger(__name__)
+
+_LEGACY_TABLE = re.compile(r"^(dynamic|static)_cmds_user_(\d+)$")
+
+async def list_legacy_tables():
+    conn = await storage.get_connection()
+    cursor = await conn.cursor()
+    try:
+        await cursor.execute("SHOW TABLES")
+        tables = []
+        for (name,) in await cursor.fetchall():
+            m = _LEGACY_TABLE.match(name)
+            if m:
+                action = "Dynamic" if m.group(1) == "dynamic" else "Static"
+                tables.append((name, int(m.group(2)), action))
+        return sorted(tables, key=lambda t: (t[1], t[2]))
+    finally:
+        await cursor.close()
+        await conn.close()
+
+async def copy_table(table: str, user_id: int, action: str, batch_size: int) -> Tuple[int, int]:
+    """Returns (rows inserted, rows skipped as already stored)."""
+    copied = skipped = 0
+    last_id = 0
+    while True:
+        conn = await storage.get_connection()
+        cursor = await conn.cursor()
+        try:
+            await cursor.execute(
+                f"SELECT id, command_id, command_text, processed_time FROM {table}"
+                " WHERE id > %s ORDER BY id LIMIT %s",
+                (last_id, batch_size)
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                return copied, skipped
+            await cursor.executemany(
+                "INSERT IGNORE INTO classifications"
+                " (user_id, command_id, action, command_text, processed_time)"
+                " VALUES (%s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP(6)))",
+                [(user_id, r[1], action, r[2], r[3]) for r in rows]
+            )
+            inserted = max(cursor.rowcount, 0)
+            await conn.commit()
+            if inserted < len(rows):
+                logger.warning("%s ids %s-%s: %d rows already in classifications, skipped",
+                               table, rows[0][0], rows[-1][0], len(rows) - inserted)
+            copied += inserted
+            skipped += len(rows) - inserted
+            last_id = rows[-1][0]
+        finally:
+            await cursor.close()
+            await conn.close()
+
+async def drop_table(table: str):
+    conn = await storage.get_connection()
+    cursor = await conn.cursor()
+    try:
+        await cursor.execute(f"DROP TABLE {table}")
+        await conn.commit()
+    finally:
+        await cursor.close()
+        await conn.close()
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--drop", action="store_true", help="drop legacy tables after copying")
+    args = parser.parse_args()
+
+    try:
+        await storage.init_schema()
+        tables = await list_legacy_tables()
+        if not tables:
+            print("No legacy per-user tables found.")
+            return
+
+        total = total_skipped = 0
+        for table, user_id, action in tables:
+            n, skipped = await copy_table(table, user_id, action, args.batch_size)
+            total += n
+            total_skipped += skipped
+            print(f"{table}: {n} rows -> classifications (user {user_id}, {action}), {skipped} already present")
+
+        if args.drop:
+            for table, _, _ in tables:
+                await drop_table(table)
+            print(f"Dropped {len(tables)} legacy tables.")
+        result = await storage.reconcile_counters()
+        print(f"Done: {total} rows from {len(tables)} tables, {total_skipped} skipped; "
+              f"rebuilt counters for {result['validators']} validators.")
+    finally:
+        await storage.close_pool()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,7 @@
 # backend/models.py
+from datetime import datetime
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class SignupModel(BaseModel):
     name: str
@@ -17,6 +18,29 @@ class MarkCommandModel(BaseModel):
     command_id: int
     command_text: str
 
+class MarkItemModel(BaseModel):
+    command_id: int
+    action: str  # "Dynamic" | "Static"
+    command_text: str
+    processed_time: Optional[datetime] = None
+    leased: bool = False  # completes a lease; rejected once the lease is reclaimed
+
+class MarkBatchModel(BaseModel):
+    user_id: int
+    items: List[MarkItemModel]
+    last_cmd_id: Optional[int] = None
+
 class UpdateLastCmdModel(BaseModel):
     user_id: int
     last_cmd_id: int
+
+class RefreshTokenModel(BaseModel):
+    refresh_token: str
+
+class NextCommandModel(BaseModel):
+    # label for the currently leased command, saved before the next lease
+    label: Optional[MarkItemModel] = None
+    skip: List[int] = []  # leased commands the client already holds
+
+class ReleaseCommandModel(BaseModel):
+    command_id: Optional[int] = None  # None releases every lease
@@ -0,0 +1,196 @@
+# backend/pool.py
+import asyncio
+import inspect
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from backend.metrics import DB_ACQUIRE
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection became free within the pool timeout."""
+
+
+class PooledConnection:
+    """Thin wrapper handed out by the pool.
+
+    Behaves like the underlying connection, except that ``close()`` returns
+    it to the pool. A wrapper obtained while another operation already holds
+    a connection in the same context is *borrowed*: ``commit()`` and
+    ``close()`` become no-ops so the outer operation owns the transaction.
+    """
+
+    def __init__(self, pool: "ConnectionPool", conn, borrowed: bool = False, token=None):
+        self._pool = pool
+        self._conn = conn
+        self._borrowed = borrowed
+        self._token = token
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    async def commit(self):
+        if not self._borrowed:
+            await self._conn.commit()
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._borrowed:
+            return
+        if self._token is not None:
+            self._pool._current.reset(self._token)
+        await self._pool._release(self._conn)
+
+
+class ConnectionPool:
+    """Bounded pool of async DB connections with liveness checks and stats.
+
+    ``ping_interval=None`` turns the liveness check off (local SQLite files
+    cannot drop the connection).
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Awaitable[Any]],
+        size: int = 10,
+        timeout: float = 5.0,
+        ping_interval: Optional[float] = 5.0,
+    ):
+        self._factory = factory
+        self._size = size
+        self._timeout = timeout
+        self._ping_interval = ping_interval
+        self._idle = deque()  # (conn, released_at)
+        self._cond = asyncio.Condition()
+        self._current: ContextVar[Optional[Any]] = ContextVar(f"pool_conn_{id(self)}", default=None)
+        self._open = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._created = 0
+        self._discarded = 0
+        self._timeouts = 0
+
+    # -------------------- checkout / checkin --------------------
+    async def acquire(self, bind: bool = True) -> PooledConnection:
+        """Check out a connection.
+
+        With ``bind=True`` the connection becomes the current one for this
+        task, and nested ``acquire()`` calls borrow it instead of taking
+        another one. Use ``bind=False`` for connections that outlive the
+        calling frame (e.g. streaming generators).
+        """
+        current = self._current.get()
+        if bind and current is not None:
+            return PooledConnection(self, current, borrowed=True)
+
+        started = time.perf_counter()
+        conn = await self._checkout()
+        DB_ACQUIRE.observe(time.perf_counter() - started)
+        token = self._current.set(conn) if bind else None
+        return PooledConnection(self, conn, token=token)
+
+    async def _checkout(self):
+        async with self._cond:
+            if not self._can_checkout():
+                self._waiting += 1
+                try:
+                    await asyncio.wait_for(self._cond.wait_for(self._can_checkout), self._timeout)
+                except asyncio.TimeoutError:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"no database connection available after {self._timeout:.1f}s "
+                        f"(pool size {self._size})"
+                    ) from None
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+            if self._idle:
+                conn, released_at = self._idle.pop()
+            else:
+                self._open += 1
+                conn, released_at = None, None
+
+        try:
+            if conn is None:
+                return await self._connect()
+            stale = self._ping_interval is not None and time.monotonic() - released_at >= self._ping_interval
+            if stale and not await self._is_alive(conn):
+                await self._discard(conn, counted=False)
+                return await self._connect()
+            return conn
+        except BaseException:
+            async with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def _can_checkout(self) -> bool:
+        return bool(self._idle) or self._open < self._size
+
+    async def _connect(self):
+        conn = await self._factory()
+        self._created += 1
+        return conn
+
+    async def _is_alive(self, conn) -> bool:
+        try:
+            await conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    async def _close(conn):
+        # aiomysql's close() is synchronous, aiosqlite's is a coroutine
+        result = conn.close()
+        if inspect.isawaitable(result):
+            await result
+
+    async def _discard(self, conn, counted: bool = True):
+        await self._close(conn)
+        self._discarded += 1
+        if counted:
+            async with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+
+    async def _release(self, conn):
+        # Never hand a connection with an open transaction (or a stale
+        # REPEATABLE READ snapshot) to the next caller.
+        try:
+            await conn.rollback()
+        except Exception:
+            await self._discard(conn)
+            return
+        async with self._cond:
+            self._in_use -= 1
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    # -------------------- maintenance --------------------
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": self._size,
+            "open": self._open,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "waiting": self._waiting,
+            "created": self._created,
+            "discarded": self._discarded,
+            "timeouts": self._timeouts,
+        }
+
+    async def close_all(self):
+        async with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for conn, _ in idle:
+            await self._close(conn)
@@ -0,0 +1,22 @@
+# backend/reconcile_counters.py
+"""Rebuild validator_counters, the global command total and commands.assigned from source rows.
+
+    python -m backend.reconcile_counters
+
+Safe to run at any time; use it after bulk edits to classifications or
+commands made outside the storage module, or to check for drift.
+"""
+import asyncio
+
+from backend.storage import get_storage
+
+async def main():
+    store = get_storage()
+    await store.init_schema()
+    result = await store.reconcile_counters()
+    print(f"Rebuilt counters for {result['validators']} validators; "
+          f"commands_total = {result['commands_total']}.")
+    await store.close_pool()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,1289 @@
+# backend/sql_storage.py
+"""The storage operations, written once for both SQL backends.
+
+``SQLStorage`` holds every query and transaction of the interface in
+backend/storage.py. backend/db.py (MySQL) and backend/sqlite_db.py
+subclass it with what actually differs: the driver and connection pool,
+cursor kinds, the DDL and its migrations, lease reclaiming, EXPLAIN
+output, and the few dialect spellings below (upserts, INSERT IGNORE,
+row locks, case-insensitive roles). Queries are written with ``?``
+placeholders; the MySQL cursor translates them.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from backend import blobs, events, heartbeats
+from backend.cache import TTLCache, cached, invalidate, register
+from backend.hashing import hash_password, hash_password_async, is_plain_text, needs_rehash, verify_password_async
+from backend.metrics import timed
+from backend.migrate import Migration, applied_versions, run_migrations
+from backend.pool import ConnectionPool
+from backend.storage import HISTORY_SORTS
+from config import LEASE_MAX_HELD, LEASE_RECLAIM_BATCH, LEASE_REDUNDANCY, LEASE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+COMMANDS_TOTAL = "commands_total"
+DATASET_VERSION = "dataset_version"  # bumped by every transaction that changes served commands
+LAST_SEEN_CHUNK = 300  # users per bulk last_seen UPDATE (3 params each; SQLite allows 999)
+
+_COMMAND_ROWS = """
+    SELECT
+        a.id AS argument_id,
+        c.id AS command_id,
+        a.full_command_line,
+        ctx.context_lines,
+        ctx.blob_hash,
+        b.codec,
+        b.data
+    FROM commands c
+    JOIN arguments a ON c.id = a.command_id
+    LEFT JOIN contexts ctx ON ctx.argument_id = a.id
+    LEFT JOIN context_blobs b ON b.hash = ctx.blob_hash
+"""
+
+_HISTORY_COLUMNS = "SELECT id, command_id, command_text, action, processed_time FROM classifications"
+
+_LEASE_PICK = """
+    SELECT c.id FROM commands c
+    WHERE c.assigned < ?
+      AND NOT EXISTS (
+          SELECT 1 FROM classifications cl WHERE cl.user_id = ? AND cl.command_id = c.id
+      )
+      AND NOT EXISTS (
+          SELECT 1 FROM command_leases l WHERE l.user_id = ? AND l.command_id = c.id
+      )
+    ORDER BY c.assigned, c.id
+    LIMIT 1
+"""
+
+# Validators per command: everyone who labelled it or holds a lease on it.
+# commands.assigned is kept equal to this, and rebuilt from it.
+ASSIGNED_COUNTS = """
+    SELECT command_id, COUNT(*) AS n FROM (
+        SELECT command_id, user_id FROM classifications
+        UNION
+        SELECT command_id, user_id FROM command_leases
+    ) t
+    GROUP BY command_id
+"""
+
+async def hash_plain_passwords(cursor):
+    # Migration step shared by both backends: users.db stored passwords as
+    # typed. They are known, so they are hashed once here rather than
+    # compared in plain text at login.
+    await cursor.execute("SELECT id, password FROM users")
+    updates = [(hash_password(row[1]), row[0]) for row in await cursor.fetchall() if is_plain_text(row[1])]
+    if updates:
+        await cursor.executemany("UPDATE users SET password = ? WHERE id = ?", updates)
+
+_command_rows_cache = register(TTLCache("command_rows", maxsize=256), tags=("commands",))
+
+
+class SQLStorage:
+    # -------------------- dialect --------------------
+    MIGRATIONS: List[Migration] = []
+    Error: type = Exception             # the driver's base error
+    IntegrityError: type = Exception
+    INSERT_IGNORE = "INSERT IGNORE"
+    FOR_UPDATE = ""                     # row lock on a SELECT inside a write transaction
+    SKIP_LOCKED = ""                    # ... that also skips rows other transactions hold
+    NOCASE = ""                         # makes a role comparison case-insensitive
+
+    def upsert(self, key: str) -> str:
+        """Start of the clause that turns an INSERT into an update of ``key``'s row."""
+        raise NotImplementedError
+
+    def excluded(self, column: str) -> str:
+        """The value the INSERT tried to write to ``column``, inside upsert()."""
+        raise NotImplementedError
+
+    def byte_length(self, expr: str) -> str:
+        return f"LENGTH({expr})"
+
+    # -------------------- driver hooks --------------------
+    def _new_pool(self) -> ConnectionPool:
+        raise NotImplementedError
+
+    async def _cursor(self, conn, dicts: bool = False, stream: bool = False):
+        """A cursor whose rows are tuples, or mappings with ``dicts``;
+        ``stream`` reads rows from the server as they are fetched."""
+        raise NotImplementedError
+
+    def _dicts(self, rows) -> List[Dict[str, Any]]:
+        return [dict(row) for row in rows]
+
+    async def _release_expired(self, cursor, now: datetime):
+        """Give the slots of expired leases back; the first statement of a lease transaction."""
+        raise NotImplementedError
+
+    async def _recount_assigned(self, cursor):
+        """Set every commands.assigned from ASSIGNED_COUNTS."""
+        raise NotImplementedError
+
+    async def _explain(self, cursor, sql: str, params: Tuple[Any, ...]) -> Tuple[List[str], List[str]]:
+        """(plan lines, tables read in full) for one query."""
+        raise NotImplementedError
+
+    async def _before_close(self, conn):
+        pass
+
+    def _migration_steps(self) -> Sequence[Migration]:
+        return self.MIGRATIONS
+
+    # -------------------- CONNECTIONS --------------------
+    _pool: Optional[ConnectionPool] = None
+
+    def get_pool(self) -> ConnectionPool:
+        if self._pool is None:
+            self._pool = self._new_pool()
+        return self._pool
+
+    async def get_connection(self):
+        # Pooled; close() hands the connection back. Called while another
+        # operation holds a connection in the same task, this borrows it
+        # (same transaction).
+        return await self.get_pool().acquire()
+
+    def get_pool_stats(self) -> Dict[str, int]:
+        return self.get_pool().stats()
+
+    async def close_pool(self):
+        if self._pool is None:
+            return
+        try:
+            await self.flush_heartbeats()
+        except Exception as e:
+            logger.error("final last_seen flush failed: %s", e)
+        conn = await self._pool.acquire(bind=False)
+        try:
+            await self._before_close(conn)
+        finally:
+            await conn.close()
+        await self._pool.close_all()
+        self._pool = None
+
+    # -------------------- MIGRATIONS --------------------
+    @timed
+    async def init_schema(self) -> List[int]:
+        """Apply pending migrations; returns the versions applied."""
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            return await run_migrations(conn, cursor, self._migration_steps(), "?")
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    async def migration_status(self) -> Dict[int, str]:
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            done = await applied_versions(cursor)
+            await conn.commit()
+            return done
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    # -------------------- AUTH --------------------
+    @timed
+    async def create_user(self, name: str, email: str, plain_password: str, role: str = "validator") -> Optional[Dict[str, Any]]:
+        # Returns the new user, or None when the email is already registered.
+        # Hash before checking out a connection: the KDF is slow by design.
+        hashed = await hash_password_async(plain_password)
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute(
+                "INSERT INTO users (name, email, password, role) VALUES (?, ?, ?, ?)",
+                (name, email, hashed, role)
+            )
+            user_id = cursor.lastrowid
+            await conn.commit()
+            invalidate("users")
+            return {"id": user_id, "name": name, "email": email, "role": role}
+        except self.IntegrityError:
+            await conn.rollback()
+            return None
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn, dicts=True)
+        try:
+            await cursor.execute("SELECT id, name, email, role FROM users WHERE id = ?", (user_id,))
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def authenticate_user(self, email: str, plain_password: str) -> Optional[Dict[str, Any]]:
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn, dicts=True)
+        try:
+            await cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
+            row = await cursor.fetchone()
+        finally:
+            await cursor.close()
+            await conn.close()
+
+        if not row or not await verify_password_async(plain_password, row["password"]):
+            return None
+        if needs_rehash(row["password"]):
+            # legacy SHA-256 / plain text, or an old cost setting: upgrade now
+            # that we know the plain password
+            await self.update_password_hash(row["id"], await hash_password_async(plain_password))
+        return dict(row)
+
+    @timed
+    async def update_password_hash(self, user_id: int, hashed: str):
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute("UPDATE users SET password = ? WHERE id = ?", (hashed, user_id))
+            await conn.commit()
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    # -------------------- COMMANDS & CONTEXTS --------------------
+    async def _with_text(self, rows) -> List[Dict[str, Any]]:
+        # fills context_lines from the row's blob (see backend/blobs.py)
+        if blobs.missing_dictionaries(rows):
+            await self.load_context_dictionaries()
+        return blobs.with_text(rows)
+
+    @cached("command_pages", tags=("commands",))
+    @timed
+    async def get_command_page_ids(
+        self,
+        after_command_id: int = 0,
+        limit: int = 100,
+        before_command_id: Optional[int] = None
+    ) -> List[int]:
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            if before_command_id is not None:
+                await cursor.execute(
+                    "SELECT id FROM commands WHERE id < ? ORDER BY id DESC LIMIT ?",
+                    (before_command_id, limit)
+                )
+                return [row[0] for row in reversed(await cursor.fetchall())]
+            await cursor.execute(
+                "SELECT id FROM commands WHERE id > ? ORDER BY id ASC LIMIT ?",
+                (after_command_id, limit)
+            )
+            return [row[0] for row in await cursor.fetchall()]
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @cached("command_positions", tags=("commands",))
+    @timed
+    async def get_command_id_at(self, index: int) -> Optional[int]:
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute("SELECT id FROM commands ORDER BY id LIMIT 1 OFFSET ?", (max(0, index),))
+            row = await cursor.fetchone()
+            return row[0] if row else None
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def iter_commands_with_contexts(self, first_command_id: int, last_command_id: int, fetch_size: int = 500):
+        # Streams the join for one page of commands. The connection is not
+        # bound to the caller's context because the generator outlives the
+        # request handler frame. A page streamed to completion is kept in
+        # the read cache.
+        key = (first_command_id, last_command_id)
+        cached_rows = _command_rows_cache.get(key, None)
+        if cached_rows is not None:
+            for row in cached_rows:
+                yield row
+            return
+
+        generation = _command_rows_cache.generation
+        page = []
+        conn = await self.get_pool().acquire(bind=False)
+        cursor = await self._cursor(conn, dicts=True, stream=True)
+        try:
+            await cursor.execute(
+                _COMMAND_ROWS + " WHERE c.id BETWEEN ? AND ? ORDER BY c.id, a.id",
+                (first_command_id, last_command_id)
+            )
+            while True:
+                rows = await cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in await self._with_text(rows):
+                    page.append(row)
+                    yield row
+            _command_rows_cache.set(key, page, generation)
+        finally:
+            # closing a streaming cursor drains rows the client never read
+            # (e.g. it disconnected mid-stream), so the connection goes back usable
+            await cursor.close()
+            await conn.close()
+
+    @cached("contexts", tags=("commands",))
+    @timed
+    async def fetch_contexts_for_command(self, command_id: int) -> List[Dict[str, Any]]:
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn, dicts=True)
+        try:
+            await cursor.execute(_COMMAND_ROWS + " WHERE c.id = ? ORDER BY a.id", (command_id,))
+            return await self._with_text(await cursor.fetchall())
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    async def _command_ids(self, cursor, names: List[str], known: Dict[str, int]) -> int:
+        # Resolve command names to ids, inserting new ones. Returns how many
+        # commands were created so the global counter can be bumped.
+        missing = sorted({n for n in names if n not in known})
+        if not missing:
+            return 0
+        await cursor.executemany(f"{self.INSERT_IGNORE} INTO commands (name) VALUES (?)", [(n,) for n in missing])
+        created = cursor.rowcount if cursor.rowcount and cursor.rowcount > 0 else 0
+        placeholders = ", ".join(["?"] * len(missing))
+        await cursor.execute(f"SELECT id, name FROM commands WHERE name IN ({placeholders})", tuple(missing))
+        for cmd_id, name in await cursor.fetchall():
+            known[name] = cmd_id
+        return created
+
+    async def _store_blobs(self, cursor, texts: Dict[str, str]) -> int:
+        # each distinct context is compressed and written once, by content hash
+        if not texts:
+            return 0
+        placeholders = ", ".join(["?"] * len(texts))
+        await cursor.execute(f"SELECT hash FROM context_blobs WHERE hash IN ({placeholders})", tuple(texts))
+        existing = {row[0] for row in await cursor.fetchall()}
+        rows = [(h, *blobs.compress(text)) for h, text in texts.items() if h not in existing]
+        if rows:
+            await cursor.executemany(
+                f"{self.INSERT_IGNORE} INTO context_blobs (hash, codec, raw_size, data) VALUES (?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    @timed
+    async def insert_arguments(self, records: Dict[str, Tuple[str, str, str]], known_commands: Dict[str, int]) -> Tuple[int, int]:
+        """Load one ingest chunk in a single transaction.
+
+        ``records`` maps content hash -> (command name, full command line,
+        context lines); hashes already stored are skipped, and context text
+        goes to context_blobs once per distinct text. ``known_commands`` is
+        the caller's name -> id cache. Returns (new commands, new arguments).
+        """
+        if not blobs.dictionaries_loaded():
+            await self.load_context_dictionaries()
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            created_commands = await self._command_ids(cursor, [r[0] for r in records.values()], known_commands)
+            if created_commands:
+                # borrows this connection: the total moves with the chunk
+                # (the caches are invalidated once it commits)
+                await self.add_commands_total(created_commands)
+
+            hashes = list(records)
+            placeholders = ", ".join(["?"] * len(hashes))
+            await cursor.execute(f"SELECT content_hash FROM arguments WHERE content_hash IN ({placeholders})", tuple(hashes))
+            existing = {row[0] for row in await cursor.fetchall()}
+            new = [(h, records[h]) for h in hashes if h not in existing]
+
+            if new:
+                await cursor.executemany(
+                    "INSERT INTO arguments (command_id, full_command_line, content_hash) VALUES (?, ?, ?)",
+                    [(known_commands[rec[0]], rec[1], h) for h, rec in new]
+                )
+                placeholders = ", ".join(["?"] * len(new))
+                await cursor.execute(
+                    f"SELECT id, content_hash FROM arguments WHERE content_hash IN ({placeholders})",
+                    tuple(h for h, _ in new)
+                )
+                arg_ids = {h: arg_id for arg_id, h in await cursor.fetchall()}
+                blob_hashes = {h: blobs.content_hash(rec[2]) for h, rec in new}
+                await self._store_blobs(cursor, {blob_hashes[h]: rec[2] for h, rec in new})
+                await cursor.executemany(
+                    "INSERT INTO contexts (argument_id, blob_hash) VALUES (?, ?)",
+                    [(arg_ids[h], blob_hashes[h]) for h, _ in new]
+                )
+            if created_commands or new:
+                await self._bump_dataset_version(cursor)
+            await conn.commit()
+            if created_commands or new:
+                invalidate("commands")
+            return created_commands, len(new)
+        except Exception:
+            await conn.rollback()
+            raise
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    # -------------------- CONTEXT BLOBS --------------------
+    # Maintenance for backend/blobs.py, driven by python -m backend.ingest.
+
+    async def load_context_dictionaries(self) -> int:
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute("SELECT id, data FROM context_dicts ORDER BY id")
+            rows = await cursor.fetchall()
+            blobs.set_dictionaries((row[0], row[1]) for row in rows)
+            return len(rows)
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    async def save_context_dictionary(self, data: bytes) -> int:
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute("INSERT INTO context_dicts (data, created_at) VALUES (?, ?)", (data, datetime.now()))
+            dict_id = cursor.lastrowid
+            await conn.commit()
+            return dict_id
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    async def sample_context_texts(self, limit: int = 2000) -> List[str]:
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            # hashes are uniformly spread, so the first ones are a fair sample
+            await cursor.execute("SELECT codec, data FROM context_blobs ORDER BY hash LIMIT ?", (limit,))
+            return [blobs.decompress(row[0], row[1]) for row in await cursor.fetchall()]
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def compact_contexts(self, batch_size: int = 5000) -> int:
+        """Move inline context_lines into blobs, one id range per transaction."""
+        if not blobs.dictionaries_loaded():
+            await self.load_context_dictionaries()
+        moved = 0
+        last_id = 0
+        while True:
+            conn = await self.get_connection()
+            cursor = await self._cursor(conn)
+            try:
+                await cursor.execute(
+                    "SELECT id, context_lines FROM contexts WHERE id > ? AND blob_hash IS NULL ORDER BY id LIMIT ?",
+                    (last_id, batch_size)
+                )
+                rows = await cursor.fetchall()
+                if not rows:
+                    return moved
+                texts, updates = {}, []
+                for ctx_id, text in rows:
+                    if text is not None:
+                        blob_hash = blobs.content_hash(text)
+                        texts[blob_hash] = text
+                        updates.append((blob_hash, ctx_id))
+                await self._store_blobs(cursor, texts)
+                if updates:
+                    await cursor.executemany("UPDATE contexts SET blob_hash = ?, context_lines = NULL WHERE id = ?", updates)
+                    await self._bump_dataset_version(cursor)
+                await conn.commit()
+                moved += len(updates)
+                last_id = rows[-1][0]
+            except Exception:
+                await conn.rollback()
+                raise
+            finally:
+                await cursor.close()
+                await conn.close()
+
+    @timed
+    async def recompress_context_blobs(self, batch_size: int = 1000) -> int:
+        """Re-encode blobs written with an older codec or dictionary."""
+        codec = blobs.current_codec()
+        done = 0
+        last_hash = ""
+        while True:
+            conn = await self.get_connection()
+            cursor = await self._cursor(conn)
+            try:
+                await cursor.execute(
+                    "SELECT hash, codec, data FROM context_blobs WHERE hash > ? AND codec <> ? ORDER BY hash LIMIT ?",
+                    (last_hash, codec, batch_size)
+                )
+                rows = await cursor.fetchall()
+                if not rows:
+                    return done
+                updates = []
+                for blob_hash, old_codec, data in rows:
+                    new_codec, _, new_data = blobs.compress(blobs.decompress(old_codec, data))
+                    updates.append((new_codec, new_data, blob_hash))
+                await cursor.executemany("UPDATE context_blobs SET codec = ?, data = ? WHERE hash = ?", updates)
+                await self._bump_dataset_version(cursor)
+                await conn.commit()
+                done += len(updates)
+                last_hash = rows[-1][0]
+            except Exception:
+                await conn.rollback()
+                raise
+            finally:
+                await cursor.close()
+                await conn.close()
+
+    async def context_storage_report(self) -> Dict[str, int]:
+        """Row, blob and byte counts behind ``python -m backend.ingest --report``."""
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn, dicts=True)
+        try:
+            await cursor.execute(f"""
+                SELECT
+                    COUNT(*) AS context_rows,
+                    COALESCE(SUM(ctx.blob_hash IS NULL), 0) AS inline_rows,
+                    COALESCE(SUM({self.byte_length("ctx.context_lines")}), 0) AS inline_bytes,
+                    COALESCE(SUM(b.raw_size), 0) AS referenced_bytes
+                FROM contexts ctx
+                LEFT JOIN context_blobs b ON b.hash = ctx.blob_hash
+            """)
+            report = dict(await cursor.fetchone())
+            await cursor.execute("""
+                SELECT
+                    COUNT(*) AS blobs,
+                    COALESCE(SUM(raw_size), 0) AS unique_bytes,
+                    COALESCE(SUM(LENGTH(data)), 0) AS stored_bytes
+                FROM context_blobs
+            """)
+            report.update(dict(await cursor.fetchone()))
+            await cursor.execute("SELECT COUNT(*) AS dictionaries FROM context_dicts")
+            report.update(dict(await cursor.fetchone()))
+            return {k: int(v) for k, v in report.items()}
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    # -------------------- CLASSIFICATIONS --------------------
+    async def _known_commands(self, cursor, cmd_ids) -> set:
+        # the ids that exist; every label path checks before inserting
+        if not cmd_ids:
+            return set()
+        placeholders = ", ".join(["?"] * len(cmd_ids))
+        await cursor.execute(f"SELECT id FROM commands WHERE id IN ({placeholders})", tuple(cmd_ids))
+        return {row[0] for row in await cursor.fetchall()}
+
+    @timed
+    async def insert_classification(self, user_id: int, cmd_id: int, command_text: str, action: str) -> bool:
+        # False (nothing stored) when the command does not exist
+        result = await self.insert_classifications(
+            user_id, [{"command_id": cmd_id, "action": action, "command_text": command_text}]
+        )
+        return all(r["reason"] != "unknown command" for r in result["rejected"])
+
+    @timed
+    async def insert_classifications(
+        self,
+        user_id: int,
+        items: List[Dict[str, Any]],
+        last_cmd_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        # Batch of labels in one transaction: unknown actions/commands, labels
+        # already stored (same key as the primary key, e.g. a resent batch)
+        # and late labels for a lease that was reclaimed are rejected per
+        # item, the rest go in with one executemany per action.
+        now = datetime.now()
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            # Renewing the validator's open leases locks them against
+            # reclaiming (and, being a write, takes SQLite's write lock)
+            # before they are read.
+            await cursor.execute(
+                "UPDATE command_leases SET expires_at = ? WHERE user_id = ? AND expires_at > ?",
+                (now + timedelta(seconds=LEASE_SECONDS), user_id, now)
+            )
+            await cursor.execute("SELECT command_id FROM command_leases WHERE user_id = ?" + self.FOR_UPDATE, (user_id,))
+            leased = {row[0] for row in await cursor.fetchall()}
+
+            rejected = []
+            cmd_ids = {item["command_id"] for item in items}
+            known = await self._known_commands(cursor, cmd_ids)
+            stored = set()
+            if cmd_ids:
+                placeholders = ", ".join(["?"] * len(cmd_ids))
+                await cursor.execute(
+                    f"SELECT command_id, processed_time, action FROM classifications"
+                    f" WHERE user_id = ? AND command_id IN ({placeholders})",
+                    (user_id, *cmd_ids)
+                )
+                stored = {tuple(row) for row in await cursor.fetchall()}
+            # a validator's first label on a command takes one of its
+            # redundancy slots: the lease's, or a new one when unleased
+            labelled = {key[0] for key in stored}
+
+            params, covered = [], set()
+            for i, item in enumerate(items):
+                cmd_id = item["command_id"]
+                key = (cmd_id, item.get("processed_time") or now, item["action"])
+                first = cmd_id not in leased and cmd_id not in labelled
+                if item["action"] not in ("Dynamic", "Static"):
+                    rejected.append({"index": i, "command_id": cmd_id, "reason": "invalid action"})
+                elif cmd_id not in known:
+                    rejected.append({"index": i, "command_id": cmd_id, "reason": "unknown command"})
+                elif key in stored:
+                    rejected.append({"index": i, "command_id": cmd_id, "reason": "duplicate"})
+                elif first and item.get("leased"):
+                    rejected.append({"index": i, "command_id": cmd_id, "reason": "lease expired"})
+                else:
+                    if first:
+                        covered.add(cmd_id)
+                    stored.add(key)
+                    labelled.add(cmd_id)
+                    params.append((user_id, cmd_id, key[2], item.get("command_text"), key[1]))
+
+            # IGNORE only matters when a concurrent request stored the same
+            # key since the check above; rowcount keeps the counters exact
+            counts = {}
+            for action in ("Dynamic", "Static"):
+                rows = [p for p in params if p[2] == action]
+                counts[action] = 0
+                if rows:
+                    await cursor.executemany(f"""
+                        {self.INSERT_IGNORE} INTO classifications (user_id, command_id, action, command_text, processed_time)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, rows)
+                    counts[action] = max(cursor.rowcount, 0)
+            accepted = counts["Dynamic"] + counts["Static"]
+            if covered:
+                placeholders = ", ".join(["?"] * len(covered))
+                await cursor.execute(
+                    f"UPDATE commands SET assigned = assigned + 1 WHERE id IN ({placeholders})", tuple(covered)
+                )
+            if accepted:
+                await self._complete_leases(cursor, user_id)
+                await self.bump_validator_counters(
+                    user_id,
+                    dynamic=counts["Dynamic"],
+                    static=counts["Static"],
+                    last_command_id=params[-1][1]
+                )
+            if last_cmd_id is not None:
+                await self.update_last_processed_cmd(user_id, last_cmd_id)
+            await conn.commit()
+            if accepted:
+                heartbeats.beat(user_id)
+                events.publish("classification", {
+                    "user_id": user_id,
+                    "dynamic": counts["Dynamic"],
+                    "static": counts["Static"],
+                    "last_command_id": params[-1][1],
+                    "at": now,
+                })
+            return {"accepted": accepted, "rejected": rejected}
+        except self.Error:
+            await conn.rollback()
+            raise
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def insert_dynamic_command(self, user_id: int, cmd_id: int, command_text: str) -> bool:
+        return await self.insert_classification(user_id, cmd_id, command_text, "Dynamic")
+
+    @timed
+    async def insert_static_command(self, user_id: int, cmd_id: int, command_text: str) -> bool:
+        return await self.insert_classification(user_id, cmd_id, command_text, "Static")
+
+    # -------------------- WORK LEASES --------------------
+    # Validators ask for work instead of walking the command list: next_command
+    # leases them a command that fewer than ``redundancy`` validators have
+    # taken (least covered first) and they have not labelled. Labelling it
+    # completes the lease; an expired lease gives its slot back, and a label
+    # sent for it after it was reclaimed is rejected. Labels stored without
+    # a lease take a slot of their own.
+
+    async def _complete_leases(self, cursor, user_id: int):
+        # inside the labelling transaction, after the INSERT; matched against
+        # the stored labels since a batch can exceed SQLite's parameter limit.
+        # The command keeps its assigned slot.
+        await cursor.execute("""
+            DELETE FROM command_leases
+            WHERE user_id = ? AND EXISTS (
+                SELECT 1 FROM classifications cl
+                WHERE cl.user_id = command_leases.user_id AND cl.command_id = command_leases.command_id
+            )
+        """, (user_id,))
+
+    async def _drop_leases(self, cursor, user_id: int, cmd_ids: Sequence[int]) -> List[int]:
+        # gives each lease's slot back; one row at a time so a lease reclaimed
+        # concurrently (rowcount 0) is not given back twice
+        dropped = []
+        for cmd_id in cmd_ids:
+            await cursor.execute("DELETE FROM command_leases WHERE user_id = ? AND command_id = ?", (user_id, cmd_id))
+            if cursor.rowcount > 0:
+                await cursor.execute("UPDATE commands SET assigned = assigned - 1 WHERE id = ?", (cmd_id,))
+                dropped.append(cmd_id)
+        return dropped
+
+    @timed
+    async def next_command(
+        self,
+        user_id: int,
+        redundancy: int = LEASE_REDUNDANCY,
+        lease_seconds: float = LEASE_SECONDS,
+        skip: Sequence[int] = ()
+    ) -> Optional[Dict[str, Any]]:
+        """Lease a command to the validator; None when no work is left.
+
+        The validator's open leases are renewed and the oldest one not in
+        ``skip`` (commands the client already shows or holds) comes back
+        first, so a client can lease its next command ahead of time.
+        """
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=lease_seconds)
+        skip = set(skip)
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await self._release_expired(cursor, now)
+            await cursor.execute(
+                "SELECT command_id, expires_at FROM command_leases WHERE user_id = ? ORDER BY leased_at" + self.FOR_UPDATE,
+                (user_id,)
+            )
+            rows = await cursor.fetchall()
+            held = [row[0] for row in rows if row[1] > now]
+            lapsed = [row[0] for row in rows if row[1] <= now]  # another caller's batch had them locked
+            ready = [cmd_id for cmd_id in held if cmd_id not in skip]
+            await self._drop_leases(cursor, user_id, lapsed)
+            await cursor.execute(
+                "UPDATE command_leases SET expires_at = ? WHERE user_id = ? AND expires_at > ?", (expires_at, user_id, now)
+            )
+            if ready:
+                await conn.commit()
+                return {"command_id": ready[0], "expires_at": expires_at}
+
+            await cursor.execute(_LEASE_PICK + self.SKIP_LOCKED, (redundancy, user_id, user_id))
+            row = await cursor.fetchone()
+            if row is None:
+                await conn.commit()
+                return None
+            # beyond the cap the oldest leases go back, after the pick so it
+            # cannot hand one of them out again
+            await self._drop_leases(cursor, user_id, held[:max(len(held) - LEASE_MAX_HELD + 1, 0)])
+            await cursor.execute("UPDATE commands SET assigned = assigned + 1 WHERE id = ?", (row[0],))
+            await cursor.execute(
+                "INSERT INTO command_leases (user_id, command_id, leased_at, expires_at) VALUES (?, ?, ?, ?)",
+                (user_id, row[0], now, expires_at)
+            )
+            await conn.commit()
+            return {"command_id": row[0], "expires_at": expires_at}
+        except self.Error:
+            await conn.rollback()
+            raise
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def release_command(self, user_id: int, cmd_id: Optional[int] = None) -> List[int]:
+        """Hand the validator's leased commands (or just ``cmd_id``) back to the pool; returns their ids."""
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            if cmd_id is not None:
+                held = [cmd_id]
+            else:
+                await cursor.execute("SELECT command_id FROM command_leases WHERE user_id = ?" + self.FOR_UPDATE, (user_id,))
+                held = [row[0] for row in await cursor.fetchall()]
+            released = await self._drop_leases(cursor, user_id, held)
+            await conn.commit()
+            return released
+        except self.Error:
+            await conn.rollback()
+            raise
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    # -------------------- HISTORY --------------------
+    @staticmethod
+    def _history_filters(
+        user_id: int,
+        start_dt: Optional[datetime],
+        end_dt: Optional[datetime],
+        cmd_id: Optional[int],
+        action_type: str
+    ) -> Optional[Tuple[str, Tuple[Any, ...]]]:
+        # WHERE clause shared by the capped list and the export; None means the
+        # type filter can match nothing
+        where = ["user_id = ?"]
+        params: List[Any] = [user_id]
+        if action_type in ("Dynamic", "Static"):
+            where.append("action = ?"); params.append(action_type)
+        elif action_type != "All":
+            return None
+        if start_dt:
+            where.append("processed_time >= ?"); params.append(start_dt)
+        if end_dt:
+            where.append("processed_time <= ?"); params.append(end_dt)
+        if cmd_id is not None:
+            where.append("command_id = ?"); params.append(cmd_id)
+        return " WHERE " + " AND ".join(where), tuple(params)
+
+    @staticmethod
+    def _after_key(columns: Sequence[str], descending: bool, values: Tuple[Any, ...]) -> Tuple[str, Tuple[Any, ...]]:
+        # "(c1, c2) > (?, ?)" spelled out as "c1 > ? OR (c1 = ? AND c2 > ?)":
+        # MySQL does not turn a row-value comparison into an index range
+        op = "<" if descending else ">"
+        sql, params = f"{columns[-1]} {op} ?", (values[-1],)
+        for column, value in zip(reversed(columns[:-1]), reversed(values[:-1])):
+            sql = f"{column} {op} ? OR ({column} = ? AND ({sql}))"
+            params = (value, value) + params
+        return f"({sql})", params
+
+    @timed
+    async def fetch_user_history(
+        self,
+        user_id: int,
+        start_dt: Optional[datetime],
+        end_dt: Optional[datetime],
+        cmd_id: Optional[int],
+        action_type: str = "All",
+        sort: str = "command",
+        limit: int = 200,
+        after: Optional[Tuple[Any, ...]] = None
+    ) -> List[Dict[str, Any]]:
+        # One keyset page: rows strictly after ``after`` (the previous page's
+        # last key in HISTORY_SORTS[sort] order). The key predicate is an
+        # index range start, so every page costs the same.
+        filters = self._history_filters(user_id, start_dt, end_dt, cmd_id, action_type)
+        if filters is None:
+            return []
+        where, params = filters
+        columns, descending = HISTORY_SORTS[sort]
+        if after is not None:
+            key, key_params = self._after_key(columns, descending, tuple(after))
+            where += " AND " + key
+            params += key_params
+        order = ", ".join(f"{c} {'DESC' if descending else 'ASC'}" for c in columns)
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn, dicts=True)
+        try:
+            await cursor.execute(_HISTORY_COLUMNS + where + f" ORDER BY {order} LIMIT ?", params + (limit,))
+            return self._dicts(await cursor.fetchall())
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def get_history_watermark(self, user_id: int) -> int:
+        # Highest classification id of the user: history read at or after this
+        # point can be brought up to date with fetch_user_history(sort="id",
+        # after=(watermark,)). Ids only grow, unlike client-supplied times,
+        # but a row committed late can hold an id below it.
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute("SELECT COALESCE(MAX(id), 0) FROM classifications WHERE user_id = ?", (user_id,))
+            row = await cursor.fetchone()
+            return int(row[0])
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def iter_user_history(
+        self,
+        user_id: int,
+        start_dt: Optional[datetime],
+        end_dt: Optional[datetime],
+        cmd_id: Optional[int],
+        action_type: str = "All",
+        fetch_size: int = 1000
+    ):
+        # Every matching row, oldest command first, from a streaming cursor:
+        # memory stays flat however long the history. Unbound connection, as
+        # for iter_commands_with_contexts.
+        filters = self._history_filters(user_id, start_dt, end_dt, cmd_id, action_type)
+        if filters is None:
+            return
+        where, params = filters
+        conn = await self.get_pool().acquire(bind=False)
+        cursor = await self._cursor(conn, dicts=True, stream=True)
+        try:
+            await cursor.execute(_HISTORY_COLUMNS + where + " ORDER BY command_id ASC, processed_time ASC", params)
+            while True:
+                rows = await cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in self._dicts(rows):
+                    yield row
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    # -------------------- LAST PROCESSED & HEARTBEATS --------------------
+    @timed
+    async def get_last_processed_cmd_id(self, user_id: int) -> int:
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute("SELECT last_processed_cmd_id FROM users WHERE id = ?", (user_id,))
+            result = await cursor.fetchone()
+            return result[0] if result and result[0] else 0
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def update_last_processed_cmd(self, user_id: int, cmd_id: int):
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute("UPDATE users SET last_processed_cmd_id = ? WHERE id = ?", (cmd_id, user_id))
+            await conn.commit()
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def write_last_seen(self, seen: Dict[int, datetime]):
+        # one UPDATE per chunk of users instead of one per label
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            items = list(seen.items())
+            for i in range(0, len(items), LAST_SEEN_CHUNK):
+                chunk = items[i:i + LAST_SEEN_CHUNK]
+                cases = " ".join(["WHEN ? THEN ?"] * len(chunk))
+                ids = ", ".join(["?"] * len(chunk))
+                params = [v for pair in chunk for v in pair] + [user_id for user_id, _ in chunk]
+                await cursor.execute(f"UPDATE users SET last_seen = CASE id {cases} END WHERE id IN ({ids})", params)
+            await conn.commit()
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    async def flush_heartbeats(self) -> int:
+        """Write buffered heartbeats (backend/heartbeats.py); returns users updated."""
+        return await heartbeats.flush(self.write_last_seen)
+
+    # -------------------- ADMIN / STATS --------------------
+    @cached("validators", tags=("users",), maxsize=1)
+    @timed
+    async def get_all_validators(self) -> List[Dict[str, Any]]:
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn, dicts=True)
+        try:
+            await cursor.execute(f"SELECT id, name FROM users WHERE role = 'validator'{self.NOCASE}")
+            return self._dicts(await cursor.fetchall())
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def get_user_counts_by_role(self):
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute(
+                f"SELECT role, name FROM users WHERE role{self.NOCASE} IN ('validator', 'viewer') ORDER BY id"
+            )
+            names: Dict[str, List[str]] = {"validator": [], "viewer": []}
+            for role, name in await cursor.fetchall():
+                names[role.lower()].append(name)
+            validator_names, viewer_names = names["validator"], names["viewer"]
+            return len(validator_names), len(viewer_names), validator_names, viewer_names
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def get_recently_active_validators(self, limit: int = 10):
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn, dicts=True)
+        try:
+            await cursor.execute(f"""
+                SELECT id, name, last_seen FROM users
+                WHERE role = 'validator'{self.NOCASE}
+                ORDER BY last_seen DESC
+                LIMIT ?
+            """, (limit,))
+            rows = self._dicts(await cursor.fetchall())
+            # validators with unflushed heartbeats may be missing from the stored top N
+            listed = {r["id"] for r in rows}
+            missing = [user_id for user_id in heartbeats.pending() if user_id not in listed]
+            if missing:
+                placeholders = ", ".join(["?"] * len(missing))
+                await cursor.execute(
+                    f"SELECT id, name, last_seen FROM users WHERE role = 'validator'{self.NOCASE} AND id IN ({placeholders})",
+                    tuple(missing)
+                )
+                rows += self._dicts(await cursor.fetchall())
+            for r in rows:
+                r["last_seen"] = heartbeats.latest(r["id"], r["last_seen"])
+            rows.sort(key=lambda r: r["last_seen"] or datetime.min, reverse=True)
+            return rows[:limit]
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @cached("commands_total", tags=("commands",), maxsize=1)
+    @timed
+    async def get_commands_total(self) -> int:
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute("SELECT value FROM global_counters WHERE name = ?", (COMMANDS_TOTAL,))
+            row = await cursor.fetchone()
+            return row[0] if row is not None else 0  # seeded by a migration
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    async def _bump_dataset_version(self, cursor):
+        # inside the transaction that changes the data, so a reader never
+        # sees new rows under the old version
+        await cursor.execute(
+            f"INSERT INTO global_counters (name, value) VALUES (?, 1) "
+            f"{self.upsert('name')} value = value + 1",
+            (DATASET_VERSION,)
+        )
+
+    _dataset_version: Optional[int] = None
+
+    @timed
+    async def get_dataset_version(self) -> int:
+        # Read through no cache: it is what tells clients their cached pages
+        # are stale. A change made by another process (python -m
+        # backend.ingest) also drops this process's command caches.
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute("SELECT value FROM global_counters WHERE name = ?", (DATASET_VERSION,))
+            row = await cursor.fetchone()
+        finally:
+            await cursor.close()
+            await conn.close()
+        version = row[0] if row is not None else 0
+        if version != self._dataset_version:
+            if self._dataset_version is not None:
+                invalidate("commands")
+            self._dataset_version = version
+        return version
+
+    @timed
+    async def add_commands_total(self, delta: int):
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute(
+                f"INSERT INTO global_counters (name, value) VALUES (?, ?) "
+                f"{self.upsert('name')} value = value + {self.excluded('value')}",
+                (COMMANDS_TOTAL, delta)
+            )
+            await conn.commit()
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def bump_validator_counters(self, user_id: int, dynamic: int, static: int, last_command_id: Optional[int]):
+        # Called from the insert paths; borrows their connection so the counter
+        # moves in the same transaction as the classification rows.
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute(f"""
+                INSERT INTO validator_counters
+                    (user_id, dynamic_count, static_count, processed_count, last_command_id, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                {self.upsert('user_id')}
+                    dynamic_count = dynamic_count + {self.excluded('dynamic_count')},
+                    static_count = static_count + {self.excluded('static_count')},
+                    processed_count = processed_count + {self.excluded('processed_count')},
+                    last_command_id = {self.excluded('last_command_id')},
+                    updated_at = {self.excluded('updated_at')}
+            """, (user_id, dynamic, static, dynamic + static, last_command_id, datetime.now()))
+            await conn.commit()
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def get_validator_stats(self, user_id: int):
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute(
+                "SELECT dynamic_count, static_count, processed_count FROM validator_counters WHERE user_id = ?",
+                (user_id,)
+            )
+            row = await cursor.fetchone()
+            dynamic_count, static_count, processed = tuple(row) if row else (0, 0, 0)
+
+            total_commands = await self.get_commands_total()
+            return {
+                "dynamic": dynamic_count,
+                "static": static_count,
+                "processed": processed,
+                "remaining": max(0, total_commands - processed),
+                "total": total_commands
+            }
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def reconcile_counters(self) -> Dict[str, int]:
+        # Rebuild validator_counters, the command total and commands.assigned
+        # from source rows. Concurrent inserts wait until the rebuild commits
+        # (InnoDB share-locks the rows INSERT ... SELECT reads; SQLite's
+        # DELETE takes the write lock), so the result is exact.
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn)
+        try:
+            await cursor.execute("DELETE FROM validator_counters")
+            await cursor.execute("""
+                INSERT INTO validator_counters
+                    (user_id, dynamic_count, static_count, processed_count, last_command_id, updated_at)
+                SELECT user_id,
+                       SUM(action = 'Dynamic'),
+                       SUM(action = 'Static'),
+                       COUNT(*),
+                       (SELECT c2.command_id FROM classifications c2
+                        WHERE c2.user_id = c.user_id
+                        ORDER BY c2.processed_time DESC LIMIT 1),
+                       ?
+                FROM classifications c
+                GROUP BY user_id
+            """, (datetime.now(),))
+            validators = cursor.rowcount
+            await cursor.execute("SELECT COUNT(*) FROM commands")
+            total = (await cursor.fetchone())[0] or 0
+            await cursor.execute(
+                f"INSERT INTO global_counters (name, value) VALUES (?, ?) "
+                f"{self.upsert('name')} value = {self.excluded('value')}",
+                (COMMANDS_TOTAL, total)
+            )
+            await self._recount_assigned(cursor)
+            await conn.commit()
+            invalidate("commands")
+            return {"validators": validators, COMMANDS_TOTAL: total}
+        except self.Error:
+            await conn.rollback()
+            raise
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    @timed
+    async def get_admin_overview(self, recent_limit: int = 10) -> Dict[str, Any]:
+        # Everything the admin pages show, from three set-based queries:
+        # command total, per-validator label counts (users joined to
+        # validator_counters), and role counts/names.
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn, dicts=True)
+        try:
+            total_commands = await self.get_commands_total()
+
+            await cursor.execute(f"""
+                SELECT u.id, u.name, u.last_seen, u.last_processed_cmd_id,
+                       COALESCE(c.dynamic_count, 0) AS dynamic,
+                       COALESCE(c.static_count, 0) AS static
+                FROM users u
+                LEFT JOIN validator_counters c ON c.user_id = u.id
+                WHERE u.role = 'validator'{self.NOCASE}
+                ORDER BY u.id
+            """)
+            validators = []
+            for row in await cursor.fetchall():
+                dynamic, static = int(row["dynamic"]), int(row["static"])
+                processed = dynamic + static
+                validators.append({
+                    "id": row["id"],
+                    "name": row["name"],
+                    "last_seen": heartbeats.latest(row["id"], row["last_seen"]),
+                    "last_processed_cmd_id": row["last_processed_cmd_id"] or 0,
+                    "dynamic": dynamic,
+                    "static": static,
+                    "processed": processed,
+                    "remaining": max(0, total_commands - processed),
+                })
+
+            validator_count, viewer_count, validator_names, viewer_names = await self.get_user_counts_by_role()
+
+            seen = [v for v in validators if v["last_seen"] is not None]
+            seen.sort(key=lambda v: v["last_seen"], reverse=True)
+            recent = [{"id": v["id"], "name": v["name"], "last_seen": v["last_seen"]} for v in seen[:recent_limit]]
+
+            return {
+                "total_commands": total_commands,
+                "validators": validators,
+                "validator_count": validator_count,
+                "viewer_count": viewer_count,
+                "validator_names": validator_names,
+                "viewer_names": viewer_names,
+                "recent_activity": recent,
+            }
+        finally:
+            await cursor.close()
+            await conn.close()
+
+    # -------------------- EXPLAIN CHECK --------------------
+    def _hot_queries(self) -> List[Tuple[str, str, Tuple[Any, ...]]]:
+        # (name, sql, sample params) for the per-request queries above; whole-
+        # table reads (validator lists, overview, reconcile) are left out.
+        now = datetime.now()
+        history = []
+        for sort, (columns, descending) in HISTORY_SORTS.items():
+            for action in ("All", "Dynamic"):
+                where, params = self._history_filters(1, now - timedelta(days=7), now, None, action)
+                sample = tuple(now if c == "processed_time" else "Static" if c == "action" else 1 for c in columns)
+                key, key_params = self._after_key(columns, descending, sample)
+                order = ", ".join(f"{c} {'DESC' if descending else 'ASC'}" for c in columns)
+                history.append((f"history_{sort}_{action.lower()}",
+                                _HISTORY_COLUMNS + where + " AND " + key + f" ORDER BY {order} LIMIT ?",
+                                params + key_params + (200,)))
+        return [
+            ("login", "SELECT * FROM users WHERE email = ?", ("a@b.c",)),
+            ("get_user", "SELECT id, name, email, role FROM users WHERE id = ?", (1,)),
+            ("command_page", "SELECT id FROM commands WHERE id > ? ORDER BY id ASC LIMIT ?", (0, 100)),
+            ("command_page_before", "SELECT id FROM commands WHERE id < ? ORDER BY id DESC LIMIT ?", (100, 100)),
+            ("command_rows", _COMMAND_ROWS + " WHERE c.id BETWEEN ? AND ? ORDER BY c.id, a.id", (1, 100)),
+            ("contexts_for_command", _COMMAND_ROWS + " WHERE c.id = ? ORDER BY a.id", (1,)),
+            ("argument_hashes", "SELECT content_hash FROM arguments WHERE content_hash IN (?, ?)", ("a", "b")),
+            ("blob_hashes", "SELECT hash FROM context_blobs WHERE hash IN (?, ?)", ("a", "b")),
+            ("command_names", "SELECT id, name FROM commands WHERE name IN (?, ?)", ("a", "b")),
+            *history,
+            ("history_export", _HISTORY_COLUMNS + " WHERE user_id = ? ORDER BY command_id ASC, processed_time ASC", (1,)),
+            ("history_watermark", "SELECT COALESCE(MAX(id), 0) FROM classifications WHERE user_id = ?", (1,)),
+            ("last_processed", "SELECT last_processed_cmd_id FROM users WHERE id = ?", (1,)),
+            ("validator_stats", "SELECT dynamic_count, static_count, processed_count FROM validator_counters WHERE user_id = ?", (1,)),
+            ("recent_active", f"SELECT id, name, last_seen FROM users WHERE role = 'validator'{self.NOCASE} ORDER BY last_seen DESC LIMIT ?", (10,)),
+            ("lease_held", "SELECT command_id, expires_at FROM command_leases WHERE user_id = ? ORDER BY leased_at", (1,)),
+            ("lease_expired", "SELECT user_id, command_id FROM command_leases WHERE expires_at <= ? ORDER BY expires_at LIMIT ?", (now, LEASE_RECLAIM_BATCH)),
+            ("lease_pick", _LEASE_PICK, (1, 1, 1)),
+        ]
+
+    async def explain_hot_queries(self) -> List[Dict[str, Any]]:
+        """EXPLAIN every hot query; ``full_scans`` names tables read in full."""
+        conn = await self.get_connection()
+        cursor = await self._cursor(conn, dicts=True)
+        try:
+            results = []
+            for name, sql, params in self._hot_queries():
+                plan, full_scans = await self._explain(cursor, sql, params)
+                results.append({"name": name, "plan": plan, "full_scans": full_scans})
+            return results
+        finally:
+            await cursor.close()
+            await conn.close()
@@ -0,0 +1,287 @@
+# backend/sqlite_db.py
+# SQLite storage (aiosqlite), so the API, ingest and the benchmarks run
+# against one local file with no MySQL server. The queries live in
+# backend/sql_storage.py; this module adds the driver, the DDL and its
+# migrations, and SQLite's dialect.
+import sqlite3
+from datetime import datetime
+from typing import List, Any, Tuple
+
+import aiosqlite
+
+from config import SQLITE_PATH, SQLITE_POOL_SIZE, SQLITE_BUSY_TIMEOUT, SQLITE_CACHED_STATEMENTS
+from config import SQLITE_CACHE_MB, SQLITE_MMAP_MB, DB_POOL_TIMEOUT
+from backend.pool import ConnectionPool
+from backend.migrate import Migration
+from backend.sql_storage import ASSIGNED_COUNTS, COMMANDS_TOTAL, SQLStorage, hash_plain_passwords
+
+# TIMESTAMP columns round-trip as datetime, like aiomysql returns them
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" ", "microseconds"))
+sqlite3.register_converter("TIMESTAMP", lambda b: datetime.fromisoformat(b.decode()))
+
+_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",          # readers never block the writer
+    "PRAGMA synchronous = NORMAL",        # fsync at checkpoints only; safe with WAL
+    f"PRAGMA cache_size = -{SQLITE_CACHE_MB * 1024}",
+    f"PRAGMA mmap_size = {SQLITE_MMAP_MB * 1024 * 1024}",
+    "PRAGMA temp_store = MEMORY",
+)
+
+# -------------------- SCHEMA --------------------
+# Same tables and keys as backend/db.py. SQLite has no inline KEYs, so the
+# secondary indexes are separate statements.
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        email TEXT NOT NULL COLLATE NOCASE,
+        password TEXT NOT NULL,
+        role TEXT NOT NULL DEFAULT 'validator' COLLATE NOCASE,
+        last_seen TIMESTAMP NULL,
+        last_processed_cmd_id INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_users_email ON users (email)",
+    """
+    CREATE TABLE IF NOT EXISTS classifications (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        command_id INTEGER NOT NULL,
+        action TEXT NOT NULL CHECK (action IN ('Dynamic', 'Static')),
+        command_text TEXT,
+        processed_time TIMESTAMP NOT NULL,
+        UNIQUE (user_id, command_id, processed_time, action)
+    )
+    """,
+    # InnoDB appends the primary key to every secondary index; SQLite only
+    # appends the rowid, so the history keyset columns are spelled out.
+    "CREATE INDEX IF NOT EXISTS idx_classifications_user_action_time_key ON classifications (user_id, action, processed_time, command_id)",
+    "CREATE INDEX IF NOT EXISTS idx_classifications_user_time_key ON classifications (user_id, processed_time, command_id, action)",
+    "CREATE INDEX IF NOT EXISTS idx_classifications_user_id ON classifications (user_id, id)",
+    """
+    CREATE TABLE IF NOT EXISTS validator_counters (
+        user_id INTEGER PRIMARY KEY,
+        dynamic_count INTEGER NOT NULL DEFAULT 0,
+        static_count INTEGER NOT NULL DEFAULT 0,
+        processed_count INTEGER NOT NULL DEFAULT 0,
+        last_command_id INTEGER NULL,
+        updated_at TIMESTAMP NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS global_counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS commands (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        assigned INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS command_leases (
+        user_id INTEGER PRIMARY KEY,
+        command_id INTEGER NOT NULL,
+        leased_at TIMESTAMP NOT NULL,
+        expires_at TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_command_leases_expires ON command_leases (expires_at)",
+    """
+    CREATE TABLE IF NOT EXISTS arguments (
+        id INTEGER PRIMARY KEY,
+        command_id INTEGER NOT NULL,
+        full_command_line TEXT,
+        content_hash TEXT NULL UNIQUE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_arguments_command ON arguments (command_id, id)",
+    """
+    CREATE TABLE IF NOT EXISTS contexts (
+        id INTEGER PRIMARY KEY,
+        argument_id INTEGER NOT NULL,
+        context_lines TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_contexts_argument ON contexts (argument_id)",
+)
+
+async def _ensure_column(cursor, table: str, column: str, definition: str):
+    # users.db files written by the old SQLAlchemy model lack these columns
+    await cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row["name"] for row in await cursor.fetchall()}:
+        await cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+# -------------------- MIGRATIONS --------------------
+# Same versions as backend/db.py, applied by init_schema() through
+# backend.migrate; never edit a released step, append a new version.
+
+async def _m001_baseline(cursor):
+    for ddl in SCHEMA:
+        await cursor.execute(ddl)
+    await _ensure_column(cursor, "users", "last_seen", "TIMESTAMP NULL")
+    await _ensure_column(cursor, "users", "last_processed_cmd_id", "INTEGER NOT NULL DEFAULT 0")
+    await _ensure_column(cursor, "commands", "assigned", "INTEGER NOT NULL DEFAULT 0")
+    await cursor.execute("CREATE INDEX IF NOT EXISTS idx_commands_assigned ON commands (assigned, id)")
+
+async def _m002_required_indexes(cursor):
+    await cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_users_email ON users (email)")
+    await cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_role_seen ON users (role, last_seen)")
+    await cursor.execute("CREATE INDEX IF NOT EXISTS idx_arguments_command ON arguments (command_id, id)")
+    await cursor.execute("CREATE INDEX IF NOT EXISTS idx_contexts_argument ON contexts (argument_id)")
+
+async def _m003_context_blobs(cursor):
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS context_blobs (
+            hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            raw_size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    """)
+    await cursor.execute("""
+        CREATE TABLE IF NOT EXISTS context_dicts (
+            id INTEGER PRIMARY KEY,
+            data BLOB NOT NULL,
+            created_at TIMESTAMP NOT NULL
+        )
+    """)
+    await _ensure_column(cursor, "contexts", "blob_hash", "TEXT NULL")
+
+async def _m004_commands_total(cursor):
+    # seeded here rather than on first read, which needed a connection of its own
+    await cursor.execute(
+        "INSERT OR IGNORE INTO global_counters (name, value) SELECT ?, COUNT(*) FROM commands", (COMMANDS_TOTAL,)
+    )
+
+async def _m005_decode_contexts(cursor):
+    # MySQL decodes contexts the first ingest script stored escaped; SQLite
+    # files were only ever loaded decoded. Kept so versions match.
+    pass
+
+async def _m006_drop_short_history_indexes(cursor):
+    # superseded by the *_key indexes in the baseline; files created before
+    # those existed still carry them
+    await cursor.execute("DROP INDEX IF EXISTS idx_classifications_user_action_time")
+    await cursor.execute("DROP INDEX IF EXISTS idx_classifications_user_time")
+
+async def _m007_leases_per_command(cursor):
+    # a validator holds several leases (the command shown and the ones
+    # leased ahead); SQLite cannot change a primary key, so the table is rebuilt
+    await cursor.execute("DROP TABLE IF EXISTS command_leases_new")
+    await cursor.execute("""
+        CREATE TABLE command_leases_new (
+            user_id INTEGER NOT NULL,
+            command_id INTEGER NOT NULL,
+            leased_at TIMESTAMP NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (user_id, command_id)
+        )
+    """)
+    await cursor.execute("INSERT INTO command_leases_new SELECT user_id, command_id, leased_at, expires_at FROM command_leases")
+    await cursor.execute("DROP TABLE command_leases")
+    await cursor.execute("ALTER TABLE command_leases_new RENAME TO command_leases")
+    await cursor.execute("CREATE INDEX IF NOT EXISTS idx_command_leases_expires ON command_leases (expires_at)")
+
+async def _recount_assigned(cursor):
+    await cursor.execute("UPDATE commands SET assigned = 0 WHERE assigned <> 0")
+    await cursor.execute(f"""
+        UPDATE commands SET assigned = a.n
+        FROM ({ASSIGNED_COUNTS}) a
+        WHERE a.command_id = commands.id
+    """)
+
+async def _m008_recount_assigned(cursor):
+    # assigned came in with DEFAULT 0, so commands labelled before leases
+    # existed (or copied in by migrate_classifications) looked unassigned
+    await _recount_assigned(cursor)
+
+MIGRATIONS: List[Migration] = [
+    (1, "baseline", _m001_baseline),
+    (2, "required_indexes", _m002_required_indexes),
+    (3, "context_blobs", _m003_context_blobs),
+    (4, "commands_total", _m004_commands_total),
+    (5, "decode_contexts", _m005_decode_contexts),
+    (6, "drop_short_history_indexes", _m006_drop_short_history_indexes),
+    (7, "leases_per_command", _m007_leases_per_command),
+    (8, "recount_assigned", _m008_recount_assigned),
+    (9, "hash_plain_passwords", hash_plain_passwords),
+]
+
+# -------------------- STORAGE --------------------
+def _full_scans(plan: List[str]) -> List[str]:
+    # "SCAN t" reads the whole table; "SCAN t USING [COVERING] INDEX" walks
+    # an index in order, which the LIMITed keyset queries stop early
+    return [d.split()[1] for d in plan if d.startswith("SCAN ") and " USING " not in d and d != "SCAN CONSTANT ROW"]
+
+class SQLiteStorage(SQLStorage):
+    # SQLite has no row locks to skip: every lease and label transaction
+    # opens with a write (releasing expired leases, renewing open ones),
+    # which takes the database write lock, so concurrent callers run one at
+    # a time.
+    MIGRATIONS = MIGRATIONS
+    Error = sqlite3.Error
+    IntegrityError = sqlite3.IntegrityError
+    INSERT_IGNORE = "INSERT OR IGNORE"
+    NOCASE = " COLLATE NOCASE"
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+
+    def upsert(self, key: str) -> str:
+        return f"ON CONFLICT ({key}) DO UPDATE SET"
+
+    def excluded(self, column: str) -> str:
+        return f"excluded.{column}"
+
+    def byte_length(self, expr: str) -> str:
+        return f"LENGTH(CAST({expr} AS BLOB))"  # LENGTH of TEXT counts characters
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(
+            self.path,
+            timeout=SQLITE_BUSY_TIMEOUT,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=SQLITE_CACHED_STATEMENTS,
+            isolation_level="IMMEDIATE",  # take the write lock up front, not on upgrade
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in _PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    def _new_pool(self) -> ConnectionPool:
+        return ConnectionPool(self._connect, size=SQLITE_POOL_SIZE, timeout=DB_POOL_TIMEOUT, ping_interval=None)
+
+    async def _cursor(self, conn, dicts: bool = False, stream: bool = False):
+        # rows are sqlite3.Row either way, and SQLite steps statements lazily
+        return await conn.cursor()
+
+    async def _before_close(self, conn):
+        await conn.execute("PRAGMA optimize")
+
+    async def _release_expired(self, cursor, now: datetime) -> int:
+        await cursor.execute("""
+            UPDATE commands
+            SET assigned = assigned - (
+                SELECT COUNT(*) FROM command_leases l
+                WHERE l.command_id = commands.id AND l.expires_at <= ?
+            )
+            WHERE id IN (SELECT command_id FROM command_leases WHERE expires_at <= ?)
+        """, (now, now))
+        await cursor.execute("DELETE FROM command_leases WHERE expires_at <= ?", (now,))
+        return cursor.rowcount
+
+    async def _recount_assigned(self, cursor):
+        await _recount_assigned(cursor)
+
+    async def _explain(self, cursor, sql: str, params: Tuple[Any, ...]) -> Tuple[List[str], List[str]]:
+        await cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        plan = [row["detail"] for row in await cursor.fetchall()]
+        return plan, _full_scans(plan)
+
+storage = SQLiteStorage()
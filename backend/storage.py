@@ -0,0 +1,90 @@
+# backend/storage.py
+"""One interface over the storage backends.
+
+backend/db.py (MySQL) and backend/sqlite_db.py (one local SQLite file) each
+define a ``storage`` object, a subclass of the shared SQLStorage in
+backend/sql_storage.py. ``get_storage()`` imports the one named by
+STORAGE_BACKEND in config.py; ``Storage`` lists the surface callers rely on.
+"""
+import importlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Protocol, Sequence, Tuple
+
+from config import LEASE_REDUNDANCY, LEASE_SECONDS, STORAGE_BACKEND
+
+_BACKENDS = {
+    "mysql": "backend.db",
+    "sqlite": "backend.sqlite_db",
+}
+
+# Keyset orders for fetch_user_history: sort -> (key columns, descending).
+# Every key is unique per user and served by an index on (user_id, <key>...).
+# "id" is insertion order; the history delta sync pages through it.
+HISTORY_SORTS = {
+    "command": (("command_id", "processed_time", "action"), False),
+    "time": (("processed_time", "command_id", "action"), True),
+    "id": (("id",), False),
+}
+
+class Storage(Protocol):
+    # lifecycle (see backend/migrate.py)
+    MIGRATIONS: List[Tuple[int, str, Any]]
+    async def init_schema(self) -> List[int]: ...
+    async def migration_status(self) -> Dict[int, str]: ...
+    async def explain_hot_queries(self) -> List[Dict[str, Any]]: ...
+    async def close_pool(self) -> None: ...
+    def get_pool_stats(self) -> Dict[str, int]: ...
+
+    # users
+    async def create_user(self, name: str, email: str, plain_password: str, role: str = "validator") -> Optional[Dict[str, Any]]: ...
+    async def authenticate_user(self, email: str, plain_password: str) -> Optional[Dict[str, Any]]: ...
+    async def get_user(self, user_id: int) -> Optional[Dict[str, Any]]: ...
+    async def update_password_hash(self, user_id: int, hashed: str) -> None: ...
+
+    # commands and contexts
+    async def get_command_page_ids(self, after_command_id: int = 0, limit: int = 100, before_command_id: Optional[int] = None) -> List[int]: ...
+    async def get_command_id_at(self, index: int) -> Optional[int]: ...
+    async def get_commands_total(self) -> int: ...
+    async def get_dataset_version(self) -> int: ...
+    def iter_commands_with_contexts(self, first_command_id: int, last_command_id: int, fetch_size: int = 500) -> AsyncIterator[Dict[str, Any]]: ...
+    async def fetch_contexts_for_command(self, command_id: int) -> List[Dict[str, Any]]: ...
+    async def insert_arguments(self, records: Dict[str, Tuple[str, str, str]], known_commands: Dict[str, int]) -> Tuple[int, int]: ...
+
+    # context blobs (see backend/blobs.py)
+    async def load_context_dictionaries(self) -> int: ...
+    async def save_context_dictionary(self, data: bytes) -> int: ...
+    async def sample_context_texts(self, limit: int = 2000) -> List[str]: ...
+    async def compact_contexts(self, batch_size: int = 5000) -> int: ...
+    async def recompress_context_blobs(self, batch_size: int = 1000) -> int: ...
+    async def context_storage_report(self) -> Dict[str, int]: ...
+
+    # classifications
+    async def insert_dynamic_command(self, user_id: int, cmd_id: int, command_text: str) -> bool: ...
+    async def insert_static_command(self, user_id: int, cmd_id: int, command_text: str) -> bool: ...
+    async def insert_classifications(self, user_id: int, items: List[Dict[str, Any]], last_cmd_id: Optional[int] = None) -> Dict[str, Any]: ...
+    async def fetch_user_history(self, user_id: int, start_dt: Optional[datetime], end_dt: Optional[datetime], cmd_id: Optional[int], action_type: str = "All", sort: str = "command", limit: int = 200, after: Optional[Tuple[Any, ...]] = None) -> List[Dict[str, Any]]: ...
+    async def get_history_watermark(self, user_id: int) -> int: ...
+    def iter_user_history(self, user_id: int, start_dt: Optional[datetime], end_dt: Optional[datetime], cmd_id: Optional[int], action_type: str = "All", fetch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]: ...
+    async def get_last_processed_cmd_id(self, user_id: int) -> int: ...
+    async def update_last_processed_cmd(self, user_id: int, cmd_id: int) -> None: ...
+    async def flush_heartbeats(self) -> int: ...
+
+    # work leases
+    async def next_command(self, user_id: int, redundancy: int = LEASE_REDUNDANCY, lease_seconds: float = LEASE_SECONDS, skip: Sequence[int] = ()) -> Optional[Dict[str, Any]]: ...
+    async def release_command(self, user_id: int, cmd_id: Optional[int] = None) -> List[int]: ...
+
+    # stats
+    async def get_all_validators(self) -> List[Dict[str, Any]]: ...
+    async def get_user_counts_by_role(self) -> Tuple[int, int, List[str], List[str]]: ...
+    async def get_recently_active_validators(self, limit: int = 10) -> List[Dict[str, Any]]: ...
+    async def get_validator_stats(self, user_id: int) -> Dict[str, int]: ...
+    async def get_admin_overview(self, recent_limit: int = 10) -> Dict[str, Any]: ...
+    async def reconcile_counters(self) -> Dict[str, int]: ...
+
+def get_storage(name: str = STORAGE_BACKEND) -> Storage:
+    # imported lazily so each backend's driver is only needed when used
+    try:
+        module = _BACKENDS[name.lower()]
+    except KeyError:
+        raise ValueError(f"unknown STORAGE_BACKEND {name!r}; expected one of {sorted(_BACKENDS)}") from None
+    return importlib.import_module(module).storage
@@ -0,0 +1,82 @@
+# backend/tokens.py
+import base64
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from typing import Any, Dict
+
+from config import TOKEN_SECRET, ALLOW_DEV_TOKEN_SECRET, DEV_TOKEN_SECRET, ACCESS_TOKEN_TTL, REFRESH_TOKEN_TTL, DOWNLOAD_TOKEN_TTL
+
+# Token format: <base64url(json claims)>.<base64url(HMAC-SHA256 of the first part)>
+# Claims: sub (user id), role, typ ("access" | "refresh" | "download"), iat, exp, jti.
+
+class TokenError(Exception):
+    """Token is malformed, has a bad signature, is expired or revoked."""
+
+if not TOKEN_SECRET and not ALLOW_DEV_TOKEN_SECRET:
+    # anyone who knows a fallback secret could sign their own admin token
+    raise RuntimeError("TOKEN_SECRET is not set; set it, or ALLOW_DEV_TOKEN_SECRET=1 for local development")
+
+_key = (TOKEN_SECRET or DEV_TOKEN_SECRET).encode()
+_revoked: Dict[str, float] = {}  # jti -> exp; entries drop out once they would be expired anyway
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(body: str) -> str:
+    return _b64(hmac.new(_key, body.encode(), hashlib.sha256).digest())
+
+def _issue(user_id: int, role: str, typ: str, ttl: int) -> str:
+    now = int(time.time())
+    claims = {
+        "sub": user_id,
+        "role": (role or "").lower(),
+        "typ": typ,
+        "iat": now,
+        "exp": now + ttl,
+        "jti": uuid.uuid4().hex,
+    }
+    body = _b64(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{body}.{_sign(body)}"
+
+def issue_access_token(user_id: int, role: str) -> str:
+    return _issue(user_id, role, "access", ACCESS_TOKEN_TTL)
+
+def issue_refresh_token(user_id: int, role: str) -> str:
+    return _issue(user_id, role, "refresh", REFRESH_TOKEN_TTL)
+
+def issue_download_token(user_id: int, role: str) -> str:
+    # travels in a URL (browser downloads can't send headers), so it is
+    # short-lived and accepted by the export routes only
+    return _issue(user_id, role, "download", DOWNLOAD_TOKEN_TTL)
+
+def verify_token(token: str, typ: str = "access") -> Dict[str, Any]:
+    """Check signature, type, expiry and revocation; CPU only, no DB."""
+    try:
+        body, sig = token.split(".")
+    except (AttributeError, ValueError):
+        raise TokenError("malformed token") from None
+    if not hmac.compare_digest(sig, _sign(body)):
+        raise TokenError("bad signature")
+    try:
+        claims = json.loads(_unb64(body))
+    except ValueError:
+        raise TokenError("malformed token") from None
+    if claims.get("typ") != typ:
+        raise TokenError(f"expected {typ} token")
+    if claims.get("exp", 0) <= time.time():
+        raise TokenError("token expired")
+    if claims.get("jti") in _revoked:
+        raise TokenError("token revoked")
+    return claims
+
+def revoke(claims: Dict[str, Any]):
+    now = time.time()
+    for jti in [j for j, exp in _revoked.items() if exp <= now]:
+        del _revoked[jti]
+    _revoked[claims["jti"]] = claims["exp"]
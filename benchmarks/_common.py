@@ -0,0 +1,11 @@
+# benchmarks/_common.py
+"""Helpers shared by the benchmark scripts."""
+from typing import List
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank ``pct`` percentile of ``samples``; 0.0 when there are none."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[k]
@@ -0,0 +1,103 @@
+# benchmarks/bench_concurrency.py
+"""Requests/second of a running backend at several concurrency levels.
+
+    ALLOW_DEV_TOKEN_SECRET=1 uvicorn backend.main:app --workers 1 --port 8000
+    python benchmarks/bench_concurrency.py --url http://127.0.0.1:8000 \\
+        --email admin@example.com --password ... \\
+        --concurrency 50 200 --duration 20 --label async
+
+Routes need a bearer token; log in as an admin so the mix can hit every
+route for any of the ``--users`` ids.
+
+To compare against the synchronous backend, check out the revision before
+the async conversion, start it the same way, and run again with
+``--label sync``. Results are printed and, with ``--out``, appended as one
+JSON object per run.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import httpx
+
+from _common import percentile
+
+# (method, path, weight) — a validator-heavy read/write mix
+DEFAULT_MIX = [
+    ("GET", "/commands?limit=20", 4),
+    ("GET", "/last_cmd/{user_id}", 2),
+    ("GET", "/history/{user_id}", 2),
+    ("GET", "/validator_stats/{user_id}", 1),
+    ("GET", "/validators", 1),
+]
+
+async def _worker(client, mix, user_ids, deadline, latencies, errors):
+    paths = [m for m in mix for _ in range(m[2])]
+    while time.perf_counter() < deadline:
+        method, path, _ = random.choice(paths)
+        url = path.format(user_id=random.choice(user_ids))
+        t0 = time.perf_counter()
+        try:
+            res = await client.request(method, url)
+            await res.aread()
+            if res.status_code >= 500:
+                errors.append(res.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - t0)
+
+async def login(url, email, password):
+    async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+        res = await client.post("/login", json={"email": email, "password": password})
+        res.raise_for_status()
+        return res.json()["access_token"]
+
+async def run_level(url, concurrency, duration, user_ids, mix=DEFAULT_MIX, token=None):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"Authorization": f"Bearer {token}"} if token else None
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30, headers=headers) as client:
+        latencies, errors = [], []
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            _worker(client, mix, user_ids, deadline, latencies, errors)
+            for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per level")
+    parser.add_argument("--users", type=int, nargs="+", default=[1], help="validator ids to query")
+    parser.add_argument("--email", help="log in as this user before the run")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--label", default="", help="tag stored with the results, e.g. sync/async")
+    parser.add_argument("--out", help="append JSON results to this file")
+    args = parser.parse_args()
+
+    token = await login(args.url, args.email, args.password) if args.email else None
+    for level in args.concurrency:
+        result = await run_level(args.url, level, args.duration, args.users, token=token)
+        result["label"] = args.label
+        print(json.dumps(result))
+        if args.out:
+            with open(args.out, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+# benchmarks/bench_login.py
+"""Login throughput and p99 latency for several scrypt cost settings.
+
+    python benchmarks/bench_login.py --costs 12 13 14 15 --concurrency 32 --logins 256
+
+For each cost (log2 of scrypt N) this hashes one password, then runs
+``--logins`` verifications through the same bounded process pool the API
+uses, ``--concurrency`` at a time. Meanwhile a probe task measures how late
+the event loop wakes up, i.e. how much logins would delay every other
+request on the worker. Output is one JSON line per cost.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _common import percentile  # noqa: E402
+from backend import hashing  # noqa: E402
+
+async def _probe(stop: asyncio.Event, lags):
+    # a well-behaved loop wakes this task ~every 10ms
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - t0 - 0.01)
+
+async def run_cost(log2_n: int, logins: int, concurrency: int):
+    n = 2 ** log2_n
+    stored = hashing.hash_password("correct horse battery staple", n=n)
+    limit = asyncio.Semaphore(concurrency)
+    latencies, lags = [], []
+
+    async def one():
+        async with limit:
+            t0 = time.perf_counter()
+            ok = await hashing.verify_password_async("correct horse battery staple", stored)
+            latencies.append(time.perf_counter() - t0)
+            assert ok
+
+    await hashing.verify_password_async("warm-up", stored)  # start the worker processes
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(logins)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    return {
+        "scrypt_n": f"2^{log2_n}",
+        "workers": hashing.HASH_WORKERS,
+        "concurrency": concurrency,
+        "logins_per_s": round(logins / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "loop_lag_p99_ms": round(percentile(lags, 99) * 1000, 2),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--costs", type=int, nargs="+", default=[12, 13, 14, 15], help="log2 of scrypt N")
+    parser.add_argument("--logins", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--out", help="append JSON results to this file")
+    args = parser.parse_args()
+
+    try:
+        for cost in args.costs:
+            result = await run_cost(cost, args.logins, args.concurrency)
+            print(json.dumps(result))
+            if args.out:
+                with open(args.out, "a") as f:
+                    f.write(json.dumps(result) + "\n")
+    finally:
+        hashing.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,170 @@
+# benchmarks/bench_payloads.py
+"""Bytes on the wire and serialization CPU for the large responses.
+
+    STORAGE_BACKEND=sqlite SQLITE_PATH=bench.db ALLOW_DEV_TOKEN_SECRET=1 \\
+    python benchmarks/bench_payloads.py --manifest bench_corpus.json --out payloads.json
+
+Runs the app in-process against a gen_corpus.py database and fetches
+/commands (flat and grouped), /contexts/{command_id} and /history/{user_id}
+once per response encoding. It records the body bytes as sent and the
+median request time for each. The "before" column is the same payload
+encoded the way the server did it before backend/encoding.py: the stdlib
+encoder, with no compression.
+
+The CPU table times each encoder on the same payload, read straight from
+storage. "stdlib" is the old path: jsonable_encoder plus json.dumps for
+plain responses, and one json.dumps per row for streamed ones. The
+gzip/zstd rows time the compression of the fast-JSON body on its own.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from backend import encoding  # noqa: E402
+from config import GZIP_LEVEL, ZSTD_LEVEL  # noqa: E402
+
+VARIANTS = [
+    ("json", {"Accept-Encoding": "identity"}),
+    ("json+gzip", {"Accept-Encoding": "gzip"}),
+    ("json+zstd", {"Accept-Encoding": "zstd"}),
+    ("msgpack", {"Accept": encoding.MSGPACK, "Accept-Encoding": "identity"}),
+    ("msgpack+zstd", {"Accept": encoding.MSGPACK, "Accept-Encoding": "zstd"}),
+]
+
+def _old_plain(payload: Any) -> bytes:
+    # FastAPI's default path for a returned dict/list
+    from fastapi.encoders import jsonable_encoder
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode()
+
+def _old_stream(rows: List[Dict[str, Any]]) -> bytes:
+    # the old /commands stream: one json.dumps per row
+    return ("[" + ",".join(json.dumps(row, default=str) for row in rows) + "]").encode()
+
+def _timed(fn: Callable[[], Any], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return round(statistics.median(samples) * 1000, 3)
+
+def _cpu(payload: Any, old: Callable[[Any], bytes], repeat: int) -> Dict[str, float]:
+    fast = encoding.dumps(payload)
+    result = {
+        "stdlib": _timed(lambda: old(payload), repeat),
+        "orjson" if encoding.orjson is not None else "json": _timed(lambda: encoding.dumps(payload), repeat),
+        "gzip": _timed(lambda: zlib.compress(fast, GZIP_LEVEL), repeat),
+    }
+    if encoding.msgpack is not None:
+        result["msgpack"] = _timed(lambda: encoding.packb(payload), repeat)
+    if encoding.zstandard is not None:
+        result["zstd"] = _timed(lambda: encoding.zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(fast), repeat)
+    return result
+
+async def _wire(client: httpx.AsyncClient, url: str, params: Dict[str, Any], headers: Dict[str, str], repeat: int) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for name, extra in VARIANTS:
+        if ("msgpack" in name and encoding.msgpack is None) or ("zstd" in name and encoding.zstandard is None):
+            continue
+        samples, size = [], None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            res = await client.get(url, params=params, headers={**headers, **extra})
+            await res.aread()
+            samples.append(time.perf_counter() - t0)
+            size = res.num_bytes_downloaded  # as sent, before decompression
+        out[name] = {"bytes": size, "ms": round(statistics.median(samples) * 1000, 2)}
+    return out
+
+async def run(args) -> Dict[str, Any]:
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    validator = max(manifest["validators"], key=lambda v: v.get("labels", 0))
+
+    from backend.main import _grouped_commands, app, db
+    results: Dict[str, Any] = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://inprocess", timeout=60) as client:
+            res = await client.post("/login", json={"email": validator["email"], "password": validator["password"]})
+            headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+            ids = await db.get_command_page_ids(0, args.page_size)
+            rows = [row async for row in db.iter_commands_with_contexts(ids[0], ids[-1])]
+            contexts = await db.fetch_contexts_for_command(ids[len(ids) // 2])
+            history = await db.fetch_user_history(validator["id"], None, None, None, "All", "command", args.history_size)
+            history_body = {"rows": history, "next_cursor": None, "watermark": 0}
+
+            async def _rows():
+                for row in rows:
+                    yield row
+            grouped = [c async for c in _grouped_commands(_rows())]
+
+            cases: List[Tuple[str, str, Dict[str, Any], Any, Callable[[Any], bytes]]] = [
+                ("GET /commands", "/commands", {"limit": args.page_size}, rows, _old_stream),
+                ("GET /commands?grouped", "/commands", {"limit": args.page_size, "grouped": "true"},
+                 {"commands": grouped}, _old_plain),
+                ("GET /contexts/{command_id}", f"/contexts/{ids[len(ids) // 2]}", {}, contexts, _old_plain),
+                ("GET /history/{user_id}", f"/history/{validator['id']}", {"page_size": args.history_size},
+                 history_body, _old_plain),
+            ]
+            for name, url, params, payload, old in cases:
+                wire = await _wire(client, url, params, headers, args.repeat)
+                wire = {"before": {"bytes": len(old(payload))}, **wire}
+                results[name] = {"wire": wire, "encode_ms": _cpu(payload, old, args.repeat)}
+
+    return {
+        "endpoints": results,
+        "meta": {
+            "label": args.label,
+            "backend": os.environ.get("STORAGE_BACKEND") or manifest.get("backend"),
+            "page_size": args.page_size,
+            "history_size": args.history_size,
+            "history_rows": len(history),
+            "repeat": args.repeat,
+            "encoders": {m: getattr(encoding, m) is not None for m in ("orjson", "msgpack", "zstandard")},
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+        },
+    }
+
+def _print(result: Dict[str, Any]):
+    for name, r in result["endpoints"].items():
+        before = r["wire"]["before"]["bytes"]
+        print(name)
+        for variant, w in r["wire"].items():
+            ratio = f"{w['bytes'] / before:6.1%}" if before else "   n/a"
+            ms = f"{w['ms']:8.2f} ms" if "ms" in w else ""
+            print(f"    {variant:14} {w['bytes']:>10} B  {ratio} of before  {ms}")
+        print("    encode: " + "  ".join(f"{k} {v:.3f} ms" for k, v in r["encode_ms"].items()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--manifest", default="bench_corpus.json", help="written by gen_corpus.py")
+    parser.add_argument("--page-size", type=int, default=100, help="commands per /commands page")
+    parser.add_argument("--history-size", type=int, default=1000, help="rows per /history page")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--label", default="", help="tag stored with the results")
+    parser.add_argument("--out", help="write the JSON result to this file")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    _print(result)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(json.dumps(result, indent=2) + "\n")
+
+if __name__ == "__main__":
+    main()
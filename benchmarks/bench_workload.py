@@ -0,0 +1,226 @@
+# benchmarks/bench_workload.py
+"""Replay validator and admin workloads; report latency per endpoint.
+
+    # in-process: no server, no network; the app runs in this event loop
+    STORAGE_BACKEND=sqlite SQLITE_PATH=bench.db ALLOW_DEV_TOKEN_SECRET=1 \\
+    python benchmarks/bench_workload.py --manifest bench_corpus.json \\
+        --validators 8 --admins 2 --duration 30 --label baseline --out base.json
+
+    # over HTTP against a running server (same database)
+    python benchmarks/bench_workload.py --url http://127.0.0.1:8000 ...
+
+Each virtual validator logs in once, then loops like the dashboard does:
+page through /commands from its last position, open one command's
+contexts, label part of the page with /mark_batch, and every few pages
+check its stats and run a filtered /history query. Each virtual admin
+loops over the overview (leaderboard), recent activity, the validator
+list and a validator's history. Accounts come from the gen_corpus.py
+manifest. The JSON result holds p50/p95/p99 latency and requests/s per
+endpoint plus run metadata; compare runs with compare.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from _common import percentile  # noqa: E402
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+class Recorder:
+    """Latencies and error counts keyed by endpoint name ("GET /history/{user_id}")."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def call(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        t0 = time.perf_counter()
+        try:
+            res = await client.request(method, url, **kwargs)
+            await res.aread()  # streamed bodies count until the last byte
+        except httpx.HTTPError:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            return None
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - t0)
+        if res.status_code >= 400:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return res
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        names = sorted(set(self.latencies) | set(self.errors))
+        endpoints = {n: summarize(self.latencies.get(n, []), self.errors.get(n, 0), elapsed) for n in names}
+        everything = [x for samples in self.latencies.values() for x in samples]
+        return {"endpoints": endpoints, "total": summarize(everything, sum(self.errors.values()), elapsed)}
+
+async def _login(rec: Recorder, client: httpx.AsyncClient, account: Dict[str, Any]) -> Dict[str, str]:
+    res = await rec.call(client, "POST /login", "POST", "/login",
+                         json={"email": account["email"], "password": account["password"]})
+    if res is None or res.status_code != 200:
+        raise RuntimeError(f"login failed for {account['email']}")
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+def _history_params(rng: random.Random) -> Dict[str, Any]:
+    # the filters the history page offers, in rough proportion of use
+    params: Dict[str, Any] = {"type": rng.choice(("All", "All", "Dynamic", "Static")), "page_size": 200}
+    if rng.random() < 0.5:
+        start = datetime.now() - timedelta(days=rng.randint(1, 30))
+        params["start"] = start.isoformat()
+        params["end"] = (start + timedelta(days=rng.randint(1, 7))).isoformat()
+    return params
+
+async def validator_loop(rec, client, account, deadline, rng, page_size, label_fraction, think):
+    headers = await _login(rec, client, account)
+    uid = account["id"]
+    res = await rec.call(client, "GET /last_cmd/{user_id}", "GET", f"/last_cmd/{uid}", headers=headers)
+    after = res.json().get("last_cmd_id", 0) if res is not None and res.status_code == 200 else 0
+    pages = 0
+    while time.perf_counter() < deadline:
+        res = await rec.call(client, "GET /commands", "GET", "/commands",
+                             params={"after_command_id": after, "limit": page_size}, headers=headers)
+        if res is None or res.status_code != 200:
+            continue
+        rows = res.json()
+        ids = sorted({row["command_id"] for row in rows})
+        next_after = res.headers.get("X-Next-After-Command-Id")
+        after = int(next_after) if next_after else 0  # wrap around at the end
+        if not ids:
+            continue
+
+        await rec.call(client, "GET /contexts/{command_id}", "GET", f"/contexts/{rng.choice(ids)}", headers=headers)
+        labelled = ids[:max(1, int(len(ids) * label_fraction))]
+        items = [{
+            "command_id": cmd_id,
+            "action": "Dynamic" if rng.random() < 0.3 else "Static",
+            "command_text": f"bench {cmd_id}",
+        } for cmd_id in labelled]
+        await rec.call(client, "POST /mark_batch", "POST", "/mark_batch",
+                       json={"user_id": uid, "items": items, "last_cmd_id": labelled[-1]}, headers=headers)
+
+        pages += 1
+        if pages % 3 == 0:
+            await rec.call(client, "GET /validator_stats/{user_id}", "GET", f"/validator_stats/{uid}", headers=headers)
+            await rec.call(client, "GET /history/{user_id}", "GET", f"/history/{uid}",
+                           params=_history_params(rng), headers=headers)
+        if think:
+            await asyncio.sleep(think)
+
+async def admin_loop(rec, client, account, validator_ids, deadline, rng, think):
+    headers = await _login(rec, client, account)
+    while time.perf_counter() < deadline:
+        await rec.call(client, "GET /admin/overview", "GET", "/admin/overview", headers=headers)
+        await rec.call(client, "GET /recent_active", "GET", "/recent_active", headers=headers)
+        await rec.call(client, "GET /validators", "GET", "/validators", headers=headers)
+        await rec.call(client, "GET /history/{user_id}", "GET", f"/history/{rng.choice(validator_ids)}",
+                       params=_history_params(rng), headers=headers)
+        if think:
+            await asyncio.sleep(think)
+
+@asynccontextmanager
+async def make_client(url: Optional[str], concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    if url:
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+            yield client
+        return
+    from backend.main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://inprocess", timeout=60) as client:
+            yield client
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args) -> Dict[str, Any]:
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    validators = manifest["validators"][:args.validators] if args.validators else []
+    if args.validators > len(validators):
+        validators = [validators[i % len(validators)] for i in range(args.validators)]
+    validator_ids = [v["id"] for v in manifest["validators"]]
+
+    rec = Recorder()
+    async with make_client(args.url, args.validators + args.admins) as client:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        tasks = [
+            validator_loop(rec, client, account, deadline, random.Random(args.seed + i),
+                           args.page_size, args.label_fraction, args.think)
+            for i, account in enumerate(validators)
+        ] + [
+            admin_loop(rec, client, manifest["admin"], validator_ids, deadline,
+                       random.Random(args.seed + 1000 + i), args.think)
+            for i in range(args.admins)
+        ]
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    result = rec.report(elapsed)
+    result["meta"] = {
+        "label": args.label,
+        "target": args.url or "in-process",
+        "backend": os.environ.get("STORAGE_BACKEND") or manifest.get("backend"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "validators": args.validators,
+        "admins": args.admins,
+        "duration_s": round(elapsed, 1),
+        "page_size": args.page_size,
+        "seed": args.seed,
+        "corpus": {k: manifest.get(k) for k in ("seed", "commands", "args_per_command", "context_lines", "line_width")},
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--manifest", default="bench_corpus.json", help="written by gen_corpus.py")
+    parser.add_argument("--url", help="run over HTTP against this server instead of in-process")
+    parser.add_argument("--validators", type=int, default=8, help="concurrent validator sessions")
+    parser.add_argument("--admins", type=int, default=1, help="concurrent admin sessions")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--label-fraction", type=float, default=0.5, help="share of each page labelled")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds each session idles per loop")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--label", default="", help="tag stored with the results")
+    parser.add_argument("--out", help="write the JSON result to this file")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# benchmarks/compare.py
+"""Compare two bench_workload.py results endpoint by endpoint.
+
+    python benchmarks/compare.py base.json new.json [--threshold 10]
+
+Prints p50/p95/p99 and requests/s for both runs with the relative change.
+Exits 1 when any endpoint's p95 got slower by more than ``--threshold``
+percent (or started failing), so it can gate a change in CI.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Optional
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "rps")
+
+def _delta(old: float, new: float) -> Optional[float]:
+    return None if not old else (new - old) / old * 100.0
+
+def _fmt(value: Optional[float]) -> str:
+    return "   n/a" if value is None else f"{value:+6.1f}%"
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float) -> bool:
+    ok = True
+    names = sorted(set(base["endpoints"]) | set(new["endpoints"]))
+    print(f"base: {base['meta'].get('label') or '-'} ({base['meta'].get('revision')})   "
+          f"new: {new['meta'].get('label') or '-'} ({new['meta'].get('revision')})")
+    print(f"{'endpoint':34} " + " ".join(f"{m:>24}" for m in METRICS))
+    for name in names + ["(total)"]:
+        old = base["total"] if name == "(total)" else base["endpoints"].get(name)
+        cur = new["total"] if name == "(total)" else new["endpoints"].get(name)
+        if old is None or cur is None:
+            print(f"{name:34} only in {'new' if old is None else 'base'} run")
+            continue
+        cells = [f"{old[m]:>8} -> {cur[m]:>8} {_fmt(_delta(old[m], cur[m]))}" for m in METRICS]
+        flag = ""
+        p95 = _delta(old["p95_ms"], cur["p95_ms"])
+        if name != "(total)" and ((p95 is not None and p95 > threshold) or (cur["errors"] and not old["errors"])):
+            flag, ok = "  <-- regression", False
+        print(f"{name:34} " + " ".join(cells) + flag)
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed p95 slowdown in percent")
+    args = parser.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    sys.exit(0 if compare(base, new, args.threshold) else 1)
+
+if __name__ == "__main__":
+    main()
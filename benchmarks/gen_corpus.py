@@ -0,0 +1,172 @@
+# benchmarks/gen_corpus.py
+"""Fill a database with a synthetic, reproducible corpus.
+
+    STORAGE_BACKEND=sqlite SQLITE_PATH=bench.db \\
+    python benchmarks/gen_corpus.py --commands 2000 --args-per-command 5 \\
+        --context-lines 11 --line-width 80 --validators 20 --labels 1500 \\
+        --seed 1 --manifest bench_corpus.json
+
+Writes through the storage interface, so it targets whichever backend
+STORAGE_BACKEND selects. Commands and arguments go through the same chunk
+loader as backend.ingest (so re-running is idempotent); contexts are
+overlapping windows of one synthetic trail, like real ingested files.
+Each validator labels a prefix of the corpus in order, in work sessions
+spread over ``--days``, so histories have realistic shapes and dates.
+Labels are not deduplicated, so start from an empty database. The
+manifest records the seed, sizes and the accounts the workload driver
+(bench_workload.py) logs in with.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import hashing  # noqa: E402
+from backend.ingest import load_chunk  # noqa: E402
+from backend.storage import get_storage  # noqa: E402
+from config import STORAGE_BACKEND  # noqa: E402
+
+PASSWORD = "bench-password"
+_WORDS = (
+    "Activate Select Open Close Sketch Extrude Revolve Datum Plane Axis Feature Model "
+    "Part Assembly Drawing Dimension Constraint Pattern Mirror Round Chamfer Hole Shell "
+    "Rib Draft Sweep Blend Surface Quilt Layer Ok Cancel Apply Done Regenerate"
+).split()
+
+def _line(rng: random.Random, width: int) -> str:
+    kind = rng.random()
+    if kind < 0.3:
+        head = "~ " + rng.choice(("Activate", "Select", "Command", "Input", "Update"))
+    elif kind < 0.5:
+        head = "! " + rng.choice(("Message", "Warning", "Status"))
+    else:
+        head = "@ " + rng.choice(_WORDS)
+    parts = [head]
+    while sum(len(p) + 1 for p in parts) < width:
+        parts.append("`" + rng.choice(_WORDS) + "`" if rng.random() < 0.4 else rng.choice(_WORDS))
+    return " ".join(parts)[:width]
+
+def iter_records(args, rng: random.Random) -> Iterator[Tuple[str, str, str]]:
+    # One synthetic trail; argument g sits at line 2*g, so neighbouring
+    # contexts overlap the way they do in real trails.
+    half = args.context_lines // 2
+    window: deque = deque(_line(rng, args.line_width) for _ in range(half))
+    for cmd in range(args.commands):
+        name = f"ProCmdBench{cmd:06d}"
+        for arg in range(args.args_per_command):
+            line = f"~ Command `{name}` `arg{arg}` `{rng.choice(_WORDS)}`"
+            while len(window) < 2 * half + 1:
+                window.append(_line(rng, args.line_width))
+            window[half] = line
+            yield name, line, "\n".join(window)
+            window.popleft()
+            window.popleft()
+
+async def load_corpus(args, rng: random.Random) -> Tuple[int, int]:
+    known: Dict[str, int] = {}
+    chunk: List[Tuple[str, str, str]] = []
+    commands = arguments = 0
+    for rec in iter_records(args, rng):
+        chunk.append(rec)
+        if len(chunk) >= args.chunk_size:
+            created, inserted = await load_chunk(chunk, known)
+            commands, arguments, chunk = commands + created, arguments + inserted, []
+    if chunk:
+        created, inserted = await load_chunk(chunk, known)
+        commands, arguments = commands + created, arguments + inserted
+    return commands, arguments
+
+async def ensure_user(store, name: str, email: str, role: str) -> Dict[str, Any]:
+    user = await store.create_user(name, email, PASSWORD, role)
+    if user is None:  # already there from an earlier run
+        user = await store.authenticate_user(email, PASSWORD)
+    return {"id": user["id"], "name": name, "email": email, "password": PASSWORD, "role": role}
+
+def _history(rng: random.Random, command_ids: List[int], count: int, days: int) -> List[Dict[str, Any]]:
+    # Label a prefix of the corpus in order, in sessions of 20-200 labels
+    # a few seconds apart, with sessions spread over the last ``days``.
+    items = []
+    now = datetime.now()
+    t = now - timedelta(days=days)
+    step = timedelta(days=days) / max(1, count // 100 + 1)
+    i = 0
+    while i < min(count, len(command_ids)):
+        t += step * rng.uniform(0.5, 1.5)
+        for _ in range(rng.randint(20, 200)):
+            if i >= min(count, len(command_ids)):
+                break
+            t += timedelta(seconds=rng.uniform(2, 30))
+            items.append({
+                "command_id": command_ids[i],
+                "action": "Dynamic" if rng.random() < 0.3 else "Static",
+                "command_text": f"bench label {i}",
+                "processed_time": min(t, now),
+            })
+            i += 1
+    return items
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commands", type=int, default=2000)
+    parser.add_argument("--args-per-command", type=int, default=5)
+    parser.add_argument("--context-lines", type=int, default=11, help="lines per context window")
+    parser.add_argument("--line-width", type=int, default=80, help="characters per context line")
+    parser.add_argument("--validators", type=int, default=20)
+    parser.add_argument("--labels", type=int, default=1500, help="mean labels per validator")
+    parser.add_argument("--days", type=int, default=30, help="history spread")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--manifest", default="bench_corpus.json")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    store = get_storage()
+    started = time.perf_counter()
+    try:
+        await store.init_schema()
+        commands, arguments = await load_corpus(args, rng)
+        command_ids = await store.get_command_page_ids(0, args.commands)
+
+        admin = await ensure_user(store, "Bench Admin", "admin@bench.local", "admin")
+        validators = []
+        for v in range(args.validators):
+            user = await ensure_user(store, f"Bench Validator {v}", f"validator{v}@bench.local", "validator")
+            labels = int(args.labels * rng.uniform(0.25, 1.75))
+            items = _history(rng, command_ids, labels, args.days)
+            for i in range(0, len(items), 1000):
+                batch = items[i:i + 1000]
+                await store.insert_classifications(user["id"], batch, batch[-1]["command_id"])
+            user["labels"] = len(items)
+            validators.append(user)
+    finally:
+        await store.close_pool()
+        hashing.shutdown()
+
+    manifest = {
+        "seed": args.seed,
+        "backend": STORAGE_BACKEND,
+        "commands": args.commands,
+        "args_per_command": args.args_per_command,
+        "context_lines": args.context_lines,
+        "line_width": args.line_width,
+        "created": {"commands": commands, "arguments": arguments},
+        "admin": admin,
+        "validators": validators,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"{commands} commands / {arguments} arguments loaded, "
+          f"{sum(v['labels'] for v in validators)} labels for {len(validators)} validators "
+          f"in {manifest['seconds']}s -> {args.manifest}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,76 @@
+import os
+
 DB_HOST = "localhost"
 DB_USER = "root"
 DB_PASSWORD = "Raviraj@10"
 DB_NAME = "rule_validation"
+
+# Storage backend (backend/storage.py): "mysql" (backend/db.py) or
+# "sqlite" (backend/sqlite_db.py, a single local file)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "mysql")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "./users.db")  # the old users-only file; accounts carry over
+SQLITE_POOL_SIZE = 4             # WAL: readers run in parallel, writers queue on the file lock
+SQLITE_BUSY_TIMEOUT = 5.0        # seconds a writer waits for the lock
+SQLITE_CACHED_STATEMENTS = 256   # prepared statements kept per connection
+SQLITE_CACHE_MB = 64             # page cache per connection
+SQLITE_MMAP_MB = 256
+
+# Connection pool (backend/db.py)
+DB_POOL_SIZE = 10
+DB_POOL_TIMEOUT = 5.0        # seconds to wait for a free connection
+DB_POOL_PING_INTERVAL = 5.0  # ping idle connections older than this on checkout
+
+# classifications table: >1 partitions it by KEY(user_id) when created
+CLASSIFICATIONS_PARTITIONS = 0
+
+# In-process read cache (backend/cache.py)
+READ_CACHE_MAXSIZE = 1024  # entries per cached function
+READ_CACHE_TTL = 300.0     # seconds; writes through db.py also invalidate
+
+# Password hashing (backend/hashing.py): scrypt cost and worker pool
+HASH_SCRYPT_N = 2 ** 14    # CPU/memory cost; raise it and users are rehashed on next login
+HASH_SCRYPT_R = 8
+HASH_SCRYPT_P = 1
+HASH_WORKERS = 2           # processes dedicated to hashing
+HASH_MAX_PENDING = 64      # hash jobs queued or running at once
+
+# Signed session tokens (backend/tokens.py). The API refuses to start
+# without TOKEN_SECRET unless ALLOW_DEV_TOKEN_SECRET=1 (local development).
+TOKEN_SECRET = os.environ.get("TOKEN_SECRET")
+ALLOW_DEV_TOKEN_SECRET = os.environ.get("ALLOW_DEV_TOKEN_SECRET") == "1"
+DEV_TOKEN_SECRET = "dev-only-change-me"
+ACCESS_TOKEN_TTL = 15 * 60            # seconds
+REFRESH_TOKEN_TTL = 7 * 24 * 3600
+DOWNLOAD_TOKEN_TTL = 5 * 60           # ?token= on export links; valid for downloads only
+
+# Logging and metrics (backend/metrics.py, GET /metrics)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+DB_SLOW_QUERY_SECONDS = 0.5                        # storage calls slower than this are logged
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")    # if set, /metrics requires "Bearer <token>"
+
+# Live events for the admin dashboard (backend/events.py, GET /events)
+EVENTS_QUEUE_SIZE = 1000     # events buffered per subscriber before it is told to resync
+EVENTS_REPLAY = 1000         # recent events kept so a reconnect can resume via Last-Event-ID
+EVENTS_KEEPALIVE = 15.0      # seconds between keepalive comments on an idle stream
+
+# users.last_seen is written in bulk from memory (backend/heartbeats.py)
+LAST_SEEN_FLUSH_INTERVAL = 5.0   # seconds between flushes; also flushed on shutdown
+
+# Command assignment (POST /next_command): leases instead of a shared index
+LEASE_SECONDS = 10 * 60       # a leased command returns to the pool after this long
+LEASE_REDUNDANCY = 1          # validators who should label each command (k)
+LEASE_RECLAIM_BATCH = 500     # expired leases released per /next_command call
+LEASE_MAX_HELD = 25           # open leases per validator (shown, leased ahead, labels not yet sent)
+
+# Response encoding (backend/encoding.py): JSON via orjson when installed,
+# msgpack on request, gzip/zstd for bodies past the threshold
+COMPRESS_MIN_BYTES = 1024     # smaller bodies go out uncompressed
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+# Context text (backend/blobs.py): stored once per content hash, compressed
+CONTEXT_CODEC = "zstd"            # "zstd" (zlib when zstandard is missing) or "zlib"
+CONTEXT_ZSTD_LEVEL = 9
+CONTEXT_ZLIB_LEVEL = 6
+CONTEXT_DICT_SIZE = 64 * 1024     # bytes; trained by python -m backend.ingest --train-dictionary
+CONTEXT_CACHE_ENTRIES = 20000     # decoded contexts kept in memory, by hash
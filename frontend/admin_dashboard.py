@@ -3,15 +3,56 @@ import streamlit as st
 import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
 
-from api_client import (
-    get_all_validators,
-    get_validator_stats,
-    get_user_counts_by_role,
-    get_recently_active_validators,
-)
+from api_client import get_admin_overview, get_validator_stats_many, logout_user
+from live_feed import LiveFeed
 
 from validator_history import render_history_for_user
 
+LIVE_PAGES = ("Live Command Processing", "Recently Active Validators")
+LIVE_REDRAW_SECONDS = 2  # the live pages redraw from memory; no API calls
+_fragment = getattr(st, "fragment", None) or st.experimental_fragment
+
+def _live_feed(user):
+    # one event-stream subscription per browser session
+    feed = st.session_state.get("live_feed")
+    if feed is None or not feed.alive():
+        feed = st.session_state.live_feed = LiveFeed(user["auth"]).start()
+    return feed
+
+def _format_last_seen(ts):
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    delta = datetime.now() - ts
+    if delta < timedelta(minutes=1):
+        return "Just now"
+    elif delta < timedelta(minutes=10):
+        return f"{int(delta.total_seconds() // 60)} mins ago"
+    elif delta < timedelta(hours=1):
+        return f"{int(delta.total_seconds() // 60)} mins ago (inactive)"
+    elif delta < timedelta(days=1):
+        return f"{int(delta.total_seconds() // 3600)} hours ago (offline)"
+    else:
+        return ts.strftime("%d %b %Y, %I:%M %p")
+
+@_fragment(run_every=LIVE_REDRAW_SECONDS)
+def _live_page(feed, page):
+    overview = feed.snapshot()
+    if overview is None:
+        st.info("Connecting to live updates…")
+        return
+    if not feed.connected:
+        st.caption("Live updates reconnecting; showing the last known state.")
+
+    if page == "Live Command Processing":
+        for v in overview["validators"]:
+            remaining = v["remaining"]
+            last_id = v["processed"]
+            st.markdown(f"**👨‍💻 {v['name']}** — Currently at Command ID: `{last_id}` | Remaining: `{remaining}`")
+    else:
+        for user in overview["recent_activity"]:
+            formatted = _format_last_seen(user["last_seen"])
+            st.markdown(f"👤 **{user['name']}** — Last Seen: *{formatted}*")
+
 def admin_dashboard():
     st.set_page_config(page_title="Admin Dashboard", layout="wide")
     user = st.session_state.user
@@ -35,6 +76,10 @@ def admin_dashboard():
     for i, (label, page_name) in enumerate(nav_buttons.items()):
         if st.sidebar.button(label, key=f"nav_btn_{i}"):
             if page_name == "Logout":
+                if st.session_state.get("live_feed") is not None:
+                    st.session_state.live_feed.stop()
+                    st.session_state.live_feed = None
+                logout_user()
                 st.session_state.logged_in = False
                 st.session_state.user = None
                 st.session_state.page = "Login"
@@ -44,6 +89,10 @@ def admin_dashboard():
 
     page = st.session_state.get("page", "My Info")
 
+    # the other pages render from one /admin/overview response; the live
+    # pages keep theirs current from the event stream instead
+    overview = get_admin_overview() if page != "My Info" and page not in LIVE_PAGES else None
+
     if page == "My Info":
         st.subheader("🙋 My Info")
         st.markdown(f"###  Name: `{user['name']}`")
@@ -51,7 +100,7 @@ def admin_dashboard():
 
     elif page == "Users":
         st.subheader("👥 All Users")
-        data = get_user_counts_by_role()
+        data = overview
         validator_count = data.get("validator_count", 0)
         viewer_count = data.get("viewer_count", 0)
         validator_names = data.get("validator_names", [])
@@ -70,12 +119,18 @@ def admin_dashboard():
 
     elif page == "Validation":
         st.subheader(" Validator Performance")
-        validators = get_all_validators()
-        validator_names = {v["name"]: v["id"] for v in validators}
-        selected = st.selectbox(" Select Validator", list(validator_names.keys()))
+        # current counters for every validator, fetched concurrently
+        all_stats = get_validator_stats_many(v["id"] for v in overview["validators"])
+        validators = {v["name"]: all_stats[v["id"]] for v in overview["validators"]}
+        st.dataframe(
+            [{"Validator": name, "Processed": s["processed"], "Remaining": s["remaining"],
+              "Dynamic": s["dynamic"], "Static": s["static"]} for name, s in validators.items()],
+            use_container_width=True, hide_index=True
+        )
+        selected = st.selectbox(" Select Validator", list(validators.keys()))
 
         if selected:
-            stats = get_validator_stats(validator_names[selected])
+            stats = validators[selected]
             col1, col2 = st.columns(2)
             col3, col4 = st.columns(2)
 
@@ -92,7 +147,7 @@ def admin_dashboard():
 
     elif page == "History":
         st.subheader("History")
-        validators = get_all_validators()
+        validators = overview["validators"]
         validator_names = {v["name"]: v["id"] for v in validators}
         selected = st.selectbox(" Select Validator", list(validator_names.keys()))
         if selected:
@@ -101,42 +156,16 @@ def admin_dashboard():
 
     elif page == "Live Command Processing":
         st.subheader(" Live Command Processing")
-        validators = get_all_validators()
         st.markdown("####  Active Validators and Their Command Status")
-        for v in validators:
-            stats = get_validator_stats(v["id"])
-            remaining = stats["remaining"]
-            last_id = stats["processed"]
-            st.markdown(f"**👨‍💻 {v['name']}** — Currently at Command ID: `{last_id}` | Remaining: `{remaining}`")
+        _live_page(_live_feed(user), page)
 
     elif page == "Recently Active Validators":
         st.subheader(" Recently Active Validators")
-        def format_last_seen(ts):
-            now = datetime.now()
-            delta = now - ts
-            if delta < timedelta(minutes=1):
-                return "Just now"
-            elif delta < timedelta(minutes=10):
-                return f"{int(delta.total_seconds() // 60)} mins ago"
-            elif delta < timedelta(hours=1):
-                return f"{int(delta.total_seconds() // 60)} mins ago (inactive)"
-            elif delta < timedelta(days=1):
-                return f"{int(delta.total_seconds() // 3600)} hours ago (offline)"
-            else:
-                return ts.strftime("%d %b %Y, %I:%M %p")
-
-        active_users = get_recently_active_validators()
-        for user in active_users:
-            last_seen = user["last_seen"]
-            if isinstance(last_seen, str):
-                last_seen = datetime.strptime(last_seen, "%Y-%m-%d %H:%M:%S")
-            formatted = format_last_seen(last_seen)
-            st.markdown(f"👤 **{user['name']}** — Last Seen: *{formatted}*")
+        _live_page(_live_feed(user), page)
 
     elif page == "Leaderboard":
         st.subheader("🏆 Top Validators")
-        validators = get_all_validators()
-        leaderboard = [(v["name"], get_validator_stats(v["id"])["processed"]) for v in validators]
+        leaderboard = [(v["name"], v["processed"]) for v in overview["validators"]]
         sorted_lb = sorted(leaderboard, key=lambda x: x[1], reverse=True)
         for i, (name, score) in enumerate(sorted_lb, 1):
             st.markdown(f"**{i}. {name}** —  `{score}` commands")
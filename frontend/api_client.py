@@ -1,65 +1,447 @@
 # frontend/api_client.py
+import base64
+import json
+import os
+import threading
+import time
 import requests
-from typing import Optional, Any, Dict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+from typing import Optional, Any, Callable, Dict, Iterable, Iterator, List, Tuple
+from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import msgpack  # optional: smaller, faster bodies for the big reads
+except ImportError:
+    msgpack = None
 
 API_URL = "http://127.0.0.1:8000"
-TIMEOUT = 6
+PUBLIC_API_URL = os.environ.get("PUBLIC_API_URL", API_URL)  # as the browser reaches it (download links)
+TIMEOUT = 6            # default per-call timeout (seconds); every call takes timeout=
+POOL_MAXSIZE = 16      # keep-alive connections kept open to the API
+GET_RETRIES = 3        # idempotent GETs only; POSTs are never retried
+RETRY_BACKOFF = 0.2    # 0.2s, 0.4s, 0.8s between attempts
+MAX_PARALLEL = 8       # worker threads for fetch_many()
+REFRESH_MARGIN = 30    # refresh the access token this many seconds before it expires
+MSGPACK = "application/msgpack"
+BINARY_HEADERS = {"Accept": MSGPACK} if msgpack is not None else {}
+EVENTS_READ_TIMEOUT = 45  # /events sends a keepalive every 15s; longer silence means a dead stream
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_fanout_pool = ThreadPoolExecutor(max_workers=MAX_PARALLEL, thread_name_prefix="api-fanout")
+_lease_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="lease-ahead")
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=GET_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_session() -> requests.Session:
+    # one keep-alive pool per process, shared by every Streamlit session
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session()
+    return _session
+
+# -------------------- auth --------------------
+def _token_expiry(token: str) -> float:
+    # read "exp" from the (unverified) claims; the server does the real check
+    try:
+        body = token.split(".")[0]
+        return float(json.loads(base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)))["exp"])
+    except (ValueError, KeyError, IndexError):
+        return 0.0
+
+class Auth:
+    """Access/refresh token pair of one logged-in user.
+
+    Kept in ``st.session_state`` (the HTTP session is shared by every user,
+    so tokens cannot live on it) and renewed shortly before expiry.
+    """
+
+    def __init__(self, access_token: str, refresh_token: str):
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = _token_expiry(access_token)
+        self._lock = threading.Lock()
+
+    def headers(self) -> Dict[str, str]:
+        if self.expires_at - REFRESH_MARGIN <= time.time():
+            self.refresh()
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+    def refresh(self, stale: Optional[str] = None) -> bool:
+        with self._lock:
+            if stale is not None and self.access_token != stale:
+                return True  # another thread already refreshed
+            try:
+                res = get_session().post(f"{API_URL}/token/refresh", json={"refresh_token": self.refresh_token}, timeout=TIMEOUT)
+            except requests.RequestException:
+                return False
+            if not res.ok:
+                return False
+            data = res.json()
+            self.access_token, self.refresh_token = data["access_token"], data["refresh_token"]
+            self.expires_at = _token_expiry(self.access_token)
+            return True
+
+_auth_local = threading.local()
+
+def set_auth(auth: Optional[Auth]):
+    """Make ``auth`` the credentials for API calls made from this thread."""
+    _auth_local.auth = auth
+
+def get_auth() -> Optional[Auth]:
+    return getattr(_auth_local, "auth", None)
+
+@contextmanager
+def using_auth(auth: Optional[Auth]):
+    previous = get_auth()
+    set_auth(auth)
+    try:
+        yield
+    finally:
+        set_auth(previous)
+
+def with_auth(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Bind the caller's credentials to ``fn`` so it can run on a worker thread."""
+    auth = get_auth()
 
-def signup_user(name: str, email: str, password: str, role: str) -> bool:
+    def call(*args, **kwargs):
+        with using_auth(auth):
+            return fn(*args, **kwargs)
+    return call
+
+def _send(method: str, path: str, timeout: Optional[float], **kwargs) -> requests.Response:
+    auth = get_auth()
+    extra = kwargs.pop("headers", None) or {}
+    if auth is None:
+        return get_session().request(method, f"{API_URL}{path}", timeout=timeout or TIMEOUT, headers=extra, **kwargs)
+    headers = {**auth.headers(), **extra}
+    res = get_session().request(method, f"{API_URL}{path}", timeout=timeout or TIMEOUT, headers=headers, **kwargs)
+    if res.status_code == 401 and auth.refresh(stale=headers["Authorization"][7:]):
+        res = get_session().request(method, f"{API_URL}{path}", timeout=timeout or TIMEOUT, headers={**auth.headers(), **extra}, **kwargs)
+    return res
+
+def _body(res: requests.Response) -> Any:
+    # the server answers BINARY_HEADERS requests with msgpack when it can
+    if res.headers.get("Content-Type", "").startswith(MSGPACK):
+        return msgpack.unpackb(res.content, strict_map_key=False)
+    return res.json()
+
+def _get(path: str, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+    return _send("GET", path, timeout, **kwargs)
+
+def _post(path: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> requests.Response:
+    return _send("POST", path, timeout, json=payload)
+
+def fetch_many(calls: Iterable[Tuple[Callable[..., Any], tuple]], default: Any = None) -> List[Any]:
+    """Run independent API calls concurrently; results come back in order.
+
+    A call that raises contributes ``default`` instead of failing the batch.
+    """
+    futures = [_fanout_pool.submit(with_auth(fn), *args) for fn, args in calls]
+    results = []
+    for f in futures:
+        try:
+            results.append(f.result())
+        except Exception:  # one bad call (timeout, bad JSON, ...) must not sink the rest
+            results.append(default)
+    return results
+
+_EMPTY_STATS = {"dynamic": 0, "static": 0, "processed": 0, "remaining": 0, "total": 0}
+
+def signup_user(name: str, email: str, password: str, role: str, timeout: Optional[float] = None) -> bool:
     payload = {"name": name, "email": email, "password": password, "role": role}
-    res = requests.post(f"{API_URL}/signup", json=payload, timeout=TIMEOUT)
+    res = _post("/signup", payload, timeout=timeout)
     return res.ok
 
-def login_user(email: str, password: str) -> Optional[Dict[str,Any]]:
+def login_user(email: str, password: str, timeout: Optional[float] = None) -> Optional[Dict[str,Any]]:
+    # On success the returned user carries its Auth under "auth"; it is also
+    # made current for this thread.
     payload = {"email": email, "password": password}
-    res = requests.post(f"{API_URL}/login", json=payload, timeout=TIMEOUT)
-    if res.ok:
-        return res.json()
-    return None
+    res = _post("/login", payload, timeout=timeout)
+    if not res.ok:
+        return None
+    user = res.json()
+    auth = Auth(user.pop("access_token"), user.pop("refresh_token"))
+    for key in ("token_type", "expires_in"):
+        user.pop(key, None)
+    set_auth(auth)
+    user["auth"] = auth
+    return user
 
-def get_commands_with_contexts():
-    res = requests.get(f"{API_URL}/commands", timeout=TIMEOUT)
-    return res.json() if res.ok else []
+def logout_user(timeout: Optional[float] = None) -> bool:
+    auth = get_auth()
+    if auth is None:
+        return True
+    try:
+        res = _post("/logout", {"refresh_token": auth.refresh_token}, timeout=timeout)
+    except requests.RequestException:
+        return False
+    finally:
+        set_auth(None)
+    return res.ok
+
+def get_commands_page(after_command_id: int = 0, before_command_id: Optional[int] = None, limit: int = 100, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """One page of commands, grouped by the server.
+
+    Returns {"groups": [(command_id, [argument dicts])], "index": {command_id:
+    position in groups}, "version", "next_after", "prev_before"}; "version"
+    is None when the call failed.
+    """
+    params: Dict[str, Any] = {"limit": limit, "grouped": "true"}
+    if before_command_id is not None:
+        params["before_command_id"] = before_command_id
+    else:
+        params["after_command_id"] = after_command_id
+    res = _get("/commands", timeout=timeout, params=params, headers=BINARY_HEADERS)
+    if not res.ok:
+        return {"groups": [], "index": {}, "version": None, "next_after": None, "prev_before": None}
+    body = _body(res)
+    fields = body["fields"]
+    next_after = res.headers.get("X-Next-After-Command-Id")
+    prev_before = res.headers.get("X-Prev-Before-Command-Id")
+    return {
+        "groups": [(c["id"], [dict(zip(fields, arg)) for arg in c["args"]]) for c in body["commands"]],
+        "index": {int(k): v for k, v in body["index"].items()},
+        "version": body["version"],
+        "next_after": int(next_after) if next_after else None,
+        "prev_before": int(prev_before) if prev_before else None,
+    }
 
-def insert_dynamic_command(user_id: int, cmd_id: int, command_text: str):
+def get_command_id_at(index: int, timeout: Optional[float] = None) -> Optional[int]:
+    res = _get(f"/commands/position/{index}", timeout=timeout)
+    return res.json().get("command_id") if res.ok else None
+
+def insert_dynamic_command(user_id: int, cmd_id: int, command_text: str, timeout: Optional[float] = None):
     payload = {"user_id": user_id, "command_id": cmd_id, "command_text": command_text}
-    res = requests.post(f"{API_URL}/mark_dynamic", json=payload, timeout=TIMEOUT)
+    res = _post("/mark_dynamic", payload, timeout=timeout)
     return res.ok
 
-def insert_static_command(user_id: int, cmd_id: int, command_text: str):
+def insert_static_command(user_id: int, cmd_id: int, command_text: str, timeout: Optional[float] = None):
     payload = {"user_id": user_id, "command_id": cmd_id, "command_text": command_text}
-    res = requests.post(f"{API_URL}/mark_static", json=payload, timeout=TIMEOUT)
+    res = _post("/mark_static", payload, timeout=timeout)
+    return res.ok
+
+def mark_batch(user_id: int, items: List[Dict[str, Any]], last_cmd_id: Optional[int] = None, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    payload = {"user_id": user_id, "items": items, "last_cmd_id": last_cmd_id}
+    res = _post("/mark_batch", payload, timeout=timeout)
+    return res.json() if res.ok else None
+
+def next_command(label: Optional[Dict[str, Any]] = None, skip: Optional[List[int]] = None, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Save ``label`` (for a leased command) and lease the next command.
+
+    Leases already held come back first unless listed in ``skip``. Returns
+    {"command_id", "expires_at", "arguments", "label"}; command_id is None
+    when no work is left, the whole result None on failure.
+    """
+    res = _post("/next_command", {"label": label, "skip": skip or []}, timeout=timeout)
+    return res.json() if res.ok else None
+
+def release_command(command_id: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+    # without command_id every lease the validator holds goes back
+    res = _post("/release_command", {"command_id": command_id}, timeout=timeout)
     return res.ok
 
-def get_last_processed_cmd_id(user_id: int) -> int:
-    res = requests.get(f"{API_URL}/last_cmd/{user_id}", timeout=TIMEOUT)
+class LabelBuffer:
+    """Write-behind buffer for Dynamic/Static labels.
+
+    Labels are sent to /mark_batch once ``max_items`` are queued or the
+    oldest one is ``max_age`` seconds old. Items the server rejects are
+    kept in ``rejected``; items that could not be sent stay queued.
+
+    ``next_lease`` hands out leased commands and leases the following one
+    in the background, so a Mark click does not wait for the server.
+    """
+
+    def __init__(self, user_id: int, max_items: int = 20, max_age: float = 5.0):
+        self.user_id = user_id
+        self.max_items = max_items
+        self.max_age = max_age
+        self.rejected: List[Dict[str, Any]] = []
+        self._items: List[Dict[str, Any]] = []
+        self._last_cmd_id: Optional[int] = None
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._lease_ahead: Optional[Future] = None
+        self._auth = get_auth()  # the timer flushes from its own thread
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, cmd_id: int, action: str, command_text: str, last_cmd_id: Optional[int] = None, leased: bool = False):
+        # leased: the label completes a lease, and is rejected once it was reclaimed
+        with self._lock:
+            self._items.append({
+                "command_id": cmd_id,
+                "action": action,
+                "command_text": command_text,
+                "processed_time": datetime.now().isoformat(),
+                "leased": leased,
+            })
+            if last_cmd_id is not None:
+                self._last_cmd_id = last_cmd_id
+            full = len(self._items) >= self.max_items
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.max_age, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self) -> bool:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._items and self._last_cmd_id is None:
+                return True
+            items, last_cmd_id = self._items, self._last_cmd_id
+            try:
+                with using_auth(self._auth):
+                    result = mark_batch(self.user_id, items, last_cmd_id)
+            except requests.RequestException:
+                result = None
+            if result is None:
+                return False
+            for r in result.get("rejected", []):
+                self.rejected.append({**items[r["index"]], "reason": r["reason"]})
+            self._items, self._last_cmd_id = [], None
+            return True
+
+    def pop_rejected(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rejected, self.rejected = self.rejected, []
+            return rejected
+
+    def _lease(self, skip: List[int]) -> Optional[Dict[str, Any]]:
+        try:
+            with using_auth(self._auth):
+                return next_command(skip=skip)
+        except requests.RequestException:
+            return None
+
+    def next_lease(self, skip: List[int]) -> Optional[Dict[str, Any]]:
+        """The next leased command (as next_command returns it); None on failure.
+
+        ``skip`` lists the commands the caller already holds. The one leased
+        ahead is used when ready; the command after it is leased right away.
+        """
+        pending, self._lease_ahead = self._lease_ahead, None
+        lease = None
+        if pending is not None:
+            try:
+                lease = pending.result(timeout=TIMEOUT)
+            except FutureTimeout:
+                pass
+        if lease is None or lease["command_id"] in skip:
+            lease = self._lease(skip)
+        if lease is not None and lease["command_id"] is not None:
+            self._lease_ahead = _lease_pool.submit(self._lease, skip + [lease["command_id"]])
+        return lease
+
+    def discard_lease_ahead(self):
+        # waits for a lease in flight, so releasing the validator's leases
+        # afterwards covers it too
+        pending, self._lease_ahead = self._lease_ahead, None
+        if pending is not None:
+            try:
+                pending.result(timeout=TIMEOUT)
+            except FutureTimeout:
+                pass
+
+def get_last_processed_cmd_id(user_id: int, timeout: Optional[float] = None) -> int:
+    res = _get(f"/last_cmd/{user_id}", timeout=timeout)
     if res.ok:
         return res.json().get("last_cmd_id", 0)
     return 0
 
-def update_last_processed_cmd(user_id: int, last_cmd_id: int):
+def update_last_processed_cmd(user_id: int, last_cmd_id: int, timeout: Optional[float] = None):
     payload = {"user_id": user_id, "last_cmd_id": last_cmd_id}
-    res = requests.post(f"{API_URL}/update_last_cmd", json=payload, timeout=TIMEOUT)
+    res = _post("/update_last_cmd", payload, timeout=timeout)
     return res.ok
 
-def get_all_validators():
-    res = requests.get(f"{API_URL}/validators", timeout=TIMEOUT)
+def get_all_validators(timeout: Optional[float] = None):
+    res = _get("/validators", timeout=timeout)
     return res.json() if res.ok else []
 
-def get_validator_stats(user_id: int):
-    res = requests.get(f"{API_URL}/validator_stats/{user_id}", timeout=TIMEOUT)
-    return res.json() if res.ok else {"dynamic":0,"static":0,"processed":0,"remaining":0,"total":0}
+def get_validator_stats(user_id: int, timeout: Optional[float] = None):
+    res = _get(f"/validator_stats/{user_id}", timeout=timeout)
+    return res.json() if res.ok else dict(_EMPTY_STATS)
+
+def get_validator_stats_many(user_ids: Iterable[int], timeout: Optional[float] = None) -> Dict[int, Dict[str, Any]]:
+    # one request per validator, issued in parallel over the shared pool
+    user_ids = list(user_ids)
+    results = fetch_many([(get_validator_stats, (uid, timeout)) for uid in user_ids])
+    return {uid: (stats if stats is not None else dict(_EMPTY_STATS)) for uid, stats in zip(user_ids, results)}
 
-def get_user_counts_by_role():
-    res = requests.get(f"{API_URL}/user_counts", timeout=TIMEOUT)
+def get_user_counts_by_role(timeout: Optional[float] = None):
+    res = _get("/user_counts", timeout=timeout)
     return res.json() if res.ok else {"validator_count":0,"viewer_count":0,"validator_names":[],"viewer_names":[]}
 
-def get_recently_active_validators():
-    res = requests.get(f"{API_URL}/recent_active", timeout=TIMEOUT)
+def get_recently_active_validators(timeout: Optional[float] = None):
+    res = _get("/recent_active", timeout=timeout)
     return res.json() if res.ok else []
 
-def fetch_user_history(user_id: int, start_iso: Optional[str], end_iso: Optional[str], cmd_id: Optional[int], action_type: str = "All"):
-    params = {}
+def get_admin_overview(timeout: Optional[float] = None) -> Dict[str, Any]:
+    res = _get("/admin/overview", timeout=timeout)
+    if res.ok:
+        return res.json()
+    return {
+        "total_commands": 0, "validators": [], "validator_count": 0, "viewer_count": 0,
+        "validator_names": [], "viewer_names": [], "recent_activity": [],
+    }
+
+def iter_events(last_event_id: Optional[str] = None, read_timeout: float = EVENTS_READ_TIMEOUT) -> Iterator[Tuple[Optional[str], str, Dict[str, Any]]]:
+    """Follow the admin event stream (server-sent events); yields (id, type, data).
+
+    Besides the server's events it yields ``(None, "open", {})`` once
+    connected and ``(None, "keepalive", {})`` for keepalives, so a caller
+    can act on both without waiting for real traffic. Returns when the
+    server closes the stream; raises requests exceptions on failures.
+    """
+    auth = get_auth()
+    headers = auth.headers() if auth is not None else {}
+    if last_event_id:
+        headers["Last-Event-ID"] = last_event_id
+    with get_session().get(f"{API_URL}/events", headers=headers, stream=True, timeout=(TIMEOUT, read_timeout)) as res:
+        res.raise_for_status()
+        yield None, "open", {}
+        event_id, kind, data = None, "message", []
+        for line in res.iter_lines(decode_unicode=True):
+            if not line:
+                if data:
+                    yield event_id, kind, json.loads("\n".join(data))
+                kind, data = "message", []
+            elif line.startswith(":"):
+                yield None, "keepalive", {}
+            else:
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "id":
+                    event_id = value
+                elif field == "event":
+                    kind = value
+                elif field == "data":
+                    data.append(value)
+
+def _history_params(start_iso: Optional[str], end_iso: Optional[str], cmd_id: Optional[int], action_type: str) -> Dict[str, Any]:
+    params: Dict[str, Any] = {}
     if start_iso:
         params["start"] = start_iso
     if end_iso:
@@ -68,9 +450,36 @@ def fetch_user_history(user_id: int, start_iso: Optional[str], end_iso: Optional
         params["cmd_id"] = cmd_id
     if action_type:
         params["type"] = action_type
-    res = requests.get(f"{API_URL}/history/{user_id}", params=params, timeout=TIMEOUT)
-    return res.json() if res.ok else []
+    return params
 
-def fetch_contexts_for_command(command_id: int):
-    res = requests.get(f"{API_URL}/contexts/{command_id}", timeout=TIMEOUT)
-    return res.json() if res.ok else []
+def fetch_user_history(user_id: int, start_iso: Optional[str], end_iso: Optional[str], cmd_id: Optional[int], action_type: str = "All",
+                       sort: str = "command", page_size: int = 200, cursor: Optional[str] = None, since: Optional[int] = None,
+                       timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    # One page: {"rows": [...], "next_cursor": str | None, "watermark": int}.
+    # Pass next_cursor back with the same filters and sort to get the
+    # following page, or the watermark as ``since`` to get only newer rows.
+    # None when the request failed.
+    params = _history_params(start_iso, end_iso, cmd_id, action_type)
+    params.update({"sort": sort, "page_size": page_size})
+    if cursor:
+        params["cursor"] = cursor
+    if since is not None:
+        params["since"] = since
+    res = _get(f"/history/{user_id}", timeout=timeout, params=params, headers=BINARY_HEADERS)
+    return _body(res) if res.ok else None
+
+def get_export_token(user_id: int, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    # {"token", "expires_in"}: a short-lived, download-only token for history_export_url
+    res = _get(f"/history/{user_id}/export_token", timeout=timeout)
+    return res.json() if res.ok else None
+
+def history_export_url(user_id: int, token: str, start_iso: Optional[str], end_iso: Optional[str], cmd_id: Optional[int], action_type: str = "All", fmt: str = "csv") -> str:
+    # Link for the browser to stream the full history straight from the API;
+    # it carries the download token instead of the session's.
+    params = _history_params(start_iso, end_iso, cmd_id, action_type)
+    params.update({"format": fmt, "token": token})
+    return f"{PUBLIC_API_URL}/history/{user_id}/export?{urlencode(params)}"
+
+def fetch_contexts_for_command(command_id: int, timeout: Optional[float] = None):
+    res = _get(f"/contexts/{command_id}", timeout=timeout, headers=BINARY_HEADERS)
+    return _body(res) if res.ok else []
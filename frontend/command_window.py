@@ -0,0 +1,125 @@
+# frontend/command_window.py
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from api_client import get_commands_page, get_command_id_at, with_auth
+
+PAGE_SIZE = 100        # commands per /commands page
+PREFETCH_MARGIN = 20   # fetch the next page once we are this close to the edge
+KEEP_BEHIND = 200      # commands kept behind the current index before trimming
+KEEP_AHEAD = 2 * PAGE_SIZE
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cmd-prefetch")
+
+Group = Tuple[int, List[Dict[str, Any]]]
+
+class CommandWindow:
+    """Sliding window of commands around the viewer's current index.
+
+    Only a few pages are held at a time; the page after the window is
+    fetched in the background before the viewer reaches it.
+
+    Pages arrive grouped by the server with a command id -> position index,
+    so ``positions`` (command id -> absolute index) is filled per page
+    rather than rebuilt per rerun. A page stamped with a different dataset
+    version (commands were loaded since) rebuilds the window.
+    """
+
+    def __init__(self, index: int):
+        self._reset(index)
+
+    def _reset(self, index: int):
+        self.start = index
+        self.groups: List[Group] = []
+        self.positions: Dict[int, int] = {}
+        self.version: Optional[int] = None
+        self.next_after: Optional[int] = None
+        self.exhausted = False
+        self._pending = None
+        self._stale = False
+
+        after = 0
+        if index > 0:
+            cmd_id = get_command_id_at(index)
+            if cmd_id is None:
+                self.exhausted = True
+                return
+            after = cmd_id - 1
+        self._append(get_commands_page(after_command_id=after, limit=PAGE_SIZE))
+
+    def _index(self, page: Dict[str, Any], base: int):
+        if page["version"] is not None:
+            if self.version is None:
+                self.version = page["version"]
+            elif page["version"] != self.version:
+                self._stale = True
+        for cmd_id, pos in page["index"].items():
+            self.positions[cmd_id] = base + pos
+
+    def _append(self, page: Dict[str, Any]):
+        self._index(page, self.start + len(self.groups))
+        self.groups.extend(page["groups"])
+        self.next_after = page["next_after"]
+        self.exhausted = page["next_after"] is None
+
+    def _load_next(self):
+        if self._pending is None:
+            self._pending = _prefetch_pool.submit(
+                with_auth(get_commands_page), after_command_id=self.next_after, limit=PAGE_SIZE
+            )
+        page = self._pending.result()
+        self._pending = None
+        self._append(page)
+
+    def _load_before(self, index: int):
+        while index < self.start and self.groups:
+            page = get_commands_page(before_command_id=self.groups[0][0], limit=PAGE_SIZE)
+            groups = page["groups"]
+            if not groups:
+                break
+            self.start -= len(groups)
+            self._index(page, self.start)
+            self.groups[:0] = groups
+        if index < self.start or not self.groups:
+            self._reset(index)
+
+    def _prefetch(self, index: int):
+        end = self.start + len(self.groups)
+        if not self.exhausted and self._pending is None and index >= end - PREFETCH_MARGIN:
+            self._pending = _prefetch_pool.submit(
+                with_auth(get_commands_page), after_command_id=self.next_after, limit=PAGE_SIZE
+            )
+
+    def _trim(self, index: int):
+        drop = index - self.start - KEEP_BEHIND
+        if drop > 0:
+            for cmd_id, _ in self.groups[:drop]:
+                del self.positions[cmd_id]
+            del self.groups[:drop]
+            self.start += drop
+        keep = index - self.start + KEEP_AHEAD
+        if len(self.groups) > keep and self._pending is None:
+            # walking backwards: forget the far end, it is re-fetched by key
+            for cmd_id, _ in self.groups[keep:]:
+                del self.positions[cmd_id]
+            del self.groups[keep:]
+            self.next_after = self.groups[-1][0]
+            self.exhausted = False
+
+    def get(self, index: int) -> Optional[Group]:
+        """(command_id, argument rows) at ``index``, or None past the end."""
+        if self._stale:
+            self._reset(index)
+        if index < self.start:
+            self._load_before(index)
+        while index >= self.start + len(self.groups) and not self.exhausted:
+            self._load_next()
+        if index >= self.start + len(self.groups):
+            return None
+        self._trim(index)
+        self._prefetch(index)
+        return self.groups[index - self.start]
+
+    def index_of(self, cmd_id: int) -> Optional[int]:
+        """Absolute index of a command held in the window, else None."""
+        return self.positions.get(cmd_id)
@@ -0,0 +1,99 @@
+# frontend/live_feed.py
+import copy
+import threading
+from typing import Any, Dict, Optional
+
+import requests
+
+from api_client import Auth, get_admin_overview, iter_events, using_auth
+
+RECONNECT_DELAY = 3.0  # seconds before reconnecting a dropped event stream
+RECENT_LIMIT = 10      # entries in recent_activity, as /admin/overview returns them
+
+
+class LiveFeed:
+    """Admin overview kept current from GET /events on a background thread.
+
+    The overview is loaded once the stream is open. After that, each
+    event patches it in memory, so the live pages redraw without calling
+    the API. A "resync" event, or a validator the overview doesn't know
+    yet, reloads it.
+    """
+
+    def __init__(self, auth: Auth):
+        self._auth = auth
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._overview: Optional[Dict[str, Any]] = None
+        self._validators: Dict[int, Dict[str, Any]] = {}
+        self.last_event_id: Optional[str] = None
+        self.connected = False
+        self._thread = threading.Thread(target=self._run, name="admin-live-feed", daemon=True)
+
+    def start(self) -> "LiveFeed":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()  # the thread exits at the next event or keepalive
+
+    def alive(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return copy.deepcopy(self._overview)
+
+    def _reload(self):
+        overview = get_admin_overview()
+        with self._lock:
+            self._overview = overview
+            self._validators = {v["id"]: v for v in overview["validators"]}
+
+    def _apply(self, kind: str, data: Dict[str, Any]) -> bool:
+        # False when the event is about a validator we don't have yet
+        v = self._validators.get(data.get("user_id"))
+        if v is None:
+            return kind not in ("classification", "heartbeat")
+        if kind == "classification":
+            v["dynamic"] += data["dynamic"]
+            v["static"] += data["static"]
+            v["processed"] += data["dynamic"] + data["static"]
+            v["remaining"] = max(0, self._overview["total_commands"] - v["processed"])
+        elif kind == "heartbeat":
+            v["last_seen"] = data["last_seen"]
+            recent = self._overview["recent_activity"]
+            recent[:] = [{"id": v["id"], "name": v["name"], "last_seen": data["last_seen"]}] + \
+                [r for r in recent if r.get("id") != v["id"]]
+            del recent[RECENT_LIMIT:]
+        return True
+
+    def _run(self):
+        with using_auth(self._auth):
+            while not self._stop.is_set():
+                try:
+                    for event_id, kind, data in iter_events(self.last_event_id):
+                        if self._stop.is_set():
+                            return
+                        if kind == "open":
+                            self.connected = True
+                            if self.last_event_id is None:
+                                self._reload()  # subscribed first, so nothing falls in between
+                            continue
+                        if event_id is None:
+                            continue
+                        self.last_event_id = event_id
+                        if kind == "resync":
+                            self._reload()
+                            continue
+                        with self._lock:
+                            known = self._overview is not None and self._apply(kind, data)
+                        if not known:
+                            self._reload()
+                except requests.HTTPError as e:
+                    if e.response is not None and e.response.status_code in (401, 403):
+                        return  # logged out or no longer an admin
+                except (requests.RequestException, ValueError):
+                    pass
+                self.connected = False
+                self._stop.wait(RECONNECT_DELAY)
@@ -1,6 +1,6 @@
 # frontend/validator.py
 import streamlit as st
-from api_client import signup_user, login_user, get_last_processed_cmd_id
+from api_client import signup_user, login_user, logout_user, set_auth
 st.set_page_config(page_title="Creo Trail Validator", layout="centered")
 
 # -------------------- Session State --------------------
@@ -9,6 +9,9 @@ if "logged_in" not in st.session_state:
 if "user" not in st.session_state:
     st.session_state.user = None
 
+# API calls from this script run use the logged-in user's tokens
+set_auth(st.session_state.user["auth"] if st.session_state.user else None)
+
 def signup():
     st.markdown("<h2 style='text-align:center; color:#3b82f6;'>🔧 Creo Trail Validator</h2>", unsafe_allow_html=True)
     st.write("<p style='text-align:center;'>Create your account</p>", unsafe_allow_html=True)
@@ -39,6 +42,11 @@ def login():
     st.markdown("<h2 style='text-align:center; color:#3b82f6;'>🔧 Creo Trail Validator</h2>", unsafe_allow_html=True)
     st.write("<p style='text-align:center;'>Sign in to your account</p>", unsafe_allow_html=True)
 
+    rejected = st.session_state.pop("logout_rejected", None)
+    if rejected:
+        ids = ", ".join(str(r["command_id"]) for r in rejected)
+        st.warning(f"{len(rejected)} label(s) from your last session were rejected (command IDs: {ids}).")
+
     with st.form("login_form"):
         email = st.text_input("Email")
         password = st.text_input("Password", type="password")
@@ -52,6 +60,7 @@ def login():
                 user = login_user(email, password)
                 if user:
                     if user["role"].lower() != login_type.lower():
+                        logout_user()
                         st.error("Incorrect role selected.")
                         return
 
@@ -59,8 +68,8 @@ def login():
                     st.session_state.user = user
 
                     if login_type == "Validator":
-                        st.session_state.current_index = get_last_processed_cmd_id(user["id"]) or 0
-                        st.session_state.pop("cmds_data", None)
+                        st.session_state.current_index = 0
+                        st.session_state.pop("leases", None)
                         st.session_state.pop("sub_idx", None)
 
                     st.experimental_rerun()
@@ -90,9 +99,5 @@ else:
         validator_dashboard.validator_dashboard()
 
     else:
-        st.title("👀 Viewer")
-        st.info("Viewer dashboard coming soon.")
-        if st.sidebar.button("🚪 Logout"):
-            st.session_state.logged_in = False
-            st.session_state.user = None
-            st.experimental_rerun()
+        import viewer_dashboard
+        viewer_dashboard.viewer_dashboard()
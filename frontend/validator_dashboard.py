@@ -4,19 +4,28 @@ import html
 from datetime import datetime, timedelta
 
 from api_client import (
-    get_commands_with_contexts,
+    logout_user,
     insert_dynamic_command,
     insert_static_command,
     update_last_processed_cmd,
-    get_last_processed_cmd_id,
-    get_all_validators,
-    get_validator_stats,
     get_user_counts_by_role,
     get_recently_active_validators,
+    next_command,
+    release_command,
+    LabelBuffer,
 )
 
 from validator_history import render_history_for_user  # reuse history UI
 
+# Queue labels client-side and send them to /mark_batch in groups
+# instead of two HTTP calls per click.
+BUFFER_LABELS = True
+
+# The server hands out commands (/next_command), so two validators are
+# never shown the same one; the ones leased this session stay reachable
+# with Previous/Next.
+KEEP_LEASES = 200  # leased commands kept for Previous
+
 # small CSS from original file (kept)
 _DEF_CSS = """
 <style>
@@ -33,14 +42,71 @@ _DEF_CSS = """
 """
 
 def _ensure_state():
-    if "cmds_data" not in st.session_state:
-        st.session_state.cmds_data = get_commands_with_contexts()
     if "current_index" not in st.session_state:
         st.session_state.current_index = 0
+    if "leases" not in st.session_state:
+        st.session_state.leases = []  # {"command_id", "arguments", "held", "label"}
     if "sub_idx" not in st.session_state:
         st.session_state.sub_idx = {}
     if "nav" not in st.session_state:
         st.session_state.nav = "dashboard"
+    user_id = st.session_state.user["id"]
+    buf = st.session_state.get("label_buffer")
+    if BUFFER_LABELS and (buf is None or buf.user_id != user_id):
+        st.session_state.label_buffer = LabelBuffer(user_id)
+
+def _flush_labels() -> bool:
+    buf = st.session_state.get("label_buffer")
+    return buf.flush() if buf is not None else True
+
+def _record_label(user_id: int, lease: dict, action: str, command_text: str):
+    cmd_id = lease["command_id"]
+    buf = st.session_state.get("label_buffer")
+    if buf is not None:
+        buf.add(cmd_id, action, command_text, last_cmd_id=cmd_id, leased=lease["held"])
+    else:
+        if action == "Dynamic":
+            insert_dynamic_command(user_id, cmd_id, command_text)
+        else:
+            insert_static_command(user_id, cmd_id, command_text)
+        update_last_processed_cmd(user_id, cmd_id)
+    lease["held"] = False  # the label completes the lease
+    lease["label"] = action
+
+def _current_lease():
+    # the lease at current_index, leasing a new command past the end; None
+    # when no work is left
+    leases = st.session_state.leases
+    idx = st.session_state.current_index
+    if idx < len(leases):
+        return leases[idx]
+    # every command kept here is skipped: held, or labelled with the label
+    # possibly still queued
+    skip = [l["command_id"] for l in leases]
+    buf = st.session_state.get("label_buffer")
+    lease = buf.next_lease(skip) if buf is not None else next_command(skip=skip)
+    if lease is None:
+        st.error("Could not reach the server to fetch the next command.")
+        st.stop()
+    if lease["command_id"] is None:
+        return None
+    leases.append({
+        "command_id": lease["command_id"],
+        "arguments": lease["arguments"] or [{"full_command_line": "", "context_lines": None}],
+        "held": True,
+        "label": None,
+    })
+    if len(leases) > KEEP_LEASES:
+        del leases[0]
+    st.session_state.current_index = len(leases) - 1
+    return leases[-1]
+
+def _show_rejected():
+    buf = st.session_state.get("label_buffer")
+    rejected = buf.pop_rejected() if buf is not None else []
+    if rejected:
+        ids = ", ".join(str(r["command_id"]) for r in rejected)
+        st.warning(f"⚠️ {len(rejected)} label(s) were rejected by the server (command IDs: {ids}).")
 
 def _set_nav(target: str):
     st.session_state.nav = target
@@ -55,6 +121,16 @@ def _navbar():
     st.sidebar.button("📜 History", key="btn_nav_history", on_click=_set_nav, args=("history",))
     st.sidebar.write("---")
     if st.sidebar.button("🚪 Logout", key="btn_logout"):
+        if not _flush_labels():
+            st.sidebar.error("Could not save pending labels. Check the connection and try again.")
+            return
+        buf = st.session_state.pop("label_buffer", None)
+        if buf is not None:
+            buf.discard_lease_ahead()
+            st.session_state.logout_rejected = buf.pop_rejected()
+        if st.session_state.pop("leases", None):
+            release_command()  # hand the unlabelled commands to someone else
+        logout_user()
         st.session_state.logged_in = False
         st.session_state.user = None
         st.rerun()
@@ -70,28 +146,27 @@ def validator_dashboard():
     _navbar()
 
     if st.session_state.nav == "history":
+        # history reads from the server, so send queued labels first
+        _flush_labels()
         # choose validator_history view entry
         render_history_for_user(user)
         return
 
     # Dashboard main view
+    st.markdown(_DEF_CSS, unsafe_allow_html=True)
     st.markdown("<h1 class='h-center'> Command Context Classifier</h1>", unsafe_allow_html=True)
+    _show_rejected()
 
-    all_data = st.session_state.cmds_data
-    grouped = {}
-    for row in all_data:
-        cmd_id = row["command_id"]
-        grouped.setdefault(cmd_id, []).append(row)
-
-    cmd_ids = list(grouped.keys())
     idx = st.session_state.current_index
-
-    if idx >= len(cmd_ids):
+    current = _current_lease()
+    if current is None:
         st.success("🎉 All commands reviewed!")
+        if idx > 0 and st.button("⬅️ Previous Command", key="btn_prev_cmd_done"):
+            st.session_state.current_index = idx - 1
+            st.rerun()
         return
 
-    cmd_id = cmd_ids[idx]
-    arg_list = grouped[cmd_id]
+    cmd_id, arg_list = current["command_id"], current["arguments"]
 
     sub_idx = st.session_state.sub_idx.get(cmd_id, 0)
     if sub_idx >= len(arg_list):
@@ -100,6 +175,9 @@ def validator_dashboard():
     argument = arg_list[sub_idx]
 
     st.markdown(f"### 🆔 Command ID: {cmd_id}")
+    if current["label"]:
+        badge = "badge-dyn" if current["label"] == "Dynamic" else "badge-stat"
+        st.markdown(f"<span class='badge {badge}'>Marked {current['label']}</span>", unsafe_allow_html=True)
     st.markdown(
         f"<pre class='command-pre'>{html.escape(argument['full_command_line'] or '')}</pre>",
         unsafe_allow_html=True
@@ -128,28 +206,24 @@ def validator_dashboard():
     col_dyn, col_stat = st.columns(2)
     with col_dyn:
         if st.button("✅ Mark as Dynamic", key=f"btn_mark_dyn_{cmd_id}_{sub_idx}"):
-            insert_dynamic_command(user["id"], cmd_id, argument['full_command_line'])
-            update_last_processed_cmd(user["id"], idx + 1)
-            st.session_state.current_index += 1
+            _record_label(user["id"], current, "Dynamic", argument['full_command_line'])
+            st.session_state.current_index = st.session_state.current_index + 1
             st.rerun()
 
     with col_stat:
         if st.button("✅ Mark as Static", key=f"btn_mark_stat_{cmd_id}_{sub_idx}"):
-            insert_static_command(user["id"], cmd_id, argument['full_command_line'])
-            update_last_processed_cmd(user["id"], idx + 1)
-            st.session_state.current_index += 1
+            _record_label(user["id"], current, "Static", argument['full_command_line'])
+            st.session_state.current_index = st.session_state.current_index + 1
             st.rerun()
 
+    # Next past the newest command leases another; the skipped one stays
+    # leased until it is labelled or the validator logs out
     col1, col2 = st.columns([1, 1])
     with col1:
         if st.button("⬅️ Previous Command", key=f"btn_prev_cmd_{cmd_id}"):
-            st.session_state.current_index = max(0, idx - 1)
-            new_cmd_id = cmd_ids[st.session_state.current_index]
-            st.session_state.sub_idx[new_cmd_id] = 0
+            st.session_state.current_index = max(0, st.session_state.current_index - 1)
             st.rerun()
     with col2:
         if st.button("➡️ Next Command", key=f"btn_next_cmd_{cmd_id}"):
-            st.session_state.current_index = min(len(cmd_ids) - 1, idx + 1)
-            new_cmd_id = cmd_ids[st.session_state.current_index]
-            st.session_state.sub_idx[new_cmd_id] = 0
+            st.session_state.current_index = st.session_state.current_index + 1
             st.rerun()
@@ -3,7 +3,7 @@ import streamlit as st
 import html
 from datetime import datetime, date, time, timedelta
 
-from api_client import fetch_user_history, fetch_contexts_for_command
+from api_client import fetch_user_history, fetch_contexts_for_command, get_export_token, history_export_url
 
 _DEF_CSS = """
 <style>
@@ -19,15 +19,94 @@ _DEF_CSS = """
 </style>
 """
 
+HISTORY_PAGE_SIZE = 200
+HISTORY_CACHE_ENTRIES = 8  # (user, filters) views kept for delta sync
+HISTORY_OVERLAP_IDS = 1000  # a delta starts this far below the watermark
+_NO_FILTERS = (None, None, None, "All")
+EXPORT_TOKEN_REUSE = 0.5  # share of a download token's lifetime it is reused across reruns
+
+def _export_token(user_id: int):
+    # minted once and reused until half its lifetime is gone, so the link
+    # on screen stays valid without a new token on every rerun
+    cached = st.session_state.get("export_token")
+    if cached and cached["user_id"] == user_id and datetime.now() < cached["renew_at"]:
+        return cached["token"]
+    res = get_export_token(user_id)
+    if res is None:
+        return None
+    st.session_state.export_token = {
+        "user_id": user_id,
+        "token": res["token"],
+        "renew_at": datetime.now() + timedelta(seconds=res["expires_in"] * EXPORT_TOKEN_REUSE),
+    }
+    return res["token"]
+
+def _row_key(r):
+    # the server's "command" sort order
+    return (r["command_id"], r["processed_time"], r["action"])
+
+def _merge(view, rows, clip):
+    # Rows are unique by id. With ``clip``, rows past the last loaded page
+    # are left for "Load more" so the list stays a prefix of the sort order.
+    by_id = {r["id"]: r for r in view["rows"]}
+    for r in rows:
+        if not clip or view["cursor"] is None or _row_key(r) <= view["edge"]:
+            by_id[r["id"]] = r
+    view["rows"] = sorted(by_id.values(), key=_row_key)
+
+def _add_page(view, page):
+    _merge(view, page["rows"], clip=False)
+    view["cursor"] = page["next_cursor"]
+    if page["rows"]:
+        view["edge"] = _row_key(page["rows"][-1])
+
+def _sync_history(user_id, filters):
+    # First visit to (user, filters) loads one page and remembers the
+    # watermark; later visits (Clear, switching validators, coming back to
+    # the page) fetch only rows added since and merge them in.
+    cache = st.session_state.history_cache
+    key = (user_id, filters)
+    view = cache.pop(key, None)
+    if view is None:
+        page = fetch_user_history(user_id, *filters, page_size=HISTORY_PAGE_SIZE)
+        if page is None:
+            return None
+        view = {"rows": [], "cursor": None, "edge": None, "watermark": page["watermark"]}
+        _add_page(view, page)
+    else:
+        # Ids are taken at insert but become visible at commit, so a row can
+        # show up below a watermark already read. Re-read a band under it;
+        # _merge drops the rows already held.
+        since = max(view["watermark"] - HISTORY_OVERLAP_IDS, 0)
+        while True:
+            delta = fetch_user_history(user_id, *filters, page_size=HISTORY_PAGE_SIZE, since=since)
+            if delta is None:
+                break
+            _merge(view, delta["rows"], clip=True)
+            since = delta["watermark"]
+            view["watermark"] = max(view["watermark"], since)
+            if len(delta["rows"]) < HISTORY_PAGE_SIZE:
+                break
+    cache[key] = view
+    while len(cache) > HISTORY_CACHE_ENTRIES:
+        cache.pop(next(iter(cache)))
+    return view
+
+def _show(user_id, filters):
+    st.session_state.history_view = (user_id, filters)
+    st.session_state.history_selected = None
+    st.session_state.history_details = []
+    st.session_state.history_mode = "list"
+
 def render_history_for_user(user):
     st.markdown(_DEF_CSS, unsafe_allow_html=True)
     st.markdown(f"🧑‍💻 Showing history for: {user['name']}")
     user_id = user["id"]
 
-    if "history_loaded" not in st.session_state:
-        st.session_state.history_loaded = False
-    if "history_rows" not in st.session_state:
-        st.session_state.history_rows = []
+    if "history_cache" not in st.session_state:
+        st.session_state.history_cache = {}
+    if "history_view" not in st.session_state:
+        st.session_state.history_view = None
     if "history_selected" not in st.session_state:
         st.session_state.history_selected = None
     if "history_details" not in st.session_state:
@@ -35,10 +114,10 @@ def render_history_for_user(user):
     if "history_mode" not in st.session_state:
         st.session_state.history_mode = "list"
 
-    if not st.session_state.history_loaded:
-        rows = fetch_user_history(user_id, None, None, None, "All")
-        st.session_state.history_rows = rows
-        st.session_state.history_loaded = True
+    if st.session_state.history_view is None or st.session_state.history_view[0] != user_id:
+        _show(user_id, _NO_FILTERS)
+    filters = st.session_state.history_view[1]
+    view = _sync_history(user_id, filters)
 
     # Filters
     with st.expander(" Filters", expanded=True):
@@ -53,10 +132,7 @@ def render_history_for_user(user):
         clear_clicked = col4.button("Clear", key="hist_clear")
 
         if clear_clicked:
-            st.session_state.history_rows = fetch_user_history(user_id, None, None, None, "All")
-            st.session_state.history_selected = None
-            st.session_state.history_details = []
-            st.session_state.history_mode = "list"
+            _show(user_id, _NO_FILTERS)
             st.experimental_rerun()
 
         if apply_clicked:
@@ -67,14 +143,22 @@ def render_history_for_user(user):
             cmd_id_val = None
             if command_id_input and command_id_input.strip().isdigit():
                 cmd_id_val = int(command_id_input.strip())
-            rows = fetch_user_history(user_id, start_dt.isoformat() if start_dt else None, end_dt.isoformat() if end_dt else None, cmd_id_val, type_choice)
-            st.session_state.history_rows = rows
-            st.session_state.history_selected = None
-            st.session_state.history_details = []
-            st.session_state.history_mode = "list"
+            filters = (start_dt.isoformat() if start_dt else None, end_dt.isoformat() if end_dt else None, cmd_id_val, type_choice)
+            _show(user_id, filters)
             st.experimental_rerun()
 
-    rows = st.session_state.history_rows
+    rows = view["rows"] if view else []
+
+    # Full export (the list below is loaded a page at a time), streamed by the API
+    d1, d2 = st.columns([1.0, 4.0])
+    export_fmt = d1.selectbox("Export format", options=["csv", "ndjson"], key="hist_export_fmt")
+    export_token = _export_token(user_id)
+    if export_token:
+        export_url = history_export_url(user_id, export_token, *filters, fmt=export_fmt)
+        d2.markdown(
+            f"<div style='padding-top:30px;'><a href='{html.escape(export_url)}' download>⬇ Download full history ({export_fmt.upper()}, current filters)</a></div>",
+            unsafe_allow_html=True
+        )
 
     st.write("#### Actions")
     st.caption("Click **View details** on any row to preview the command and all its contexts.")
@@ -118,6 +202,13 @@ def render_history_for_user(user):
                 st.session_state.history_mode = "detail"
                 st.experimental_rerun()
 
+    if view and view["cursor"]:
+        if st.button(f"Load {HISTORY_PAGE_SIZE} more", key="hist_load_more"):
+            page = fetch_user_history(user_id, *filters, page_size=HISTORY_PAGE_SIZE, cursor=view["cursor"])
+            if page is not None:
+                _add_page(view, page)
+            st.experimental_rerun()
+
     # detail view
     if st.session_state.history_mode == "detail":
         if st.button("⬅ Back to History", key="btn_back_to_history"):
@@ -147,7 +238,7 @@ def render_history_for_user(user):
             ctx_lines = arg.get("context_lines", "")
             if not ctx_lines or not ctx_lines.strip():
                 continue
-            clean_ctx = html.escape(ctx_lines.replace("\\n", "\n").replace("\\\\", "\\").strip())
+            clean_ctx = html.escape(ctx_lines.strip())
             full_cmd = html.escape(arg.get("full_command_line", "") or "")
             st.markdown(
                 f"""
@@ -0,0 +1,63 @@
+# frontend/viewer_dashboard.py
+import streamlit as st
+import html
+
+from api_client import logout_user
+from command_window import CommandWindow
+
+# Read-only walk through every command in id order: /commands pages held in
+# a CommandWindow, so Previous/Next and jumps rarely wait on the server.
+
+def _ensure_state():
+    if "view_index" not in st.session_state:
+        st.session_state.view_index = 0
+    if "view_window" not in st.session_state:
+        st.session_state.view_window = CommandWindow(st.session_state.view_index)
+
+def _go(index: int):
+    st.session_state.view_index = max(0, index)
+
+def viewer_dashboard():
+    _ensure_state()
+    if st.sidebar.button("🚪 Logout"):
+        logout_user()
+        st.session_state.pop("view_window", None)
+        st.session_state.pop("view_index", None)
+        st.session_state.logged_in = False
+        st.session_state.user = None
+        st.experimental_rerun()
+
+    st.title("👀 Commands")
+    window = st.session_state.view_window
+    idx = st.session_state.view_index
+
+    jump = st.sidebar.number_input("Go to position", min_value=1, value=idx + 1, step=1)
+    if jump - 1 != idx:
+        # a far jump starts a new window there (one /commands/position lookup)
+        _go(int(jump) - 1)
+        st.session_state.view_window = CommandWindow(st.session_state.view_index)
+        st.experimental_rerun()
+
+    current = window.get(idx)
+    if current is None:
+        st.info("No command at this position.")
+        if idx > 0:
+            st.button("⬅️ Previous Command", key="btn_view_prev_end", on_click=_go, args=(idx - 1,))
+        return
+
+    cmd_id, arg_list = current
+    position = window.index_of(cmd_id)
+    st.markdown(f"### 🆔 Command ID: {cmd_id}  ·  position {(position if position is not None else idx) + 1}")
+    for argument in arg_list:
+        st.markdown(
+            f"<pre class='command-pre'>{html.escape(argument['full_command_line'] or '')}</pre>",
+            unsafe_allow_html=True
+        )
+        with st.expander("📄 Context Lines"):
+            st.text(argument.get("context_lines") or "No context found.")
+
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        st.button("⬅️ Previous Command", key=f"btn_view_prev_{cmd_id}", on_click=_go, args=(idx - 1,), disabled=idx == 0)
+    with col2:
+        st.button("➡️ Next Command", key=f"btn_view_next_{cmd_id}", on_click=_go, args=(idx + 1,))
@@ -0,0 +1,55 @@
+# tests/conftest.py
+# The suite runs the app in-process (httpx ASGI transport, as in
+# benchmarks/bench_workload.py) against a fresh SQLite file per test.
+import os
+import sys
+import tempfile
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# read by config.py, so set before anything from backend is imported
+os.environ["STORAGE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "unused.db")
+os.environ["TOKEN_SECRET"] = "test-secret"
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from backend import cache, main, sqlite_db  # noqa: E402
+from backend.tokens import issue_access_token  # noqa: E402
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def store(tmp_path, monkeypatch):
+    store = sqlite_db.SQLiteStorage(str(tmp_path / "test.db"))
+    monkeypatch.setattr(main, "db", store)
+    for c in cache._caches.values():
+        c.invalidate()
+    await store.init_schema()
+    yield store
+    await store.close_pool()
+
+@pytest.fixture
+async def client(store):
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            yield c
+
+def auth(user_id: int, role: str = "validator") -> Dict[str, str]:
+    return {"Authorization": f"Bearer {issue_access_token(user_id, role)}"}
+
+async def seed_commands(store, n: int, args_per_command: int = 2) -> List[int]:
+    """Load ``n`` commands through the ingest path; returns their ids in order."""
+    records = {}
+    for i in range(n):
+        for j in range(args_per_command):
+            records[f"{i:04d}-{j}"] = (f"Cmd{i:04d}", f"~ Command `Cmd{i:04d}` `arg{j}`", f"context {i} {j}")
+    known: Dict[str, int] = {}
+    await store.insert_arguments(records, known)
+    return [known[f"Cmd{i:04d}"] for i in range(n)]
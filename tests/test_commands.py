@@ -0,0 +1,38 @@
+# tests/test_commands.py
+import pytest
+
+from backend import sql_storage
+from backend.sqlite_db import SQLiteStorage
+from conftest import auth, seed_commands
+
+pytestmark = pytest.mark.anyio
+
+async def _version(client):
+    res = await client.get("/commands", params={"grouped": True, "limit": 5}, headers=auth(1))
+    assert res.status_code == 200
+    return res.json()["version"]
+
+async def test_dataset_version_moves_with_each_load(client, store):
+    await seed_commands(store, 3)
+    first = await _version(client)
+    assert await _version(client) == first
+
+    await seed_commands(store, 3)  # nothing new: same version
+    assert await _version(client) == first
+    await seed_commands(store, 4)
+    assert await _version(client) > first
+
+async def test_a_load_by_another_process_reaches_the_cached_pages(client, store, monkeypatch):
+    await seed_commands(store, 2)
+    page = await client.get("/commands", params={"limit": 10}, headers=auth(1))
+    assert page.headers["X-Command-Count"] == "2"
+
+    # python -m backend.ingest: shares only the file, not this process's caches
+    ingest = SQLiteStorage(store.path)
+    with monkeypatch.context() as m:
+        m.setattr(sql_storage, "invalidate", lambda *tags: None)
+        records = {"new-0": ("CmdNew", "~ Command `CmdNew`", "context")}
+        await ingest.insert_arguments(records, {})
+        await ingest.close_pool()
+    page = await client.get("/commands", params={"limit": 10}, headers=auth(1))
+    assert page.headers["X-Command-Count"] == "3"
@@ -0,0 +1,44 @@
+# tests/test_heartbeats.py
+from datetime import datetime
+
+import anyio
+import pytest
+
+from backend import heartbeats
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture(autouse=True)
+def _clean(monkeypatch):
+    monkeypatch.setattr(heartbeats, "_pending", {})
+    monkeypatch.setattr(heartbeats, "_inflight", {})
+
+async def test_failed_write_puts_the_batch_back_under_newer_beats():
+    heartbeats._pending.update({1: datetime(2024, 1, 1, 9), 2: datetime(2024, 1, 1, 9)})
+
+    async def write(batch):
+        # user 2 beats again while the UPDATE is in flight
+        heartbeats._pending[2] = datetime(2024, 1, 1, 10)
+        raise RuntimeError("database went away")
+
+    with pytest.raises(RuntimeError):
+        await heartbeats.flush(write)
+    assert heartbeats.pending() == {1: datetime(2024, 1, 1, 9), 2: datetime(2024, 1, 1, 10)}
+
+async def test_batch_stays_visible_until_the_write_commits():
+    seen = datetime(2024, 1, 1, 9)
+    heartbeats._pending[1] = seen
+    started, release = anyio.Event(), anyio.Event()
+    written = {}
+
+    async def write(batch):
+        started.set()
+        await release.wait()
+        written.update(batch)
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(heartbeats.flush, write)
+        await started.wait()
+        assert heartbeats.latest(1, None) == seen and heartbeats.pending() == {1: seen}
+        release.set()
+    assert written == {1: seen} and heartbeats.pending() == {}
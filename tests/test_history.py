@@ -0,0 +1,123 @@
+# tests/test_history.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import auth, seed_commands
+
+pytestmark = pytest.mark.anyio
+
+async def _label_all(store, user_id, ids, base=datetime(2024, 1, 1)):
+    # two labels per command, times deliberately out of command order
+    items = []
+    for n, cmd_id in enumerate(ids):
+        for k, action in enumerate(("Dynamic", "Static")):
+            when = base + timedelta(minutes=(n * 7) % len(ids), seconds=k)
+            items.append({"command_id": cmd_id, "action": action, "command_text": f"t{cmd_id}", "processed_time": when})
+    result = await store.insert_classifications(user_id, items)
+    assert result["accepted"] == len(items)
+    return items
+
+async def _walk(client, user_id, params):
+    rows, cursor, pages = [], None, 0
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        body = (await client.get(f"/history/{user_id}", params=query, headers=auth(user_id))).json()
+        rows += body["rows"]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return rows, pages
+
+@pytest.mark.parametrize("sort", ["command", "time"])
+async def test_cursor_pages_cover_every_row_once_in_order(client, store, sort):
+    ids = await seed_commands(store, 25)
+    await _label_all(store, 3, ids)
+    rows, pages = await _walk(client, 3, {"sort": sort, "page_size": 7})
+    assert len(rows) == 50 and pages == 8
+    assert len({r["id"] for r in rows}) == 50
+    if sort == "command":
+        keys = [(r["command_id"], r["processed_time"], r["action"]) for r in rows]
+        assert keys == sorted(keys)
+    else:
+        keys = [(r["processed_time"], r["command_id"], r["action"]) for r in rows]
+        assert keys == sorted(keys, reverse=True)
+
+async def test_type_filter_applies_to_every_page(client, store):
+    ids = await seed_commands(store, 10)
+    await _label_all(store, 3, ids)
+    rows, _ = await _walk(client, 3, {"type": "Static", "page_size": 3})
+    assert len(rows) == 10 and {r["action"] for r in rows} == {"Static"}
+
+async def test_invalid_cursor_is_rejected(client, store):
+    res = await client.get("/history/3", params={"cursor": "not-a-cursor"}, headers=auth(3))
+    assert res.status_code == 400
+
+async def test_since_returns_only_rows_added_after_the_watermark(client, store):
+    ids = await seed_commands(store, 6)
+    await store.insert_classifications(3, [{"command_id": i, "action": "Static", "command_text": "x"} for i in ids[:2]])
+    first = (await client.get("/history/3", headers=auth(3))).json()
+    assert len(first["rows"]) == 2
+    watermark = first["watermark"]
+
+    await store.insert_classifications(3, [{"command_id": i, "action": "Dynamic", "command_text": "y"} for i in ids[2:]])
+    await store.insert_classifications(4, [{"command_id": ids[0], "action": "Dynamic", "command_text": "other user"}])
+    seen, since = [], watermark
+    while True:
+        body = (await client.get("/history/3", params={"since": since, "page_size": 3}, headers=auth(3))).json()
+        seen += body["rows"]
+        since = body["watermark"]
+        if len(body["rows"]) < 3:
+            break
+    assert [r["command_id"] for r in seen] == ids[2:]
+    assert all(r["id"] > watermark for r in seen)
+    again = (await client.get("/history/3", params={"since": since}, headers=auth(3))).json()
+    assert again["rows"] == [] and again["watermark"] == since
+
+async def test_pages_split_rows_that_share_a_time(client, store):
+    # one batch without client times: every row has the same processed_time,
+    # so only the later key columns separate the pages
+    ids = await seed_commands(store, 9)
+    await store.insert_classifications(3, [{"command_id": i, "action": a, "command_text": "x"}
+                                           for i in ids for a in ("Dynamic", "Static")])
+    rows, pages = await _walk(client, 3, {"sort": "time", "page_size": 4})
+    assert pages == 5
+    assert [(r["command_id"], r["action"]) for r in rows] == sorted(
+        ((i, a) for i in ids for a in ("Dynamic", "Static")), reverse=True)
+
+async def test_storage_errors_are_not_hidden(store):
+    conn = await store.get_connection()
+    try:
+        await conn.execute("DROP TABLE classifications")
+        await conn.commit()
+    finally:
+        await conn.close()
+    with pytest.raises(store.Error):
+        await store.fetch_user_history(3, None, None, None)
+
+async def _insert_label(store, row_id, cmd_id, text):
+    conn = await store.get_connection()
+    try:
+        await conn.execute(
+            "INSERT INTO classifications (id, user_id, command_id, action, command_text, processed_time) VALUES (?, 3, ?, 'Static', ?, ?)",
+            (row_id, cmd_id, text, datetime(2024, 1, 1))
+        )
+        await conn.commit()
+    finally:
+        await conn.close()
+
+async def test_delta_below_the_watermark_picks_up_rows_committed_out_of_order(client, store):
+    # id 11 commits first; id 10, taken earlier by a slower transaction,
+    # only becomes visible after the watermark was read
+    ids = await seed_commands(store, 3)
+    await _insert_label(store, 11, ids[0], "early")
+    first = (await client.get("/history/3", headers=auth(3))).json()
+    assert first["watermark"] == 11
+    await _insert_label(store, 10, ids[1], "late")
+    await _insert_label(store, 12, ids[2], "new")
+
+    exact = (await client.get("/history/3", params={"since": 11}, headers=auth(3))).json()
+    assert [r["id"] for r in exact["rows"]] == [12]
+    overlap = (await client.get("/history/3", params={"since": 0}, headers=auth(3))).json()
+    by_id = {r["id"]: r for r in first["rows"] + overlap["rows"]}
+    assert sorted(by_id) == [10, 11, 12] and overlap["watermark"] == 12
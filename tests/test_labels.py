@@ -0,0 +1,65 @@
+# tests/test_labels.py
+import pytest
+
+from conftest import auth, seed_commands
+
+pytestmark = pytest.mark.anyio
+
+async def test_mark_batch_accepts_and_rejects_per_item(client, store):
+    ids = await seed_commands(store, 3)
+    uid = (await store.create_user("v", "v@x", "pw"))["id"]
+    items = [
+        {"command_id": ids[0], "action": "Dynamic", "command_text": "a"},
+        {"command_id": ids[1], "action": "Static", "command_text": "b"},
+        {"command_id": 999999, "action": "Static", "command_text": "c"},
+        {"command_id": ids[2], "action": "Maybe", "command_text": "d"},
+    ]
+    res = await client.post("/mark_batch", json={"user_id": uid, "items": items, "last_cmd_id": ids[1]},
+                            headers=auth(uid))
+    assert res.status_code == 200
+    body = res.json()
+    assert body["accepted"] == 2
+    assert [(r["index"], r["reason"]) for r in body["rejected"]] == [(2, "unknown command"), (3, "invalid action")]
+
+    stats = (await client.get(f"/validator_stats/{uid}", headers=auth(uid))).json()
+    assert (stats["dynamic"], stats["static"], stats["processed"], stats["total"]) == (1, 1, 2, 3)
+    assert (await client.get(f"/last_cmd/{uid}", headers=auth(uid))).json() == {"last_cmd_id": ids[1]}
+
+async def test_mark_batch_is_limited_to_own_user(client, store):
+    ids = await seed_commands(store, 1)
+    items = [{"command_id": ids[0], "action": "Static", "command_text": "a"}]
+    res = await client.post("/mark_batch", json={"user_id": 8, "items": items}, headers=auth(7))
+    assert res.status_code == 403
+
+async def test_mark_batch_rejects_duplicates_instead_of_failing(client, store):
+    ids = await seed_commands(store, 2)
+    uid = (await store.create_user("v", "v@x", "pw"))["id"]
+    untimed = [
+        {"command_id": ids[0], "action": "Dynamic", "command_text": "a"},
+        {"command_id": ids[0], "action": "Dynamic", "command_text": "a"},  # same key: same batch time
+    ]
+    res = await client.post("/mark_batch", json={"user_id": uid, "items": untimed}, headers=auth(uid))
+    assert res.status_code == 200
+    assert res.json() == {"accepted": 1, "rejected": [{"index": 1, "command_id": ids[0], "reason": "duplicate"}]}
+
+    # a resent batch with client times stores nothing twice
+    timed = [{"command_id": ids[1], "action": "Static", "command_text": "b", "processed_time": "2026-01-02T03:04:05.123456"}]
+    first = await client.post("/mark_batch", json={"user_id": uid, "items": timed}, headers=auth(uid))
+    again = await client.post("/mark_batch", json={"user_id": uid, "items": timed}, headers=auth(uid))
+    assert first.json()["accepted"] == 1
+    assert again.json() == {"accepted": 0, "rejected": [{"index": 0, "command_id": ids[1], "reason": "duplicate"}]}
+
+    stats = (await client.get(f"/validator_stats/{uid}", headers=auth(uid))).json()
+    assert (stats["dynamic"], stats["static"]) == (1, 1)
+
+async def test_single_marks_reject_unknown_commands(client, store):
+    ids = await seed_commands(store, 1)
+    uid = (await store.create_user("v", "v@x", "pw"))["id"]
+    known = {"user_id": uid, "command_id": ids[0], "command_text": "a"}
+    unknown = {"user_id": uid, "command_id": 999999, "command_text": "b"}
+    assert (await client.post("/mark_dynamic", json=known, headers=auth(uid))).status_code == 200
+    assert (await client.post("/mark_static", json=unknown, headers=auth(uid))).status_code == 404
+    assert (await client.post("/mark_dynamic", json=unknown, headers=auth(uid))).status_code == 404
+
+    stats = (await client.get(f"/validator_stats/{uid}", headers=auth(uid))).json()
+    assert (stats["dynamic"], stats["static"]) == (1, 0)
@@ -0,0 +1,139 @@
+# tests/test_leases.py
+from datetime import datetime
+
+import pytest
+
+from backend import sql_storage
+from conftest import auth, seed_commands
+
+pytestmark = pytest.mark.anyio
+
+def _label(cmd_id, action="Static"):
+    return {"command_id": cmd_id, "action": action, "command_text": f"t{cmd_id}"}
+
+async def test_validators_never_share_a_command(client, store):
+    ids = await seed_commands(store, 4)
+    leased = [(await client.post("/next_command", json={}, headers=auth(u))).json()["command_id"] for u in (1, 2, 3)]
+    assert sorted(leased) == ids[:3]
+
+    # asking again renews the same lease
+    again = (await client.post("/next_command", json={}, headers=auth(1))).json()
+    assert again["command_id"] == leased[0] and again["arguments"]
+
+async def test_labels_complete_leases_until_no_work_is_left(client, store):
+    ids = await seed_commands(store, 3)
+    done = []
+    body = (await client.post("/next_command", json={}, headers=auth(1))).json()
+    while body["command_id"] is not None:
+        done.append(body["command_id"])
+        body = (await client.post("/next_command", json={"label": _label(body["command_id"])}, headers=auth(1))).json()
+        assert body["label"]["accepted"] == 1
+    assert done == ids
+    # with redundancy 1 every command is covered, so a second validator gets nothing
+    assert (await client.post("/next_command", json={}, headers=auth(2))).json()["command_id"] is None
+
+async def test_redundancy_k_gives_each_command_to_k_validators(store):
+    ids = await seed_commands(store, 2)
+    got = {u: (await store.next_command(u, redundancy=2))["command_id"] for u in (1, 2, 3, 4)}
+    assert sorted(got.values()) == sorted(ids * 2)
+    assert await store.next_command(5, redundancy=2) is None
+
+async def test_expired_and_released_leases_return_to_the_pool(client, store):
+    ids = await seed_commands(store, 1)
+    assert (await store.next_command(1, lease_seconds=-1))["command_id"] == ids[0]
+    assert (await store.next_command(2))["command_id"] == ids[0]  # 1's lease had expired
+
+    assert (await client.post("/release_command", headers=auth(2))).json() == {"command_ids": [ids[0]]}
+    assert (await client.post("/next_command", json={}, headers=auth(3))).json()["command_id"] == ids[0]
+
+async def test_validators_can_lease_ahead(client, store):
+    ids = await seed_commands(store, 4)
+    first = (await client.post("/next_command", json={}, headers=auth(1))).json()["command_id"]
+    ahead = (await client.post("/next_command", json={"skip": [first]}, headers=auth(1))).json()["command_id"]
+    assert [first, ahead] == ids[:2]
+    # the held leases come back, oldest first, until the client skips them all
+    assert (await store.next_command(1))["command_id"] == first
+    assert (await store.next_command(1, skip=[first]))["command_id"] == ahead
+    assert (await store.next_command(2))["command_id"] == ids[2]
+
+    # labelling the first completes its lease and hands out the one leased ahead
+    body = (await client.post("/next_command", json={"label": _label(first), "skip": [first]}, headers=auth(1))).json()
+    assert body["label"]["accepted"] == 1 and body["command_id"] == ahead
+
+    res = await client.post("/release_command", json={"command_id": ahead}, headers=auth(1))
+    assert res.json() == {"command_ids": [ahead]}
+    assert (await store.next_command(3))["command_id"] == ahead
+
+async def test_leases_held_per_validator_are_capped(store, monkeypatch):
+    monkeypatch.setattr(sql_storage, "LEASE_MAX_HELD", 2)
+    ids = await seed_commands(store, 4)
+    held = []
+    for _ in range(3):
+        held.append((await store.next_command(1, skip=held))["command_id"])
+    assert held == ids[:3]
+    # the oldest lease went back to the pool to make room
+    assert (await store.next_command(2))["command_id"] == ids[0]
+    assert await store.release_command(1) == ids[1:3]
+
+async def _insert_raw_labels(store, rows):
+    # as migrate_classifications copies them: no counters, no assigned
+    conn = await store.get_connection()
+    try:
+        await conn.executemany(
+            "INSERT INTO classifications (user_id, command_id, action, command_text, processed_time) VALUES (?, ?, 'Static', 'x', ?)",
+            [(u, c, datetime(2024, 1, 1)) for u, c in rows]
+        )
+        await conn.commit()
+    finally:
+        await conn.close()
+
+async def test_reconcile_counts_labels_copied_in_and_open_leases(store):
+    ids = await seed_commands(store, 3)
+    assert (await store.next_command(1))["command_id"] == ids[0]
+    await _insert_raw_labels(store, [(2, ids[1]), (3, ids[1]), (2, ids[2])])
+    await store.reconcile_counters()
+    assert (await store.next_command(4, redundancy=1)) is None
+    assert (await store.next_command(4, redundancy=2))["command_id"] == ids[0]
+    assert (await store.next_command(5, redundancy=2))["command_id"] == ids[2]
+
+async def test_migration_fills_assigned_for_labels_from_before_leases(store):
+    ids = await seed_commands(store, 2)
+    await _insert_raw_labels(store, [(2, ids[0])])
+    conn = await store.get_connection()
+    try:
+        await conn.execute("DELETE FROM schema_migrations WHERE version = 8")
+        await conn.commit()
+    finally:
+        await conn.close()
+    assert await store.init_schema() == [8]
+    assert (await store.next_command(1))["command_id"] == ids[1]
+    assert await store.next_command(3) is None
+
+async def test_next_command_is_for_validators_only(client, store):
+    res = await client.post("/next_command", json={}, headers=auth(1, "admin"))
+    assert res.status_code == 403
+
+async def test_labels_without_a_lease_take_a_slot(client, store):
+    ids = await seed_commands(store, 2)
+    res = await client.post("/mark_batch", json={"user_id": 1, "items": [_label(ids[0]), _label(ids[0], "Dynamic")]},
+                            headers=auth(1))
+    assert res.json()["accepted"] == 2
+    assert (await client.post("/mark_static", json={"user_id": 2, "command_id": ids[1], "command_text": "x"},
+                              headers=auth(2))).status_code == 200
+    # with redundancy 1 both commands are covered without ever being leased
+    assert await store.next_command(3) is None
+    assert (await store.next_command(3, redundancy=2))["command_id"] == ids[0]
+
+async def test_late_labels_for_a_reclaimed_lease_are_rejected(client, store):
+    ids = await seed_commands(store, 2)
+    assert (await store.next_command(1, lease_seconds=-1))["command_id"] == ids[0]
+    assert (await store.next_command(2))["command_id"] == ids[0]  # reclaimed from 1
+
+    body = (await client.post("/next_command", json={"label": _label(ids[0])}, headers=auth(1))).json()
+    assert body["label"] == {"accepted": 0, "rejected": [{"index": 0, "command_id": ids[0], "reason": "lease expired"}]}
+    assert body["command_id"] == ids[1]
+    # an expired lease nobody reclaimed yet still takes the label
+    assert (await store.next_command(3, lease_seconds=-1)) is None
+    await store.next_command(1, lease_seconds=-1)
+    body = (await client.post("/next_command", json={"label": _label(ids[1])}, headers=auth(1))).json()
+    assert body["label"]["accepted"] == 1
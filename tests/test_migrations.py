@@ -0,0 +1,130 @@
+# tests/test_migrations.py
+import hashlib
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import cache, migrate
+from backend.sqlite_db import SQLiteStorage
+from conftest import seed_commands
+
+pytestmark = pytest.mark.anyio
+
+async def test_every_migration_is_applied_once(store):
+    versions = [v for v, _, _ in store.MIGRATIONS]
+    assert versions == sorted(versions)
+    assert sorted(await store.migration_status()) == versions
+    assert await store.init_schema() == []
+
+async def test_migrations_upgrade_a_legacy_users_file(tmp_path, store):
+    # the pre-versioning users.db: a bare users table, plain-text passwords
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT, password TEXT, role TEXT)")
+        conn.execute("INSERT INTO users (name, email, password, role) VALUES ('a', 'a@x', 'pw', 'Validator')")
+    await store.close_pool()
+
+    legacy = SQLiteStorage(str(path))
+    try:
+        applied = await legacy.init_schema()
+        assert applied == [v for v, _, _ in legacy.MIGRATIONS]
+        assert (await legacy.authenticate_user("a@x", "pw"))["name"] == "a"
+        assert await legacy.get_all_validators() == [{"id": 1, "name": "a"}]
+    finally:
+        await legacy.close_pool()
+
+async def test_legacy_passwords_are_never_compared_in_plain_text(store):
+    digest = hashlib.sha256(b"pw").hexdigest()
+    plain_hex = "deadbeef" * 8  # a plain-text password that is also 64 hex digits
+    conn = await store.get_connection()
+    try:
+        await conn.execute("INSERT INTO users (name, email, password, role) VALUES ('s', 's@x', ?, 'validator')", (digest,))
+        await conn.execute("INSERT INTO users (name, email, password, role) VALUES ('p', 'p@x', 'pw', 'validator')")
+        await conn.execute("DELETE FROM schema_migrations WHERE version = 9")
+        await conn.commit()
+    finally:
+        await conn.close()
+    assert await store.init_schema() == [9]
+    # the SHA-256 row checks the password, not the digest itself
+    assert await store.authenticate_user("s@x", digest) is None
+    assert (await store.authenticate_user("s@x", "pw"))["name"] == "s"
+    # the plain-text row was hashed by the migration
+    assert (await store.authenticate_user("p@x", "pw"))["name"] == "p"
+    assert await store.authenticate_user("p@x", plain_hex) is None
+
+async def test_commands_total_is_seeded_and_follows_ingest(store):
+    ids = await seed_commands(store, 3)
+    assert await store.get_commands_total() == 3
+    await seed_commands(store, 5)  # two new names; the cached total must not survive the commit
+    assert await store.get_commands_total() == 5
+
+    # a database whose commands predate the counter gets it from the migration
+    conn = await store.get_connection()
+    try:
+        await conn.execute("DELETE FROM global_counters")
+        await conn.execute("DELETE FROM schema_migrations WHERE version = 4")
+        await conn.execute("DELETE FROM commands WHERE id = ?", (ids[0],))
+        await conn.commit()
+    finally:
+        await conn.close()
+    assert await store.init_schema() == [4]
+    cache.invalidate("commands")
+    assert await store.get_commands_total() == 4
+
+async def test_short_history_indexes_are_dropped_by_their_own_migration(store):
+    conn = await store.get_connection()
+    try:
+        await conn.execute("CREATE INDEX idx_classifications_user_time ON classifications (user_id, processed_time)")
+        await conn.execute("DELETE FROM schema_migrations WHERE version = 6")
+        await conn.commit()
+    finally:
+        await conn.close()
+    assert await store.init_schema() == [6]
+    conn = await store.get_connection()
+    try:
+        cursor = await conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'classifications'")
+        names = {row[0] for row in await cursor.fetchall()}
+    finally:
+        await conn.close()
+    assert "idx_classifications_user_time" not in names
+    assert "idx_classifications_user_time_key" in names
+
+async def test_leases_are_rekeyed_per_command_keeping_open_ones(store):
+    ids = await seed_commands(store, 2)
+    conn = await store.get_connection()
+    try:
+        # command_leases as migration 1 created it, with one open lease
+        await conn.execute("DROP TABLE command_leases")
+        await conn.execute("CREATE TABLE command_leases (user_id INTEGER PRIMARY KEY, command_id INTEGER NOT NULL,"
+                           " leased_at TIMESTAMP NOT NULL, expires_at TIMESTAMP NOT NULL)")
+        await conn.execute("INSERT INTO command_leases VALUES (1, ?, ?, ?)",
+                           (ids[0], datetime.now(), datetime.now() + timedelta(minutes=5)))
+        await conn.execute("DELETE FROM schema_migrations WHERE version = 7")
+        await conn.commit()
+    finally:
+        await conn.close()
+    assert await store.init_schema() == [7]
+    assert (await store.next_command(1))["command_id"] == ids[0]
+    assert (await store.next_command(1, skip=[ids[0]]))["command_id"] == ids[1]
+
+async def test_no_hot_query_reads_a_whole_table(store):
+    results = await store.explain_hot_queries()
+    assert results
+    bare = [(r["name"], line) for r in results for line in r["plan"]
+            if line.startswith("SCAN ") and " USING " not in line and line != "SCAN CONSTANT ROW"]
+    assert bare == []
+
+async def test_migrate_cli_applies_and_explains(tmp_path, monkeypatch, capsys):
+    fresh = SQLiteStorage(str(tmp_path / "cli.db"))
+    monkeypatch.setattr(migrate, "get_storage", lambda: fresh)
+    monkeypatch.setattr(sys, "argv", ["migrate", "--explain"])
+    await migrate.main()  # exits 1 on a full scan
+    out = capsys.readouterr().out
+    assert out.startswith(f"Applied migrations: {', '.join(str(v) for v, _, _ in fresh.MIGRATIONS)}.")
+    assert "FULL SCAN" not in out
+
+    monkeypatch.setattr(sys, "argv", ["migrate", "--status"])
+    await migrate.main()
+    assert capsys.readouterr().out.count("applied") == len(fresh.MIGRATIONS)